@@ -121,7 +121,8 @@ class KafkaConsumerApp:
             if response.status_code == 200:
                 api_data = response.json()
                 adult = api_data["adult"]
-                genres = str(api_data["genres"])
+                # store genre names as a native array so training never has to parse them
+                genres = [genre["name"] if isinstance(genre, dict) else genre for genre in api_data["genres"] or []]
                 release_date = api_data["release_date"]
                 release_date = datetime.strptime(release_date, "%Y-%m-%d") if release_date else "unknown"
                 original_language = api_data["original_language"]
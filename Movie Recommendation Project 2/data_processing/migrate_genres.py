@@ -0,0 +1,68 @@
+# ------------------------------------------------------------------------------
+# migrate_genres.py
+#
+# How to Run:
+#     python3 data_processing/migrate_genres.py             # rewrite movie_info in place
+#     python3 data_processing/migrate_genres.py --dry-run   # only count the documents to migrate
+#
+# Purpose:
+#     One-time migration for movie_info documents written before the consumer
+#     stored genres as a native array. Those documents hold the API's genre list
+#     as a Python repr string ("[{'id': 18, 'name': 'Drama'}]"); this rewrites
+#     them to an array of genre names (["Drama"]) with batched bulk updates.
+#     Documents that already hold an array are left alone, so it is safe to
+#     re-run. Training no longer parses these strings: run this once before
+#     training on a collection that still has them, or those movies get no
+#     genres.
+# ------------------------------------------------------------------------------
+import argparse
+import ast
+import os
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+load_dotenv()
+
+
+def parse_genres(genres):
+    """Genre names from a stringified genre list; an empty list if it cannot be parsed."""
+    try:
+        genres = ast.literal_eval(genres)
+    except (ValueError, SyntaxError):
+        return []
+    if not isinstance(genres, (list, tuple)):
+        return []
+    return [genre.get('name', '') if isinstance(genre, dict) else str(genre) for genre in genres]
+
+
+def migrate_genres(collection, batch_size=1000, dry_run=False):
+    """Rewrite string `genres` fields of `collection` to arrays of names. Returns the number of documents."""
+    cursor = collection.find({"genres": {"$type": "string"}}, {"_id": 1, "genres": 1}, batch_size=batch_size)
+    updates, migrated = [], 0
+    for doc in cursor:
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"genres": parse_genres(doc["genres"])}}))
+        if len(updates) >= batch_size:
+            migrated += _flush(collection, updates, dry_run)
+            updates = []
+    return migrated + _flush(collection, updates, dry_run)
+
+
+def _flush(collection, updates, dry_run):
+    if updates and not dry_run:
+        collection.bulk_write(updates, ordered=False)
+    return len(updates)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store movie_info genres as arrays of genre names")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="count the documents without updating them")
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017'))
+    movie_db = client[os.getenv('MOVIE_DB', 'movie_database')]
+    collection = movie_db[os.getenv('MOVIE_DATA_COLLECTION', 'movie_info')]
+
+    count = migrate_genres(collection, args.batch_size, args.dry_run)
+    print(f"{'Would migrate' if args.dry_run else 'Migrated'} {count} movie_info documents")
@@ -1,11 +1,17 @@
 import itertools
 import threading
 import time
+import sys
+import os
 from flask import Flask, request, make_response
 import pandas as pd
 import requests
 import json
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "model_training")))
+from serving import logs
 app = Flask(__name__)
+# Request logs: sampled, queued and written off the request path (LOG_LEVEL, LOG_SAMPLE_RATES, LOG_FORMAT)
+logger = logs.configure_logging("backend_service")
 # Load config from config.py
 app.config.from_object("config.Config")
 host = app.config.get("HOST", "128.2.205.110")
@@ -41,29 +47,35 @@ def home():
 def recommend(userid):
     record_request_ip(userid)
     # find ml_port with probabilities
-    ml_url = next(server_pool)
-    print(f"redirecting request to ML service: {ml_url}")
+    ml_service = next(server_pool)
+    logger.debug("Forwarding recommendation request", extra={"fields": {"user_id": userid, "ml_service": ml_service}})
     # redirect to ML services
-    ml_url = f'{ml_url}/recommend/{userid}'
+    ml_url = f'{ml_service}/recommend/{userid}'
     try:
         response = requests.get(ml_url, timeout=50)
         if response.status_code == 200:
             try:
-                print(f"getting response from ML service {ml_url}")
                 responseBody = response.json()
                 accuracy = responseBody["accuracy"]
                 MODEL_ACCURACY.set(accuracy)
-                print(f"Model accuracy: {accuracy}")
+                logger.info("Received recommendations", extra={"fields": {
+                    "user_id": userid, "ml_service": ml_service, "accuracy": accuracy}})
                 movie_list = responseBody["recommendation_results"]
                 movie_string = ",".join(str(m) for m in movie_list)
                 return make_response(movie_string, 200)
             except json.JSONDecodeError:
+                logger.warning("Invalid JSON from ML service", extra={"fields": {"user_id": userid, "ml_service": ml_service}})
                 return make_response({"error": "Invalid JSON from ML service"}, 500)
         else:
+            logger.warning("ML service error", extra={"fields": {
+                "user_id": userid, "ml_service": ml_service, "status_code": response.status_code}})
             return make_response({"error": f"ML service error: {response.status_code}"}, response.status_code)
     except requests.exceptions.Timeout:
+        logger.warning("ML service timed out", extra={"fields": {"user_id": userid, "ml_service": ml_service}})
         return make_response({"error": "ML service timed out"}, 504)
     except Exception as e:
+        logger.error("Error forwarding recommendation request", exc_info=True,
+                     extra={"fields": {"user_id": userid, "ml_service": ml_service}})
         return make_response({"error": f"Request failed: {str(e)}"}, 500)
 if __name__ == "__main__":
     app.run(host, port)
\ No newline at end of file
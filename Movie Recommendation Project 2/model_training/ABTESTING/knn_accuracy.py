@@ -6,6 +6,7 @@ from surprise import Dataset, Reader, KNNBasic, accuracy
 from pymongo import MongoClient
 from pymongo.server_api import ServerApi
 from dotenv import load_dotenv
+from Models.ids import rated_recommendations
 import os
 
 np.random.seed(42)
@@ -50,15 +51,12 @@ def evaluate_knn_rmse_all_users(provenance_coll, ratings_coll):
 
     all_predictions = []
 
-    for uid, log in user_logs.items():
-        recommended = log.get("recommendation_results", [])
-        ground_truth = ratings[(ratings["user_id"] == uid) & (ratings["movie_id"].isin(recommended))]
-        if ground_truth.empty:
-            continue
+    # Ratings of the movies recommended to each user in their latest request
+    ground_truth = rated_recommendations(
+        ratings, {uid: log.get("recommendation_results", []) for uid, log in user_logs.items()})
 
-        testset = [(row["user_id"], row["movie_id"], row["rating"]) for _, row in ground_truth.iterrows()]
-        preds = [model.predict(u, i, r) for u, i, r in testset]
-        all_predictions.extend(preds)
+    for u, i, r in ground_truth[["user_id", "movie_id", "rating"]].itertuples(index=False):
+        all_predictions.append(model.predict(u, i, r))
 
     if not all_predictions:
         print("[INFO] No matching predictions for any user.")
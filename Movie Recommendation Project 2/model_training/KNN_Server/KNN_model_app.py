@@ -1,28 +1,62 @@
-from flask import Flask, make_response
+from flask import Flask, make_response, request
 from dotenv import load_dotenv
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from Models.KNN import KNNPipeline
-from ABTESTING.knn_accuracy import evaluate_knn_rmse_all_users
+from Models.KNN import KNNPipeline, ARTIFACT_DIR
+from Models.artifacts import latest_artifact
+from serving.provenance import ProvenanceWriter
+from serving.batch import parse_batch_request
+from serving.cache import RecommendationCache
+from serving.artifact_watcher import ArtifactWatcher
+from serving.metrics import observe_stages, record_model, render_metrics
+from serving import logs
+from Models.timing import StageTimings
+from prometheus_client import CONTENT_TYPE_LATEST
 from pymongo import MongoClient
 from datetime import datetime, timezone, timedelta
 import threading
 import json
 import time
+import logging
 
 app = Flask(__name__)
+# Request logs: sampled, queued and written off the request path (LOG_LEVEL, LOG_SAMPLE_RATES, LOG_FORMAT).
+# The listener thread starts in start_worker (gunicorn) or __main__, never in a master that forks
+logger = logs.configure_logging("knn_server", start=False)
 
+# Only guards publishing a new pipeline; requests read the published pipeline without it
 model_lock = threading.RLock()
+# Published pipeline; None until the background load finishes
+knn_pipeline = None
 
 # ---------- CONFIG ----------
 load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME = os.getenv("LOG_DB", "log_database")
 REQUEST_PROVENANCE_LOG_COLL = os.getenv("REQUEST_PROVENANCE_LOG", "request_provenance_log")
-client = MongoClient(MONGO_URI)
-request_provenance_log_coll = client[DB_NAME][REQUEST_PROVENANCE_LOG_COLL]
-ratings_coll = client["movie_database"]["user_rate_data"]
+# Provenance documents are written in the background, in batches, off the request path. The MongoClient
+# is opened by the writer thread on its first write, so a gunicorn master that forks workers never holds one
+provenance_writer = ProvenanceWriter(
+    open_collection=lambda: MongoClient(MONGO_URI)[DB_NAME][REQUEST_PROVENANCE_LOG_COLL],
+    max_queue=int(os.getenv("PROVENANCE_QUEUE_SIZE", 10000)),
+    batch_size=int(os.getenv("PROVENANCE_BATCH_SIZE", 500)),
+    flush_interval=float(os.getenv("PROVENANCE_FLUSH_SECONDS", 1.0)),
+    start=False,
+)
+# Seconds between attempts when training the initial model fails
+MODEL_LOAD_RETRY_SECONDS = float(os.getenv("MODEL_LOAD_RETRY_SECONDS", 30))
+# Largest number of users accepted by one /recommend/batch request
+BATCH_MAX_USERS = int(os.getenv("BATCH_MAX_USERS", 1000))
+# Recent /recommend responses, keyed by (user_id, model_version) and dropped on model swap
+recommendation_cache = RecommendationCache(
+    "knn",
+    max_bytes=int(os.getenv("RECOMMENDATION_CACHE_MAX_BYTES", 64 * 2**20)),
+    ttl_seconds=float(os.getenv("RECOMMENDATION_CACHE_TTL_SECONDS", 300)),
+)
+# How often forked workers check ARTIFACT_DIR/LATEST for a new model (see gunicorn.conf.py)
+ARTIFACT_POLL_SECONDS = float(os.getenv("ARTIFACT_POLL_SECONDS", 5))
+artifact_watcher = None
 
 # ---------- RETRAINING CONFIGURATION ----------
 RETRAINING_INTERVAL_DAYS = 3  # Retrain every 3 days
@@ -31,8 +65,8 @@ MODEL_HISTORY_FILE = "knn_model_history.json"
 
 # ---------- MODEL PROVENANCE TRACKING ----------
 # TODO: add model version, pipeline version, training data version
-def log_request_provenance_to_mongo(request_start_time, user_id, pipeline_type, model_version, training_data_version, model_accuracy, recommendations):
-    request_provenance_json = {
+def provenance_document(request_start_time, user_id, pipeline_type, model_version, training_data_version, model_accuracy, recommendations):
+    return {
         "timestamp": request_start_time,
         "user_id": user_id,
         "pipeline_type": pipeline_type,
@@ -42,8 +76,12 @@ def log_request_provenance_to_mongo(request_start_time, user_id, pipeline_type,
         "recommendation_results": recommendations,
         "status_code": 200
     }
-    print(f"logging to mongo {MONGO_URI}: {request_provenance_json}")
-    request_provenance_log_coll.insert_one(request_provenance_json)
+
+def log_request_provenance_to_mongo(request_start_time, user_id, pipeline_type, model_version, training_data_version, model_accuracy, recommendations):
+    request_provenance_json = provenance_document(request_start_time, user_id, pipeline_type, model_version, training_data_version, model_accuracy, recommendations)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Queued request provenance", extra={"fields": {"provenance": request_provenance_json}})
+    provenance_writer.submit(request_provenance_json)
     
 def save_model_history(model_info):
     """Save model version information to history file"""
@@ -72,25 +110,90 @@ def save_model_history(model_info):
         print(f"{datetime.now()} - Error saving KNN model history: {e}")
 
 def initialize_model():
-    """Initialize the model when the server starts"""
+    """Load or train the first model and publish it"""
+    print(f"{datetime.now()} - Initializing KNN model")
+    # Memory-map the latest trained artifact if there is one, otherwise train and persist it
+    artifact_path = latest_artifact(ARTIFACT_DIR)
+    if artifact_path is not None:
+        pipeline = KNNPipeline(artifact_path=artifact_path)
+    else:
+        pipeline = KNNPipeline()
+        pipeline.save_artifact(ARTIFACT_DIR)
+    publish_pipeline(pipeline)
+
+    # Save initial model info to history
+    model_info = pipeline.get_model_info()
+    save_model_history(model_info)
+
+    print(f"{datetime.now()} - KNN model initialization complete - Version: {model_info['model_version']}")
+
+def load_latest_artifact():
+    """
+    Map and publish the artifact LATEST points at, if there is one. gunicorn's master calls this
+    before forking (see gunicorn.conf.py), so every worker starts with the same model in memory.
+    Loading an artifact opens no MongoClient and starts no thread.
+    """
+    artifact_path = latest_artifact(ARTIFACT_DIR)
+    if artifact_path is None:
+        return None
+    try:
+        pipeline = KNNPipeline(artifact_path=artifact_path)
+    except Exception as e:
+        # the workers keep trying through their artifact watchers
+        print(f"{datetime.now()} - Error loading KNN model artifact {artifact_path}: {e}")
+        return None
+    publish_pipeline(pipeline)
+    return pipeline
+
+def initialize_model_in_background():
+    """
+    Run initialize_model on a daemon thread, retrying until it succeeds, so the server can bind its
+    port and answer /healthz right away; /ready and /recommend report 503 until the model is published.
+    """
+    def load():
+        while True:
+            try:
+                initialize_model()
+                return
+            except Exception as e:
+                print(f"{datetime.now()} - Error initializing KNN model, retrying in {MODEL_LOAD_RETRY_SECONDS}s: {e}")
+                time.sleep(MODEL_LOAD_RETRY_SECONDS)
+    loader = threading.Thread(target=load, name="model-loader", daemon=True)
+    loader.start()
+    return loader
+
+def publish_pipeline(new_pipeline):
+    """
+    Atomically swap in a new pipeline; requests already running keep the snapshot they started with.
+    Cached responses of the old pipeline are dropped.
+    Published pipelines are never modified afterwards, so readers need no lock.
+    """
     global knn_pipeline
     with model_lock:
-        print(f"{datetime.now()} - Initializing KNN model")
-        knn_pipeline = KNNPipeline()
-        
-        # Save initial model info to history
-        model_info = knn_pipeline.get_model_info()
-        save_model_history(model_info)
-        
-        print(f"{datetime.now()} - KNN model initialization complete - Version: {model_info['model_version']}")
+        previous, knn_pipeline = knn_pipeline, new_pipeline
+        recommendation_cache.reset(new_pipeline.model_version)
+    record_model("KNN", new_pipeline, previous)
 
-# Initialize model on startup
-initialize_model()
+def start_worker():
+    """
+    Per-process setup of a gunicorn worker forked from the preloaded master (see gunicorn.conf.py).
+    The worker starts the provenance writer and log listener, which the master never runs, and keeps
+    serving the artifact the master mapped until LATEST points at another one, e.g. after
+    train_knn_job.py publishes a new model (without one from the master, it maps LATEST at once).
+    """
+    global artifact_watcher
+    provenance_writer.after_fork()
+    logs.after_fork()
+    artifact_watcher = ArtifactWatcher(
+        ARTIFACT_DIR,
+        load=lambda path: KNNPipeline(artifact_path=path),
+        publish=publish_pipeline,
+        current_version=knn_pipeline.model_version if knn_pipeline is not None else None,
+        interval=ARTIFACT_POLL_SECONDS,
+    ).start()
 
 def periodic_model_retraining():
-    """Background thread to periodically retrain the model"""
-    global knn_pipeline
-    
+    """Background thread to periodically retrain the model (development server only, see gunicorn.conf.py)"""
     while True:
         try:
             # Sleep until next scheduled retraining
@@ -99,24 +202,31 @@ def periodic_model_retraining():
             
             print(f"{datetime.now()} - Checking if KNN model retraining is due")
             
-            with model_lock:
-                # Check if it's time to retrain (last_trained is None or older than RETRAINING_INTERVAL_DAYS)
-                if (knn_pipeline.last_trained is None or 
-                    datetime.now() - knn_pipeline.last_trained > timedelta(minutes=test_interval)):
-                    
-                    print(f"{datetime.now()} - Starting KNN model retraining")
-                    try:
-                        # Save old model version for comparison
-                        old_version = knn_pipeline.model_version
-                        # Retrain model
-                        knn_pipeline.refresh_model()
-                        # Save new model info to history
-                        model_info = knn_pipeline.get_model_info()
-                        save_model_history(model_info)
-                        print(f"{datetime.now()} - KNN model successfully retrained at {knn_pipeline.last_trained}")
-                        print(f"{datetime.now()} - Old version: {old_version} -> New version: {model_info['model_version']}")
-                    except Exception as e:
-                        print(f"{datetime.now()} - Error retraining KNN model: {e}")
+            current_pipeline = knn_pipeline
+            if current_pipeline is None:
+                print(f"{datetime.now()} - KNN model not loaded yet, skipping retraining check")
+                continue
+            # Check if it's time to retrain (last_trained is None or older than RETRAINING_INTERVAL_DAYS)
+            if (current_pipeline.last_trained is None or 
+                datetime.now() - current_pipeline.last_trained > timedelta(minutes=test_interval)):
+                
+                print(f"{datetime.now()} - Starting KNN model retraining")
+                try:
+                    # Save old model version for comparison
+                    old_version = current_pipeline.model_version
+                    # Train a new model off-lock while the current one keeps serving,
+                    # fetching only the ratings newer than the current pipeline's watermark
+                    new_pipeline = KNNPipeline(snapshots=current_pipeline.snapshots)
+                    new_pipeline.validate()
+                    new_pipeline.save_artifact(ARTIFACT_DIR)
+                    publish_pipeline(new_pipeline)
+                    # Save new model info to history
+                    model_info = new_pipeline.get_model_info()
+                    save_model_history(model_info)
+                    print(f"{datetime.now()} - KNN model successfully retrained at {new_pipeline.last_trained}")
+                    print(f"{datetime.now()} - Old version: {old_version} -> New version: {model_info['model_version']}")
+                except Exception as e:
+                    print(f"{datetime.now()} - Error retraining KNN model: {e}")
             
             # Sleep for the retraining interval (converted to seconds)
             # For production, use this sleep instead of the 1-minute test delay
@@ -132,25 +242,100 @@ def periodic_model_retraining():
 def home():
     return "KNN Model Server Running"
 
+@app.route("/healthz")
+def healthz():
+    """Liveness: the process is up and serving HTTP, whether or not the model is loaded"""
+    return make_response({"status": "ok"}, 200)
+
+@app.route("/ready")
+def ready():
+    """Readiness: 200 with the model version once a pipeline is published, 503 before"""
+    pipeline = knn_pipeline
+    if pipeline is None:
+        return model_not_ready()
+    return make_response({"status": "ready", "model_version": pipeline.model_version, "data_version": pipeline.data_version}, 200)
+
+def model_not_ready():
+    return make_response({"error": "Model is loading"}, 503, {"Retry-After": str(int(MODEL_LOAD_RETRY_SECONDS))})
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus metrics, including the recommendation cache counters, of all workers under gunicorn"""
+    return make_response(render_metrics(), 200, {"Content-Type": CONTENT_TYPE_LATEST})
+
 @app.route("/recommend/<int:userid>")
 def recommend(userid):
     
     try:
         request_start_time = datetime.now(timezone.utc)
-        # TODO: implement model update logics for KNN
-        print(f"Received recommendation request for user {userid}")
-        recommendations = knn_pipeline.get_recommendations(str(userid))
-        # TODO: record model_accuracy, model version, data info to the response as well
-        model_accuracy = None #evaluate_knn_rmse_all_users(request_provenance_log_coll, ratings_coll)
-        # Log the request provenance to MongoDB
-        log_request_provenance_to_mongo(request_start_time, userid, "KNN", "knn version constant 1", "knn training data constant 1", model_accuracy, recommendations)
+        # Use one pipeline snapshot for the whole request, so versions match the model that answered
+        pipeline = knn_pipeline
+        if pipeline is None:
+            return model_not_ready()
+        logger.info("Received recommendation request", extra={"fields": {"user_id": userid, "model_version": pipeline.model_version}})
+        timings = StageTimings()
+        # Repeat requests for the same model version are answered from the cache
+        with timings.stage("cache_lookup"):
+            recommendations = recommendation_cache.get(userid, pipeline.model_version)
+        if recommendations is None:
+            recommendations = pipeline.get_recommendations(str(userid), timings=timings)
+            recommendation_cache.put(userid, pipeline.model_version, recommendations)
+        # TODO: record model_accuracy to the response as well
+        # ABTESTING.knn_accuracy.evaluate_knn_rmse_all_users; not imported here, it opens a MongoClient at import
+        model_accuracy = None
+        # Queue the request provenance for MongoDB
+        with timings.stage("provenance"):
+            log_request_provenance_to_mongo(request_start_time, userid, "KNN", pipeline.model_version, pipeline.data_version, model_accuracy, recommendations)
         
         # TODO: calculate model_accuracy
-        return make_response(recommendations, 200)
+        with timings.stage("serialization"):
+            response_obj = make_response(recommendations, 200)
+        observe_stages("KNN", pipeline.model_version, timings)
+        return response_obj
+    except Exception as e:
+        logger.error("Error generating recommendations", exc_info=True, extra={"fields": {"user_id": userid}})
+        return make_response({"error": str(e)}, 500)
+
+@app.route("/recommend/batch", methods=["POST"])
+def recommend_batch():
+    """
+    Recommendations for several users in one request: {"user_ids": [...], "num_recommendations": 20}.
+    The users are scored together and their provenance documents are queued in one call.
+    """
+    try:
+        user_ids, num_recommendations = parse_batch_request(request.get_json(silent=True), BATCH_MAX_USERS)
+    except ValueError as e:
+        return make_response({"error": str(e)}, 400)
+    try:
+        request_start_time = datetime.now(timezone.utc)
+        # One pipeline snapshot for the whole batch, as in /recommend
+        pipeline = knn_pipeline
+        if pipeline is None:
+            return model_not_ready()
+        logger.info("Received batch recommendation request", extra={"fields": {"users": len(user_ids), "model_version": pipeline.model_version}})
+        recommendations = pipeline.get_recommendations_batch([str(user_id) for user_id in user_ids], num_recommendations)
+        provenance_writer.submit_many([
+            provenance_document(request_start_time, user_id, "KNN", pipeline.model_version, pipeline.data_version, None, user_recommendations)
+            for user_id, user_recommendations in zip(user_ids, recommendations)
+        ])
+        return make_response({
+            "results": [
+                {"user_id": user_id, "recommendation_results": user_recommendations}
+                for user_id, user_recommendations in zip(user_ids, recommendations)
+            ],
+            "model_version": pipeline.model_version,
+            "data_version": pipeline.data_version,
+        }, 200)
     except Exception as e:
+        logger.error("Error generating batch recommendations", exc_info=True, extra={"fields": {"users": len(user_ids)}})
         return make_response({"error": str(e)}, 500)
 
 if __name__ == "__main__":
+    # Development server: one process, so it writes provenance and logs and trains in its own threads
+    provenance_writer.start()
+    logs.start()
+    # Load or train the model in the background so the port is bound right away
+    initialize_model_in_background()
     # Load config from config.py
     retraining_thread = threading.Thread(target=periodic_model_retraining, daemon=True)
     retraining_thread.start()
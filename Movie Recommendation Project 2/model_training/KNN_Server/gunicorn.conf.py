@@ -0,0 +1,67 @@
+# ------------------------------------------------------------------------------
+# gunicorn.conf.py
+#
+# How to Run:
+#     cd model_training/KNN_Server
+#     gunicorn -c gunicorn.conf.py KNN_model_app:app
+#     SERVING_WORKERS=8 SERVING_THREADS=4 gunicorn -c gunicorn.conf.py KNN_model_app:app
+#
+# Purpose:
+#     Production serving mode for the KNN model server. The app is imported once
+#     in the master, which maps the LATEST artifact (if there is one) before
+#     SERVING_WORKERS processes are forked from it, so the workers start with the
+#     model loaded and share its memory-mapped arrays (the similarity matrix or
+#     the neighbour lists) through the page cache. Without an artifact yet,
+#     workers answer 503 on /ready and /recommend until one appears. Each worker
+#     re-maps the artifact whenever LATEST changes.
+#
+#     Nothing in the master is unsafe to fork: it opens no MongoClient and runs
+#     no threads or process pools. Workers do not train either; run
+#     train_knn_job.py --every-minutes N next to the server to publish
+#     artifacts. Provenance writing and log output start in each worker.
+#
+#     Metrics are written per process to PROMETHEUS_MULTIPROC_DIR (a fresh
+#     directory by default), and /metrics reports all workers together.
+# ------------------------------------------------------------------------------
+import gc
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from config import Config
+
+bind = f"{os.getenv('HOST', Config.HOST)}:{os.getenv('PORT', Config.PORT)}"
+workers = int(os.getenv("SERVING_WORKERS", 0)) or multiprocessing.cpu_count()
+threads = int(os.getenv("SERVING_THREADS", 4))
+timeout = int(os.getenv("SERVING_TIMEOUT", 120))
+# Import the app once in the master; workers are forked from it
+preload_app = True
+
+# Set before the app imports prometheus_client; gunicorn re-reads this file on SIGHUP, when it is kept as is
+if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(tempfile.gettempdir(), f"knn_metrics_{os.getpid()}")
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+
+def when_ready(server):
+    import KNN_model_app
+    # Map the model before the first fork, so the workers inherit it
+    KNN_model_app.load_latest_artifact()
+
+
+def pre_fork(server, worker):
+    # Keep the collector from touching (and so un-sharing) the pages of objects loaded before the fork
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import KNN_model_app
+    KNN_model_app.start_worker()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    # Drop the exited worker's live gauges from /metrics
+    multiprocess.mark_process_dead(worker.pid)
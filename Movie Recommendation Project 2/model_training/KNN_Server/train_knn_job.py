@@ -0,0 +1,52 @@
+# ------------------------------------------------------------------------------
+# train_knn_job.py
+#
+# How to Run:
+#     python3 train_knn_job.py                     # train once and exit
+#     python3 train_knn_job.py --every-minutes 60  # keep retraining on a schedule
+#
+# Purpose:
+#     Trains the KNN model outside the model server and writes a versioned
+#     artifact directory (seen-item index, similarities and the raters of each
+#     movie, or the sparse engine's neighbour lists) under KNN_ARTIFACT_DIR,
+#     then points KNN_ARTIFACT_DIR/LATEST at it. Only the --keep newest
+#     artifacts are kept.
+#
+#     Under gunicorn, KNN_model_app.py memory-maps the LATEST artifact in the
+#     master and re-maps it in each worker when LATEST changes, so the server
+#     itself never opens MongoDB, trains or starts training processes.
+# ------------------------------------------------------------------------------
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from Models.KNN import KNNPipeline, ARTIFACT_DIR, ARTIFACT_KEEP
+
+
+def train_once(artifact_dir, snapshots=None, keep=ARTIFACT_KEEP):
+    start = time.time()
+    pipeline = KNNPipeline(snapshots=snapshots)
+    pipeline.validate()
+    path = pipeline.save_artifact(artifact_dir, keep)
+    print(f"{datetime.now()} - Trained {pipeline.model_version} in {time.time() - start:.1f}s -> {path}")
+    return pipeline
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the KNN model and publish a model artifact")
+    parser.add_argument("--artifact-dir", default=ARTIFACT_DIR)
+    parser.add_argument("--every-minutes", type=float, default=None, help="retrain on this schedule")
+    parser.add_argument("--keep", type=int, default=ARTIFACT_KEEP, help="newest artifacts to keep, 0 keeps all")
+    args = parser.parse_args()
+
+    # Keep the training snapshots between runs so each retrain only fetches new ratings
+    snapshots = train_once(args.artifact_dir, keep=args.keep).snapshots
+    while args.every_minutes:
+        time.sleep(args.every_minutes * 60)
+        try:
+            train_once(args.artifact_dir, snapshots, args.keep)
+        except Exception as e:
+            print(f"{datetime.now()} - Error training KNN model: {e}")
@@ -7,6 +7,14 @@ import numpy as np
 import datetime
 import os
 
+from .snapshot import TrainingSnapshot, format_data_version
+from .seen_index import SeenItemIndex
+from .knn_engine import SparseKNN, KNNScorer
+from .scoring import top_k
+from .materialize import top_unseen
+from .timing import StageTimings
+from . import artifacts
+
 # Load environment variables from a .env file if available
 load_dotenv()
 
@@ -14,6 +22,18 @@ load_dotenv()
 MONGO_URI = os.getenv('MONGO_URI', 'localhost')
 USER_DB = os.getenv('USER_DB', 'user_database')
 MOVIE_DB = os.getenv('MOVIE_DB', 'movie_database')
+# KNN engine: "surprise" (KNNBasic, dense similarity matrix) or "sparse" (blocked top-k neighbours)
+KNN_ENGINE = os.getenv('KNN_ENGINE', 'surprise')
+KNN_K = int(os.getenv('KNN_K', 40))
+KNN_BLOCK_SIZE = int(os.getenv('KNN_BLOCK_SIZE', 256))
+KNN_JOBS = int(os.getenv('KNN_JOBS', 0)) or None
+# Users scored together in batch requests, and (surprise engine) the most (user, rating) pairs per chunk
+BATCH_CHUNK_SIZE = int(os.getenv('BATCH_CHUNK_SIZE', 256))
+BATCH_MAX_ENTRIES = int(os.getenv('KNN_BATCH_MAX_ENTRIES', 5_000_000))
+# Directory of versioned, memory-mappable model artifacts
+ARTIFACT_DIR = os.getenv('KNN_ARTIFACT_DIR', os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'artifacts', 'knn')))
+# Number of newest artifacts kept when a new one is saved (the one LATEST points at is always kept); 0 keeps all
+ARTIFACT_KEEP = int(os.getenv('KNN_ARTIFACT_KEEP', 3))
 
 class DB:
     """ 
@@ -25,12 +45,20 @@ class DB:
         self.user_db = self.client[USER_DB]   # user_info
         self.movie_db = self.client[MOVIE_DB] # movie_info, user_watch_data, user_rate_data
 class KNNPipeline:
-    def __init__(self):
+    def __init__(self, artifact_path=None, snapshots=None):
+        # Cached training ratings; pass a previous pipeline's snapshots to refresh incrementally
+        self.snapshots = snapshots if snapshots is not None else {}
+        if artifact_path is not None:
+            # Serve a previously trained model without opening a MongoDB client
+            self.DB = None
+            self.load_artifact(artifact_path)
+            return
         self.DB = DB()
+        training_started = datetime.datetime.now()
         self.model = self.train_model()
         self.last_trained = datetime.datetime.now()
+        self.training_seconds = (self.last_trained - training_started).total_seconds()
         self.model_version = f"knn_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"  # Track model version
-        self.data_version = f"data_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"  # Track data version
 
     def get_model_info(self):
         """Return information about the current model"""
@@ -38,24 +66,54 @@ class KNNPipeline:
             "model_version": self.model_version,
             "data_version": self.data_version,
             "last_trained": self.last_trained.isoformat() if self.last_trained else None,
+            "training_seconds": self.training_seconds,
+        }
 
+    def get_model_stats(self):
+        """Bytes of the model's arrays, number of movies and last training time"""
+        if isinstance(self.model, SparseKNN):
+            arrays = [self.model.neighbors, self.model.similarities]
+            arrays += [part for matrix in (self.model.ratings, self.model.rated)
+                       for part in (matrix.data, matrix.indices, matrix.indptr)]
+        else:
+            arrays = [self.scorer.similarities, self.scorer.indptr, self.scorer.raters, self.scorer.ratings]
+        arrays += [self.seen_index.indptr, self.seen_index.indices]
+        return {
+            "model_bytes": int(sum(array.nbytes for array in arrays)),
+            "n_items": self.seen_index.n_items,
+            "training_seconds": self.training_seconds,
         }
         
-    def load_clean_data(self):
-        df_ratings = pd.DataFrame(list(self.DB.movie_db["user_rate_data"].find())).dropna()
-        df_ratings = df_ratings[['user_id', 'movie_id', 'score']]
+    def refresh_training_data(self):
+        """
+        Training ratings from the cached snapshot, after fetching only the ratings newer than its watermark.
+        """
+        snapshot = self.snapshots.get("user_rate_data")
+        if snapshot is None:
+            snapshot = TrainingSnapshot(['user_id', 'movie_id', 'score'], {'score': np.float64})
+            self.snapshots["user_rate_data"] = snapshot
+        df_ratings, _ = snapshot.refresh(self.DB.movie_db["user_rate_data"])
+        print(f"Fetched {snapshot.last_fetched} new ratings after watermark, {len(df_ratings)} rows cached")
+        df_ratings = df_ratings.dropna()
         df_ratings.columns = ['user_id', 'movie_id', 'rating']
         return df_ratings
 
     def train_model(self):
         print("Training KNN model...")
-        df = self.load_clean_data()
-        self.data_version = f"data_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        df = self.refresh_training_data()
+        self.data_version = format_data_version(self.snapshots)
         reader = Reader(rating_scale=(1, 5))
+        # Seen items and the item universe are indexed once per model, next to it
+        self.seen_index = SeenItemIndex.from_ratings(df)
+        if KNN_ENGINE == 'sparse':
+            self.scorer = None
+            return self.train_sparse_model(df)
         data = Dataset.load_from_df(df[['user_id', 'movie_id', 'rating']], reader)
         trainset, test_set = train_test_split(data, test_size=0.2)
         model = KNNBasic()
         model.fit(trainset)
+        # Raters per movie laid out once per model version, for batched scoring
+        self.scorer = KNNScorer.from_model(model, self.seen_index.item_ids)
         # prediction = model.predict(test_set)
         # accuracy.rmse(prediction)
         # print(f"Model trained with RMSE: {accuracy.rmse(prediction)}")
@@ -63,26 +121,97 @@ class KNNPipeline:
         print("KNN model trained.")
         return model
     
-    def refresh_model(self):
-        """Reload data and retrain the model"""
-        print("Refreshing SVD model...")
-        self.svd_model = self.train_model()
-        self.last_trained = datetime.datetime.now()
-        self.model_version = f"knn_{self.last_trained.strftime('%Y%m%d_%H%M%S')}"
+    def train_sparse_model(self, df):
+        """
+        Fit the sparse top-k engine on all ratings (newest rating per user and movie), coded like the seen index.
+        """
+        df = df.drop_duplicates(['user_id', 'movie_id'], keep='last')
+        model = SparseKNN(k=KNN_K, block_size=KNN_BLOCK_SIZE, n_jobs=KNN_JOBS)
+        model.fit(self.seen_index.users.encode(df['user_id'], add=False),
+                  self.seen_index.items.encode(df['movie_id'], add=False),
+                  df['rating'].to_numpy(), self.seen_index.n_users, self.seen_index.n_items)
+        print(f"Sparse KNN model trained: {model.n_users} users, k={model.neighbors.shape[1]}")
+        return model
 
-        print(f"{datetime.datetime.now()} - Model refreshed at {self.last_trained}")
-        print(f"{datetime.datetime.now()} - New model version: {self.model_version}")
-        print(f"{datetime.datetime.now()} - Data version: {self.data_version}")
-        
-        return self.svd_model
+    def validate(self):
+        """
+        Sanity-check a freshly trained pipeline before it is published for serving.
+        """
+        # a pipeline loaded from an artifact serves the surprise engine through its scorer alone
+        if self.model is None and self.scorer is None:
+            raise ValueError("KNN pipeline has no trained model")
+        n_users = self.model.n_users if isinstance(self.model, SparseKNN) else len(self.scorer.user_inner_ids)
+        if n_users == 0:
+            raise ValueError("KNN pipeline has no trained model")
+        return True
+
+    def save_artifact(self, root=ARTIFACT_DIR, keep=ARTIFACT_KEEP):
+        """
+        Persist the trained model as a versioned artifact directory under `root`, then delete all
+        but the `keep` newest artifacts (none if `keep` is 0).
+        """
+        path = artifacts.save_knn_artifact(self, root)
+        print(f"{datetime.datetime.now()} - Saved KNN model artifact to {path}")
+        if keep:
+            for removed in artifacts.prune_artifacts(root, keep):
+                print(f"{datetime.datetime.now()} - Removed old KNN model artifact {removed}")
+        return path
+
+    def load_artifact(self, path):
+        """
+        Memory-map a model artifact written by `save_artifact` instead of training.
+        """
+        artifact = artifacts.load_knn_artifact(path)
+        meta = artifact['meta']
+        self.model = artifact['model']
+        self.scorer = artifact['scorer']
+        self.seen_index = artifact['seen_index']
+        self.model_version = meta['model_version']
+        self.data_version = meta['data_version']
+        self.last_trained = datetime.datetime.fromisoformat(meta['last_trained']) if meta['last_trained'] else None
+        self.training_seconds = meta.get('training_seconds')
+        print(f"{datetime.datetime.now()} - Loaded KNN model artifact {path}")
+
+    def get_recommendations(self, user_id, num_recommendations=20, timings=None):
+        timings = timings if timings is not None else StageTimings()
+        # Unseen movies come from the in-memory index built with the model (all movies for unknown users)
+        index = self.seen_index
+        with timings.stage("seen_lookup"):
+            user_code = index.user_code(user_id)
+            unseen = index.unseen_items(user_code)
+
+        # Score all unseen movies at once, then select the top ones without a full sort
+        with timings.stage("scoring"):
+            if isinstance(self.model, SparseKNN):
+                scores = self.model.score(user_code)[unseen]
+            else:
+                scores = self.scorer.score(user_id, unseen)
+        with timings.stage("top_k"):
+            return index.item_ids[unseen[top_k(scores, num_recommendations)]].tolist()
 
+    def get_recommendations_batch(self, user_ids, num_recommendations=20, chunk_size=BATCH_CHUNK_SIZE):
+        """
+        Recommendations for several users, in the order of `user_ids`.
+        Known users are scored `chunk_size` at a time: with one sparse matrix product per chunk for
+        the sparse engine, with KNNScorer.score_many for the surprise engine (in smaller chunks if
+        a chunk would gather more than BATCH_MAX_ENTRIES ratings). Unknown users go through
+        get_recommendations.
+        """
+        index = self.seen_index
+        results = [None] * len(user_ids)
+        if isinstance(self.model, SparseKNN):
+            score_many = lambda codes: self.model.score_many(codes)
+        else:
+            chunk_size = max(1, min(chunk_size, BATCH_MAX_ENTRIES // max(len(self.scorer.raters), 1)))
+            score_many = lambda codes: self.scorer.score_many(index.user_ids[list(codes)])
 
-    def get_recommendations(self, user_id, num_recommendations=20):
-        df = self.load_clean_data()
-        all_movies = set(df['movie_id'].unique())
-        seen_movies = set(df[df['user_id'] == user_id]['movie_id'].unique())
-        unseen_movies = list(all_movies - seen_movies)
+        known = [(position, index.user_code(user_id)) for position, user_id in enumerate(user_ids)]
+        known = [(position, code) for position, code in known if code is not None]
+        for start in range(0, len(known), chunk_size):
+            positions, codes = zip(*known[start:start + chunk_size])
+            best, valid = top_unseen(score_many(codes), index, codes, num_recommendations)
+            for position, row, count in zip(positions, best, valid):
+                results[position] = index.item_ids[row[:count]].tolist()
 
-        predictions = [self.model.predict(user_id, m) for m in unseen_movies]
-        top = sorted(predictions, key=lambda x: x.est, reverse=True)[:num_recommendations]
-        return [p.iid for p in top]
+        return [result if result is not None else self.get_recommendations(user_id, num_recommendations)
+                for user_id, result in zip(user_ids, results)]
@@ -1,14 +1,29 @@
 from dotenv import load_dotenv
 from pymongo import MongoClient
+from bson import ObjectId
 import numpy as np
 import pandas as pd
-import ast
 import datetime
 import os
+import tempfile
 
 from surprise import SVD, Dataset, Reader
 from surprise.model_selection import train_test_split
 
+from .scoring import SVDScorer, top_k
+from .seen_index import SeenItemIndex
+from .materialize import materialize_recommendations, recommend_users
+from .ann import build_candidate_index
+from .tuning import search_svd_hyperparameters
+from .loader import load_columns, stream_columns
+from .snapshot import TrainingSnapshot, format_data_version
+from .sgd import MinibatchSVD, RatingArrays, write_rating_snapshot
+from .ids import IdDictionary
+from .popularity import PopularityRanking
+from .movie_features import MovieFeatures, join_genres, parse_adult
+from .timing import StageTimings
+from . import artifacts
+
 # Load environment variables from a .env file if available
 load_dotenv()
 
@@ -16,6 +31,57 @@ load_dotenv()
 MONGO_URI = os.getenv('MONGO_URI', 'localhost')
 USER_DB = os.getenv('USER_DB', 'user_database')
 MOVIE_DB = os.getenv('MOVIE_DB', 'movie_database')
+# Precompute top-N lists for all known users after each (re)training
+MATERIALIZE_RECOMMENDATIONS = os.getenv('MATERIALIZE_RECOMMENDATIONS', 'true').lower() == 'true'
+MATERIALIZED_TOP_N = int(os.getenv('MATERIALIZED_TOP_N', 20))
+# Users scored per matrix product in batch requests
+BATCH_CHUNK_SIZE = int(os.getenv('BATCH_CHUNK_SIZE', 256))
+# Candidate retrieval for live scoring: "exact" scores every item, "ivf" probes the closest item clusters
+CANDIDATE_INDEX = os.getenv('SVD_CANDIDATE_INDEX', 'exact')
+IVF_LISTS = int(os.getenv('SVD_IVF_LISTS', 0)) or None
+IVF_PROBES = int(os.getenv('SVD_IVF_PROBES', 8))
+# Regularization used when folding new ratings into user vectors
+FOLD_IN_REG = float(os.getenv('SVD_FOLD_IN_REG', 0.02))
+# Directory of versioned, memory-mappable model artifacts
+ARTIFACT_DIR = os.getenv('SVD_ARTIFACT_DIR', os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'artifacts', 'svd')))
+# Number of newest artifacts kept when a new one is saved (the one LATEST points at is always kept); 0 keeps all
+ARTIFACT_KEEP = int(os.getenv('SVD_ARTIFACT_KEEP', 3))
+# Cold-start popularity ranking: half-life of an interaction's weight, and how many items each ranking keeps
+POPULARITY_HALF_LIFE_DAYS = float(os.getenv('POPULARITY_HALF_LIFE_DAYS', 2))
+POPULARITY_DEPTH = int(os.getenv('POPULARITY_DEPTH', 200))
+# Persisted user/movie ID dictionaries, so integer codes stay stable across retrains and processes
+ID_DIR = os.getenv('SVD_ID_DIR', os.path.join(ARTIFACT_DIR, 'ids'))
+# "default" fits SVD() once, "search" runs a parallel hyperparameter search and keeps the best configuration,
+# "minibatch" streams the ratings into an on-disk snapshot and trains the same model on it with minibatch
+# SGD, without loading them into a DataFrame
+TRAINING_MODE = os.getenv('SVD_TRAINING_MODE', 'default')
+# Where minibatch training writes its temporary rating snapshots; on disk, not in a possibly RAM-backed /tmp
+RATING_SNAPSHOT_DIR = os.getenv('SVD_RATING_SNAPSHOT_DIR', os.path.join(ARTIFACT_DIR, 'ratings'))
+# Maximum number of documents fetched per collection; 0 fetches everything (the default in minibatch mode)
+TRAINING_SIZE = int(os.getenv('SVD_TRAINING_SIZE', 0 if TRAINING_MODE == 'minibatch' else 5000)) or None
+MINIBATCH_SIZE = int(os.getenv('SVD_MINIBATCH_SIZE', 1024))
+MINIBATCH_EPOCHS = int(os.getenv('SVD_MINIBATCH_EPOCHS', 20))
+MINIBATCH_CHUNK_SIZE = int(os.getenv('SVD_MINIBATCH_CHUNK_SIZE', 1_000_000))
+SEARCH_BUDGET_SECONDS = float(os.getenv('SVD_SEARCH_BUDGET_SECONDS', 600))
+SEARCH_ITER = int(os.getenv('SVD_SEARCH_ITER', 0)) or None
+SEARCH_JOBS = int(os.getenv('SVD_SEARCH_JOBS', 0)) or None
+# random_state of every searched configuration and of the published winner
+SEARCH_SEED = int(os.getenv('SVD_SEARCH_SEED', 0))
+# Cursor batch size for loading training data, and whether to trace peak memory while loading
+LOADER_BATCH_SIZE = int(os.getenv('LOADER_BATCH_SIZE', 10000))
+LOADER_TRACK_MEMORY = os.getenv('LOADER_TRACK_MEMORY', 'false').lower() == 'true'
+
+def watch_minutes(minute_mpg):
+    """Numeric watch time in minutes from 'minute_mpg' values such as "42.mpg" (NaN if there is none)."""
+    return pd.Series(minute_mpg, dtype=object).str.extract(r'(\d+)', expand=False).astype(float).to_numpy()
+
+def scale_watch_time(watch_time, min_watch, max_watch):
+    """
+    Watch minutes scaled from [min_watch, max_watch] to the 1-5 rating scale and clipped to it, so watch times
+    outside the range (recorded after it was taken) stay on the scale; a single-value range maps to 1.
+    """
+    scaled = 1.0 + (np.asarray(watch_time, dtype=float) - min_watch) / ((max_watch - min_watch) or 1.0) * 4
+    return np.clip(scaled, 1, 5)
 
 class DB:
     """ 
@@ -34,90 +100,162 @@ class SVDPipeline:
         It connects to MongoDB, loads and cleans data, and trains a recommendation model 
         that predicts user ratings for unseen movies.
     """
-    def __init__(self):
+    def __init__(self, artifact_path=None, snapshots=None):
         self.DB = DB()
+        self.init_state(snapshots)
+        if artifact_path is not None:
+            # Serve a previously trained model without touching MongoDB
+            self.load_artifact(artifact_path)
+            return
+        training_started = datetime.datetime.now()
+        self.svd_model = self.train_and_save_model()
+        self.finish_training(training_started)
+
+    def init_state(self, snapshots=None):
+        """Attributes of a pipeline that has not been trained or loaded yet."""
+        # Cached training data per collection; pass a previous pipeline's snapshots to refresh incrementally
+        self.snapshots = snapshots if snapshots is not None else {}
+        self.data_version = None
         self.movies_df = None
         self.users_df = None
         self.ratings_df = None
         self.watch_df = None
         self.combined_ratings_df = None
-        self.training_size = 5000
-        self.svd_model = self.train_and_save_model()
+        self.seen_index = None
+        self.scorer = None
+        self.candidate_index = None
+        self.recommendation_table = None
+        self.popularity = None
+        self.movie_features = None
+        self.watch_time_range = None
+        self.last_folded_in = None
+        self.fold_in_count = 0
+        self.artifact_ratings = None
+        self.hyperparameters = {}
+        self.tuning_results = []
+        self.load_stats = {}
+        self.training_size = TRAINING_SIZE
+        self.training_seconds = None
+        self.svd_model = None
+        self.last_trained = None
+        self.model_version = None
+
+    def finish_training(self, training_started, materialize=MATERIALIZE_RECOMMENDATIONS):
+        """Materialize recommendations if enabled, then stamp the training time and model version."""
+        if materialize:
+            self.materialize_recommendations()
         self.last_trained = datetime.datetime.now()
+        self.training_seconds = (self.last_trained - training_started).total_seconds()
         self.model_version = f"svd_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"  # Track model version
-        self.data_version = f"data_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"  # Track data version
-        
+
     def get_model_info(self):
         """Return information about the current model"""
         return {
             "model_version": self.model_version,
             "data_version": self.data_version,
             "last_trained": self.last_trained.isoformat() if self.last_trained else None,
-            "training_size": self.training_size
+            "last_folded_in": self.last_folded_in.isoformat() if self.last_folded_in else None,
+            "hyperparameters": self.hyperparameters,
+            "training_size": self.training_size,
+            "training_seconds": self.training_seconds
+        }
+
+    def get_model_stats(self):
+        """Bytes of the serving arrays (memory-mapped ones included), number of movies and last training time"""
+        scorer, index, table = self.scorer, self.seen_index, self.recommendation_table
+        arrays = [scorer.item_factors, scorer.item_bias, scorer.user_factors, scorer.user_bias,
+                  index.indptr, index.indices, index.candidate_mask]
+        if table is not None:
+            arrays += [table.item_codes, table.counts]
+        return {
+            "model_bytes": int(sum(np.asarray(array).nbytes for array in arrays if array is not None)),
+            "n_items": index.n_items,
+            "training_seconds": self.training_seconds,
         }
     
-    def fetch_collection_data(self, db, collection_name, days_back=None, filter_field="timestamp"):
+    def fetch_collection_data(self, db, collection_name, days_back=None, filter_field="timestamp", query=None,
+                              fields=None, dtypes=None, incremental=False):
         """
         Fetches data from a specified MongoDB collection while keeping '_id' as 'movie_id'.
+        An optional `query` further restricts the documents fetched, and `fields` limits the
+        columns requested from MongoDB (all of them if None).
+
+        With `incremental`, the rows are cached in a TrainingSnapshot and later calls only fetch
+        documents newer than its watermark. Only use it for append-only collections: an upserted
+        document keeps its `_id`, so later changes to it would never be fetched.
         """
         collection = db[collection_name]
+
+        if incremental and fields is not None:
+            snapshot = self.snapshots.get(collection_name)
+            if snapshot is None:
+                window_field = filter_field if days_back is not None else None
+                snapshot = TrainingSnapshot(fields, dtypes, window_field, days_back, self.training_size)
+                self.snapshots[collection_name] = snapshot
+            df, stats = snapshot.refresh(collection, query, batch_size=LOADER_BATCH_SIZE,
+                                         measure_memory=LOADER_TRACK_MEMORY)
+            self.load_stats[collection_name] = stats
+            print(f"Fetched {snapshot.last_fetched} new rows from {collection_name} after watermark, "
+                  f"{len(df)} rows cached")
+            return df
+
+        query = dict(query or {})
         
         if days_back is not None and filter_field is not None:
             # Calculate cutoff date
             cutoff_date = datetime.datetime.now() - datetime.timedelta(days=days_back)
             
             # Create query filter
-            query = {filter_field: {"$gte": cutoff_date}}
+            query[filter_field] = {"$gte": cutoff_date}
             
-            data = list(collection.find(query).limit(self.training_size))
-        else:
-            data = list(collection.find({}).limit(self.training_size))
-                
-        df = pd.DataFrame(data)    
+        df, stats = load_columns(collection, fields, query, limit=self.training_size, dtypes=dtypes,
+                                 batch_size=LOADER_BATCH_SIZE, measure_memory=LOADER_TRACK_MEMORY)
+        self.load_stats[collection_name] = stats
+        print(f"Loaded {stats['rows']} rows from {collection_name} at {stats['rows_per_sec']:.0f} rows/sec"
+              + (f", peak {stats['peak_bytes'] / 2**20:.1f} MiB" if 'peak_bytes' in stats else ""))
         return df
 
     def clean_user_data(self, user_db):
         """
         Loads and cleans user data from MongoDB (user_database.user_info).
         """
-        df = self.fetch_collection_data(user_db, "user_info")
+        df = self.fetch_collection_data(user_db, "user_info", fields=['age', 'occupation', 'gender'])
         return df[['age', 'occupation', 'gender']]
 
     def clean_ratings_data(self, movie_db):
         """
         Loads and cleans ratings data from MongoDB (movie_database.user_rate_data).
         """
-        df = self.fetch_collection_data(movie_db, "user_rate_data", 7)
+        df = self.fetch_collection_data(movie_db, "user_rate_data", 7, fields=['user_id', 'movie_id', 'score', 'time'],
+                                        dtypes={'score': np.float64}, incremental=True)
 
         df['movie_id'] = df['movie_id'].astype(str)
 
-        return df[['user_id', 'movie_id', 'score']]
+        # event time is kept when available, for the time-decayed popularity ranking
+        return df[['user_id', 'movie_id', 'score'] + (['time'] if 'time' in df.columns else [])]
 
-    def clean_movie_data(self, movie_db):
+    def clean_movie_data(self, movie_db, query=None):
         """
         Loads and cleans movie data from MongoDB (movie_database.movie_info).
         """
-        df = self.fetch_collection_data(movie_db, "movie_info")
+        # Always a full load: movies are upserted in place (same _id), so an _id watermark would miss
+        # changed metadata, and the catalogue is small
+        df = self.fetch_collection_data(movie_db, "movie_info", query=query,
+                                        fields=['movie_id', 'adult', 'genres', 'release_date', 'original_language'])
 
         # Ensure movie_id exists; MongoDB might not store it explicitly
-        if 'movie_id' not in df.columns:
+        if 'movie_id' not in df.columns or df['movie_id'].isna().all():
+            df = df.drop(columns='movie_id', errors='ignore')
             df.reset_index(inplace=True)  # Reset index in case movie_id is missing
             df.rename(columns={'index': 'movie_id'}, inplace=True)  # Assign unique ID if missing
 
-        # Convert genres from list of dictionaries to comma-separated string
+        # Genres as comma-separated names, in one pass over native arrays (run migrate_genres.py for legacy strings)
         if 'genres' in df.columns:
-            def extract_genre_names(genre_data):
-                """Helper function to extract genre names correctly."""
-                if isinstance(genre_data, str):  # Handle stringified JSON
-                    try:
-                        genre_data = ast.literal_eval(genre_data)
-                    except (ValueError, SyntaxError):
-                        return ""
-                if isinstance(genre_data, list):
-                    return ', '.join([genre.get('name', '') for genre in genre_data])
-                return ""
-
-            df['genres'] = df['genres'].apply(extract_genre_names)
+            df['genres'] = join_genres(df['genres'])
+        if 'original_language' in df.columns:
+            df['original_language'] = df['original_language'].astype('category')
+        if 'adult' in df.columns:
+            df['adult'] = parse_adult(df['adult'])
 
         # Ensure movie_id is in string format for consistency
         df['movie_id'] = df['movie_id'].astype(str)
@@ -128,22 +266,24 @@ class SVDPipeline:
         """
         Loads and cleans watch history data from MongoDB (movie_database.user_watch_data).
         """
-        df = self.fetch_collection_data(movie_db, "user_watch_data", 7)
+        df = self.fetch_collection_data(movie_db, "user_watch_data", 7, fields=['user_id', 'movie_id', 'minute_mpg', 'time'],
+                                        incremental=True)
 
         df['movie_id'] = df['movie_id'].astype(str)
 
         # Extract numeric watch time from "minute_mpg"
         if 'minute_mpg' in df.columns:
-            df['watch_time'] = df['minute_mpg'].str.extract(r'(\d+)').astype(float)
+            df['watch_time'] = watch_minutes(df['minute_mpg'])
         else:
             raise KeyError("Column 'minute_mpg' is missing from the dataset!")
 
         # Normalize watch time to a rating scale (1-5) instead of (0-5)
         min_watch = df['watch_time'].min()
         max_watch = df['watch_time'].max()
+        self.watch_time_range = (min_watch, max_watch)  # reused to scale watches folded in later
         df['rating'] = 1.0 + (df['watch_time'] - min_watch) / (max_watch - min_watch) * 4  # Scale between 1 and 5
 
-        return df[['user_id', 'movie_id', 'rating']]
+        return df[['user_id', 'movie_id', 'rating'] + (['time'] if 'time' in df.columns else [])]
     
     def load_clean_data(self):
         """
@@ -159,8 +299,10 @@ class SVDPipeline:
         Train the SVD model on user rating data and save it to a file.
         """
         print("Start Training...")
+        if TRAINING_MODE == 'minibatch':
+            return self.train_streaming()
         self.load_clean_data()
-        self.data_version = f"data_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.data_version = format_data_version(self.snapshots)
 
         print("Finish Data Collection...")
         # Merge explicit and implicit ratings
@@ -172,59 +314,473 @@ class SVDPipeline:
         self.combined_ratings_df['user_id'] = self.combined_ratings_df['user_id'].astype(str)
         self.combined_ratings_df['movie_id'] = self.combined_ratings_df['movie_id'].astype(str)
 
-        # Load data into Surprise
-        reader = Reader(rating_scale=(1, 5))
-        data = Dataset.load_from_df(self.combined_ratings_df[['user_id', 'movie_id', 'rating']], reader)
-        trainset, testset = train_test_split(data, test_size=0.2)
+        # Codes come from the shared dictionaries, which are saved with the users and movies added
+        users = IdDictionary.load(os.path.join(ID_DIR, 'users.npy'))
+        items = IdDictionary.load(os.path.join(ID_DIR, 'items.npy'))
+        svd_model = self.build_model(users, items)
+        self.seen_index.users.save(os.path.join(ID_DIR, 'users.npy'))
+        self.seen_index.items.save(os.path.join(ID_DIR, 'items.npy'))
 
-        # Train SVD model
-        svd_model = SVD()
-        svd_model.fit(trainset)
+        print("SVD model trained successfully.")
+        return svd_model
+
+    def train_streaming(self):
+        """
+        Minibatch training without `combined_ratings_df`: the ratings and scaled watches are streamed
+        from MongoDB into a temporary rating snapshot, coded with the shared ID dictionaries, and the
+        seen-item index, popularity ranking and model are built from its memory-mapped arrays. Only
+        the integer codes and values are kept afterwards, for artifacts and fold-in.
+        """
+        self.movies_df = self.clean_movie_data(self.DB.movie_db)
+        self.users_df = self.clean_user_data(self.DB.user_db)
+        self.data_version = format_data_version(self.snapshots)
+
+        users = IdDictionary.load(os.path.join(ID_DIR, 'users.npy'))
+        items = IdDictionary.load(os.path.join(ID_DIR, 'items.npy'))
+        os.makedirs(RATING_SNAPSHOT_DIR, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=RATING_SNAPSHOT_DIR) as path:
+            snapshot = write_rating_snapshot(path, self.stream_ratings(self.DB.movie_db), users, items)
+            print(f"Finish Data Collection... streamed {len(snapshot)} ratings to {path}")
+
+            self.recommendation_table = None
+            self.seen_index = SeenItemIndex.from_codes(users, items, snapshot.user_codes, snapshot.item_codes,
+                                                       self.movies_df['movie_id'])
+            self.popularity = self.build_popularity(snapshot.item_codes, snapshot.times)
+            self.scorer = self.fit_minibatch(snapshot)
+            self.artifact_ratings = (np.array(snapshot.user_codes), np.array(snapshot.item_codes),
+                                     np.array(snapshot.ratings))
+            del snapshot  # release the memory maps before the directory is removed
+
+        self.candidate_index = build_candidate_index(self.scorer, CANDIDATE_INDEX, IVF_LISTS, IVF_PROBES)
+        users.save(os.path.join(ID_DIR, 'users.npy'))
+        items.save(os.path.join(ID_DIR, 'items.npy'))
 
         print("SVD model trained successfully.")
+        return None
+
+    def stream_ratings(self, movie_db, days_back=7):
+        """
+        Yield (user_ids, movie_ids, ratings, times) batches of the last `days_back` days of ratings and
+        watches, cleaned like `clean_ratings_data` and `clean_watch_data`, one cursor batch at a time.
+        Scaling watch times needs their range first, which takes an extra pass over 'minute_mpg' only;
+        watches recorded between the two passes are clipped to the scale, and without any watch in the
+        first pass they count as unscored.
+        """
+        query = {"timestamp": {"$gte": datetime.datetime.now() - datetime.timedelta(days=days_back)}}
+
+        def stream(collection_name, fields, dtypes=None):
+            return stream_columns(movie_db[collection_name], fields, query, limit=self.training_size,
+                                  dtypes=dtypes, batch_size=LOADER_BATCH_SIZE)
+
+        def cleaned(user_ids, movie_ids, ratings, times):
+            return (user_ids.astype(str), movie_ids.astype(str), np.where(np.isnan(ratings), 2.5, ratings), times)
+
+        for batch in stream("user_rate_data", ['user_id', 'movie_id', 'score', 'time'], {'score': np.float64}):
+            yield cleaned(batch['user_id'], batch['movie_id'], batch['score'], batch['time'])
+
+        min_watch, max_watch = np.inf, -np.inf
+        for batch in stream("user_watch_data", ['minute_mpg']):
+            watch_time = watch_minutes(batch['minute_mpg'])
+            if not np.isnan(watch_time).all():
+                min_watch, max_watch = min(min_watch, np.nanmin(watch_time)), max(max_watch, np.nanmax(watch_time))
+        self.watch_time_range = (min_watch, max_watch) if min_watch <= max_watch else None
+
+        for batch in stream("user_watch_data", ['user_id', 'movie_id', 'minute_mpg', 'time']):
+            watch_time = watch_minutes(batch['minute_mpg'])
+            # Scale between 1 and 5, like clean_watch_data
+            if self.watch_time_range is not None:
+                ratings = scale_watch_time(watch_time, *self.watch_time_range)
+            else:
+                ratings = np.full(len(watch_time), np.nan)
+            yield cleaned(batch['user_id'], batch['movie_id'], ratings, batch['time'])
+
+    def build_model(self, users, items):
+        """
+        Build the serving state from `combined_ratings_df` and `movies_df`: the seen-item index (with
+        the codes of the `users` and `items` dictionaries), the popularity ranking, the scorer trained
+        according to SVD_TRAINING_MODE and the candidate index. Returns the surprise model (None after
+        minibatch training).
+        """
+        # Build the per-user seen-item index once per model version
+        self.recommendation_table = None
+        self.seen_index = SeenItemIndex.from_ratings(self.combined_ratings_df, self.movies_df['movie_id'], users, items)
+        self.popularity = self.build_popularity()
+
+        svd_model = None
+        if TRAINING_MODE == 'minibatch':
+            self.scorer = self.fit_minibatch()
+        else:
+            # Load data into Surprise
+            reader = Reader(rating_scale=(1, 5))
+            if TRAINING_MODE == 'search':
+                # The winner is refit on all ratings with the random_state it was evaluated with
+                trainset, params, rmse = self.search_hyperparameters(reader)
+            else:
+                data = Dataset.load_from_df(self.combined_ratings_df[['user_id', 'movie_id', 'rating']], reader)
+                trainset, testset = train_test_split(data, test_size=0.2)
+                params, rmse = {}, None
+
+            # Train SVD model
+            svd_model = SVD(**params)
+            svd_model.fit(trainset)
+            self.hyperparameters = dict(params, rmse=rmse) if rmse is not None else params
+
+            # Extract factors once per model version
+            self.scorer = SVDScorer.from_model(svd_model, self.seen_index.item_ids)
+
+        self.candidate_index = build_candidate_index(self.scorer, CANDIDATE_INDEX, IVF_LISTS, IVF_PROBES)
         return svd_model
     
-    def refresh_model(self):
-        """Reload data and retrain the model"""
-        print("Refreshing SVD model...")
-        self.svd_model = self.train_and_save_model()
-        self.last_trained = datetime.datetime.now()
-        self.model_version = f"svd_{self.last_trained.strftime('%Y%m%d_%H%M%S')}"
+    def get_movie_features(self):
+        """
+        Genre matrix and language/adult columns of `movies_df`, rebuilt only when the data version changes.
+        """
+        features = self.movie_features
+        if features is None or features.data_version != self.data_version:
+            features = self.movie_features = MovieFeatures.from_movies(self.movies_df, self.data_version)
+        return features
 
-        print(f"{datetime.datetime.now()} - Model refreshed at {self.last_trained}")
-        print(f"{datetime.datetime.now()} - New model version: {self.model_version}")
-        print(f"{datetime.datetime.now()} - Data version: {self.data_version}")
-        
-        return self.svd_model
+    def build_popularity(self, item_codes=None, times=None):
+        """
+        Build the cold-start rankings from the movie metadata and the interactions' `item_codes` and
+        `times` (those of the combined ratings by default).
+        """
+        index, ratings = self.seen_index, self.combined_ratings_df
+        features = self.get_movie_features()
+        rows = features.rows(index.item_ids)
+        if item_codes is None:
+            item_codes = index.items.encode(ratings['movie_id'], add=False)
+            times = ratings['time'] if 'time' in ratings.columns else None
+
+        return PopularityRanking.build(
+            item_codes, index.n_items, times=times,
+            candidate_mask=index.candidate_mask, item_genres=features.genre_lists(rows),
+            item_languages=features.languages(rows),
+            half_life_days=POPULARITY_HALF_LIFE_DAYS, depth=POPULARITY_DEPTH)
+
+    def get_recommendations_batch(self, user_ids, num_recommendations=20, chunk_size=BATCH_CHUNK_SIZE):
+        """
+        Generate recommendations for several users, in the order of `user_ids`.
+        Materialized users are looked up; the other known users are scored `chunk_size` at a time
+        with one matrix product per chunk, over every unseen movie (the candidate index is not used).
+        Cold-start users (see `is_cold_start`), and users with nothing left to recommend, get the most
+        popular movies.
+        """
+        index = self.seen_index
+        codes = [index.user_code(str(user_id)) if user_id is not None else None for user_id in user_ids]
+        results = [None] * len(codes)
+
+        # Known users are served straight from the materialized table
+        table = self.recommendation_table
+        to_score = []
+        for position, user_code in enumerate(codes):
+            if self.is_cold_start(user_code):
+                continue
+            materialized = table.lookup(user_code) if table is not None and num_recommendations <= table.width else None
+            if materialized is not None:
+                results[position] = index.item_ids[materialized[:num_recommendations]].tolist()
+            else:
+                to_score.append(position)
+
+        # Score the rest in chunks, one matrix product per chunk
+        for start in range(0, len(to_score), chunk_size):
+            positions = to_score[start:start + chunk_size]
+            best, valid = recommend_users(self.scorer, index, [codes[p] for p in positions], num_recommendations)
+            for position, row, count in zip(positions, best, valid):
+                if count > 0:
+                    results[position] = index.item_ids[row[:count]].tolist()
+
+        popular = None
+        for position, (user_code, result) in enumerate(zip(codes, results)):
+            if result is not None:
+                continue
+            if user_code is not None and len(index.seen_items(user_code)):
+                results[position] = self.popular_items(num_recommendations, exclude=index.seen_items(user_code))
+            else:
+                popular = popular if popular is not None else self.popular_items(num_recommendations)
+                results[position] = list(popular)
+        return results
+
+    def is_cold_start(self, user_code):
+        """
+        Whether a user is served the popularity ranking instead of model scores: users unknown to the ID
+        dictionaries, users kept in them from an earlier training window without ratings in this
+        model's data, and users the model was not trained on (e.g. all their ratings were held out).
+        """
+        if user_code is None:
+            return True
+        index = self.seen_index
+        if index.indptr[user_code + 1] == index.indptr[user_code]:
+            return True
+        return not self.scorer.knows_user(index.user_ids[user_code])
+
+    def popular_items(self, num_recommendations=20, exclude=None, genre=None, language=None):
+        """
+        Most popular recommendable movies (optionally within a genre or language), without `exclude`.
+        """
+        codes = self.popularity.top(num_recommendations, exclude, genre, language)
+        return self.seen_index.item_ids[codes].tolist()
 
-    def get_recommendations(self, user_id=None, num_recommendations=20):
+    def fit_minibatch(self, arrays=None):
         """
-        Generate movie recommendations for a given user.
-        If no user_id is provided, a random user from the dataset is selected.
+        Train on a RatingArrays coded like the seen index (the combined ratings by default) with
+        minibatch SGD over integer-coded chunks instead of a surprise trainset, and return the scorer
+        over the seen index's users and items.
+        """
+        if arrays is None:
+            ratings = self.combined_ratings_df
+            arrays = RatingArrays(self.seen_index.users.encode(ratings['user_id'], add=False),
+                                  self.seen_index.items.encode(ratings['movie_id'], add=False),
+                                  ratings['rating'].to_numpy(dtype=np.float32))
+
+        model = MinibatchSVD(n_epochs=MINIBATCH_EPOCHS, batch_size=MINIBATCH_SIZE, chunk_size=MINIBATCH_CHUNK_SIZE)
+        model.fit(arrays, self.seen_index.n_users, self.seen_index.n_items)
+        self.hyperparameters = {'n_factors': model.n_factors, 'n_epochs': model.n_epochs, 'lr_all': model.lr,
+                                'reg_all': model.reg, 'batch_size': model.batch_size}
+        return model.to_scorer(self.seen_index.user_ids, self.seen_index.item_ids)
+
+    def search_hyperparameters(self, reader, test_size=0.2):
+        """
+        Run a parallel hyperparameter search on an 80/20 split of the combined ratings.
+        Returns a trainset of all combined ratings, the parameters of the configuration with the lowest
+        test RMSE including the random_state it was evaluated with (surprise's defaults if no
+        configuration finished within the time budget), and that RMSE (None without a winner).
+        """
+        ratings = self.combined_ratings_df
+        user_codes = self.seen_index.users.encode(ratings['user_id'], add=False)
+        item_codes = self.seen_index.items.encode(ratings['movie_id'], add=False)
+        train_mask = np.random.default_rng().random(len(ratings)) >= test_size
+
+        self.tuning_results = search_svd_hyperparameters(
+            user_codes, item_codes, ratings['rating'].to_numpy(), train_mask,
+            n_iter=SEARCH_ITER, time_budget=SEARCH_BUDGET_SECONDS, n_jobs=SEARCH_JOBS,
+            rating_scale=reader.rating_scale, seed=SEARCH_SEED)
+
+        print(f"Evaluated {len(self.tuning_results)} SVD configurations:")
+        for result in self.tuning_results:
+            print(f"  {result}")
+
+        params, rmse = {'random_state': SEARCH_SEED}, None
+        if self.tuning_results:
+            best = self.tuning_results[0]
+            params.update({k: v for k, v in best.items() if k not in ('rmse', 'fit_seconds')})
+            rmse = best['rmse']
+        data = Dataset.load_from_df(ratings[['user_id', 'movie_id', 'rating']], reader)
+        return data.build_full_trainset(), params, rmse
+
+    def validate(self):
+        """
+        Sanity-check a freshly trained pipeline before it is published for serving.
+        """
+        if self.scorer is None or self.seen_index is None:
+            raise ValueError("SVD pipeline has no trained model")
+        if self.seen_index.n_users == 0 or self.seen_index.n_items == 0:
+            raise ValueError("SVD pipeline was trained on empty data")
+        if not np.all(np.isfinite(self.scorer.score(self.seen_index.user_ids[0]))):
+            raise ValueError("SVD pipeline produces non-finite scores")
+        return True
+
+    def save_artifact(self, root=ARTIFACT_DIR, keep=ARTIFACT_KEEP):
+        """
+        Persist the trained model as a versioned artifact directory under `root`, then delete all
+        but the `keep` newest artifacts (none if `keep` is 0).
+        """
+        path = artifacts.save_artifact(self, root)
+        print(f"{datetime.datetime.now()} - Saved model artifact to {path}")
+        if keep:
+            for removed in artifacts.prune_artifacts(root, keep):
+                print(f"{datetime.datetime.now()} - Removed old model artifact {removed}")
+        return path
+
+    def load_artifact(self, path):
+        """
+        Memory-map a model artifact written by `save_artifact` instead of training.
         """
-        # If user id not found, using random user
-        if user_id is None or str(user_id) not in self.combined_ratings_df['user_id'].unique():
-            user_id = str(np.random.choice(self.combined_ratings_df['user_id'].unique()))
+        artifact = artifacts.load_artifact(path)
+        meta = artifact['meta']
+
+        self.svd_model = None
+        self.scorer = artifact['scorer']
+        self.seen_index = artifact['seen_index']
+        self.recommendation_table = artifact['recommendation_table']
+        self.popularity = artifact['popularity']
+        self.candidate_index = build_candidate_index(self.scorer, CANDIDATE_INDEX, IVF_LISTS, IVF_PROBES)
+        self.artifact_ratings = artifact['ratings']
+        self.movies_df = pd.read_json(artifact['movies_path'], orient='records', dtype={'movie_id': str})
+
+        self.model_version = meta['model_version']
+        self.data_version = meta['data_version']
+        self.last_trained = datetime.datetime.fromisoformat(meta['last_trained']) if meta['last_trained'] else None
+        self.training_size = meta['training_size']
+        self.training_seconds = meta.get('training_seconds')
+        self.hyperparameters = meta.get('hyperparameters', {})
+        self.watch_time_range = tuple(meta['watch_time_range']) if meta['watch_time_range'] else None
+        print(f"{datetime.datetime.now()} - Loaded model artifact {path}")
+
+    def training_ratings(self):
+        """
+        The combined training ratings, decoded from the artifact on first use if needed.
+        """
+        if self.combined_ratings_df is None and self.artifact_ratings is not None:
+            user_codes, item_codes, ratings = self.artifact_ratings
+            self.combined_ratings_df = pd.DataFrame({
+                'user_id': self.seen_index.user_ids[user_codes],
+                'movie_id': self.seen_index.item_ids[item_codes],
+                'rating': np.asarray(ratings, dtype=np.float64),
+            })
+        return self.combined_ratings_df
+
+    def fetch_new_ratings(self, since):
+        """
+        Loads ratings and watches inserted into MongoDB after `since`, cleaned like the training data.
+        """
+        # ObjectIds start with their insertion time, so this selects documents inserted after `since`
+        query = {'_id': {'$gt': ObjectId.from_datetime(since.astimezone(datetime.timezone.utc))}}
+        fields = ['user_id', 'movie_id']
+
+        rates, _ = load_columns(self.DB.movie_db['user_rate_data'], fields + ['score'], query,
+                                dtypes={'score': np.float64}, batch_size=LOADER_BATCH_SIZE)
+        watches, _ = load_columns(self.DB.movie_db['user_watch_data'], fields + ['minute_mpg'], query,
+                                  batch_size=LOADER_BATCH_SIZE)
+
+        frames = []
+        if not rates.empty:
+            frames.append(rates.rename(columns={'score': 'rating'})[['user_id', 'movie_id', 'rating']])
+        if not watches.empty:
+            # Scale watch time with the range seen at training time
+            watch_time = watches['minute_mpg'].str.extract(r'(\d+)')[0].astype(float)
+            min_watch, max_watch = self.watch_time_range or (watch_time.min(), watch_time.max())
+            watches['rating'] = scale_watch_time(watch_time, min_watch, max_watch)
+            frames.append(watches[['user_id', 'movie_id', 'rating']])
+
+        if not frames:
+            return pd.DataFrame(columns=['user_id', 'movie_id', 'rating'])
+
+        df = pd.concat(frames, ignore_index=True)
+        df['rating'] = df['rating'].fillna(2.5)
+        df['user_id'] = df['user_id'].astype(str)
+        df['movie_id'] = df['movie_id'].astype(str)
+        return df
 
-        # Get movies the user has already rated
-        rated_movies = set(self.combined_ratings_df[self.combined_ratings_df['user_id'] == user_id]['movie_id'].unique())
+    def fold_in_new_ratings(self, since=None):
+        """
+        Fold ratings recorded since the last training (or fold-in) into the model without retraining.
 
-        # Get all movie IDs available
-        all_movies = set(self.combined_ratings_df['movie_id'].unique())
+        Each affected user's vector and bias are re-solved against the fixed item factors, using all of
+        their known ratings. New users and movies are registered; new movies stay unknown to the model
+        until the next full retrain. Returns the number of new ratings folded in.
+        """
+        since = since or self.last_folded_in or self.last_trained
+        started = datetime.datetime.now()
+        new_ratings = self.fetch_new_ratings(since)
+        if new_ratings.empty:
+            self.last_folded_in = started
+            return 0
+
+        # Register movies that were not part of the training data
+        new_movies = set(new_ratings['movie_id']) - set(self.movies_df['movie_id'])
+        if new_movies:
+            movie_df = self.clean_movie_data(self.DB.movie_db, {'movie_id': {'$in': list(new_movies)}})
+            self.movies_df = pd.concat([self.movies_df, movie_df], ignore_index=True)
+            self.movie_features = None
+
+        combined_ratings_df = pd.concat([self.training_ratings(), new_ratings], ignore_index=True)
+        seen_index = self.seen_index.with_ratings(new_ratings, self.movies_df['movie_id'])
+        scorer = self.scorer.with_items(seen_index.item_ids)
+
+        # Re-solve each affected user with all of their ratings, newest rating per movie wins
+        affected = new_ratings['user_id'].unique()
+        user_ratings = combined_ratings_df[combined_ratings_df['user_id'].isin(affected)]
+        user_ratings = user_ratings.drop_duplicates(['user_id', 'movie_id'], keep='last')
+        item_codes = user_ratings['movie_id'].map(seen_index.item_code).to_numpy()
+        scorer = scorer.fold_in_users(
+            ((user_id, item_codes[rows], user_ratings['rating'].to_numpy()[rows])
+             for user_id, rows in user_ratings.groupby('user_id').indices.items()),
+            reg=FOLD_IN_REG,
+        )
+
+        table = self.recommendation_table
+        if table is not None:
+            table = table.without_users([seen_index.user_code(user_id) for user_id in affected])
+        candidate_index = self.candidate_index
+        if candidate_index is None or CANDIDATE_INDEX == 'exact':
+            candidate_index = build_candidate_index(scorer, CANDIDATE_INDEX, IVF_LISTS, IVF_PROBES)
+
+        self.combined_ratings_df = combined_ratings_df
+        self.seen_index = seen_index
+        self.scorer = scorer
+        self.candidate_index = candidate_index
+        self.recommendation_table = table
+        self.last_folded_in = started
+        self.fold_in_count += 1
+        self.model_version = f"svd_{self.last_trained.strftime('%Y%m%d_%H%M%S')}_fold{self.fold_in_count}"
+
+        print(f"{datetime.datetime.now()} - Folded {len(new_ratings)} new ratings for {len(affected)} users "
+              f"into {self.model_version}")
+        return len(new_ratings)
+
+    def materialize_recommendations(self):
+        """
+        Precompute the top-N list of every known user so requests become a table lookup.
+        """
+        if self.scorer is None or self.seen_index is None:
+            return None
 
-        # Get movies not rated by user
-        movies_to_predict = list(all_movies - rated_movies)
+        start = datetime.datetime.now()
+        self.recommendation_table = materialize_recommendations(self.scorer, self.seen_index, MATERIALIZED_TOP_N)
+        print(f"{datetime.datetime.now()} - Materialized recommendations for {self.seen_index.n_users} users "
+              f"in {(datetime.datetime.now() - start).total_seconds():.2f}s")
+        return self.recommendation_table
 
-        # if no new movies to recommend for user, show random popular movies
+    def get_recommendations(self, user_id=None, num_recommendations=20, timings=None):
+        """
+        Generate movie recommendations for a given user.
+        Cold-start users (see `is_cold_start`, and no user_id) get the most popular movies they have not seen.
+        Time spent per stage is added to `timings` (a StageTimings) when given.
+        """
+        timings = timings if timings is not None else StageTimings()
+        index = self.seen_index
+
+        # Cold-start users get the precomputed popularity ranking
+        with timings.stage("seen_lookup"):
+            user_code = index.user_code(str(user_id)) if user_id is not None else None
+            cold_start = self.is_cold_start(user_code)
+        if cold_start:
+            with timings.stage("top_k"):
+                seen = index.seen_items(user_code) if user_code is not None else None
+                return self.popular_items(num_recommendations, exclude=seen)
+        user_id = index.user_ids[user_code]
+
+        # Known users are served straight from the materialized table
+        table = self.recommendation_table
+        if table is not None and num_recommendations <= table.width:
+            with timings.stage("materialized_lookup"):
+                materialized = table.lookup(user_code)
+                if materialized is not None:
+                    return index.item_ids[materialized[:num_recommendations]].tolist()
+
+        # Get recommendable movies the user has not rated or watched
+        with timings.stage("seen_lookup"):
+            movies_to_predict = index.unseen_items(user_code)
+
+        # if no new movies to recommend for user, show the most popular movies
         if len(movies_to_predict) == 0:
-            return self.movies_df.sample(num_recommendations)[['movie_id', 'genres']]
-
-        # Predict ratings for unseen movies
-        predictions = [self.svd_model.predict(user_id, movie_id) for movie_id in movies_to_predict]
-        predictions.sort(key=lambda x: x.est, reverse=True)
-
-        # Get top recommended movies
-        top_movies = [pred.iid for pred in predictions[:num_recommendations]]
-        recommended_movies = self.movies_df[self.movies_df['movie_id'].isin(top_movies)][['movie_id', 'genres']]
-
-        return recommended_movies['movie_id'].tolist()
\ No newline at end of file
+            with timings.stage("top_k"):
+                return self.popular_items(num_recommendations)
+
+        # Narrow down to the candidate index's items, unless too few of them are left; an exact index
+        # returns every item, so the query vector and candidate list are not worth building
+        if self.candidate_index is not None and not self.candidate_index.exact:
+            with timings.stage("candidates"):
+                candidates = self.candidate_index.candidates(self.scorer.query_vector(user_id))
+                if len(candidates) < index.n_items:
+                    narrowed = np.intersect1d(movies_to_predict, candidates, assume_unique=True)
+                    if len(narrowed) >= num_recommendations:
+                        movies_to_predict = narrowed
+
+        # Score all unseen movies at once and keep the top ones
+        with timings.stage("scoring"):
+            scores = self.scorer.score(user_id, movies_to_predict)
+        with timings.stage("top_k"):
+            best = movies_to_predict[top_k(scores, num_recommendations)]
+            return index.item_ids[best].tolist()
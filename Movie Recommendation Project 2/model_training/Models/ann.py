@@ -0,0 +1,126 @@
+import time
+
+import numpy as np
+
+from .scoring import top_k
+
+
+class ExhaustiveIndex:
+    """
+        Candidate retrieval that returns every item. Used as the exact baseline and fallback.
+    """
+    # every item is a candidate, so callers can skip retrieval altogether
+    exact = True
+
+    def __init__(self, n_items):
+        self.n_items = n_items
+
+    def candidates(self, query):
+        return np.arange(self.n_items)
+
+
+class ClusteredIndex:
+    """
+        Approximate maximum-inner-product candidate retrieval over item vectors (IVF style).
+
+        Item vectors are lifted with an extra coordinate so they all have the same norm, which turns
+        maximum inner product into nearest neighbour search. They are then clustered with k-means into
+        `n_lists` inverted lists. A query scans only the `n_probe` lists whose centroids are closest;
+        raising `n_probe` trades latency for recall, and `n_probe >= n_lists` is exhaustive.
+    """
+    def __init__(self, item_vectors, n_lists=None, n_probe=8, n_iter=20, seed=0):
+        item_vectors = np.asarray(item_vectors, dtype=np.float64)
+        n_items = len(item_vectors)
+        self.n_items = n_items
+        self.n_lists = max(1, min(n_items, n_lists or int(np.sqrt(n_items))))
+        self.n_probe = n_probe
+
+        norms = np.linalg.norm(item_vectors, axis=1)
+        self.max_norm = norms.max() if n_items else 0.0
+        lifted = np.hstack([item_vectors, np.sqrt(np.maximum(self.max_norm ** 2 - norms ** 2, 0))[:, None]])
+
+        self.centroids, assignment = _kmeans(lifted, self.n_lists, n_iter, seed)
+
+        # inverted lists stored CSR-style: items of list c are list_items[list_ptr[c]:list_ptr[c + 1]]
+        order = np.argsort(assignment, kind='stable')
+        self.list_items = order.astype(np.int32)
+        self.list_ptr = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=self.n_lists))])
+
+    @property
+    def exact(self):
+        """Whether every list is probed, so every item is a candidate."""
+        return self.n_probe >= self.n_lists
+
+    def candidates(self, query):
+        """Sorted positions of the items in the `n_probe` lists closest to `query`."""
+        if self.n_probe >= self.n_lists:
+            return np.arange(self.n_items)
+
+        query = np.asarray(query, dtype=np.float64)
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return np.arange(self.n_items)
+
+        # scale the query onto the same sphere as the lifted items; its lifted coordinate is 0
+        lifted_query = np.append(query * (self.max_norm / query_norm), 0.0)
+        distances = ((self.centroids - lifted_query) ** 2).sum(axis=1)
+        probed = np.argpartition(distances, self.n_probe - 1)[:self.n_probe]
+
+        items = np.concatenate([self.list_items[self.list_ptr[c]:self.list_ptr[c + 1]] for c in probed])
+        items.sort()
+        return items
+
+
+def build_candidate_index(scorer, kind="exact", n_lists=None, n_probe=8):
+    """
+    Build a candidate index over the scorer's items. Item vectors are the factors with the item bias
+    appended, so an inner product with `scorer.query_vector(user_id)` ranks items like the full score.
+    """
+    if kind == "exact" or len(scorer.item_ids) < 2:
+        return ExhaustiveIndex(len(scorer.item_ids))
+    if kind == "ivf":
+        item_vectors = np.hstack([scorer.item_factors, scorer.item_bias[:, None]])
+        return ClusteredIndex(item_vectors, n_lists=n_lists, n_probe=n_probe)
+    raise ValueError(f"Unknown candidate index type: {kind}")
+
+
+def recall_at_k(candidate_index, scorer, user_ids, k=20):
+    """
+    Measure recall@k of `candidate_index` against exact scoring, and the mean seconds per query.
+    """
+    hits, total, elapsed = 0, 0, 0.0
+    for user_id in user_ids:
+        exact = set(top_k(scorer.score(user_id), k).tolist())
+
+        start = time.perf_counter()
+        items = candidate_index.candidates(scorer.query_vector(user_id))
+        approx = items[top_k(scorer.score(user_id, items), k)]
+        elapsed += time.perf_counter() - start
+
+        hits += len(exact.intersection(approx.tolist()))
+        total += len(exact)
+
+    return hits / max(total, 1), elapsed / max(len(user_ids), 1)
+
+
+def _kmeans(points, n_clusters, n_iter, seed):
+    """Plain Lloyd's k-means. Returns the centroids and the cluster of each point."""
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), n_clusters, replace=False)].copy()
+    point_norms = (points ** 2).sum(axis=1)
+    assignment = np.zeros(len(points), dtype=np.int64)
+
+    for iteration in range(n_iter):
+        distances = point_norms[:, None] - 2 * points @ centroids.T + (centroids ** 2).sum(axis=1)
+        new_assignment = distances.argmin(axis=1)
+        if iteration > 0 and np.array_equal(new_assignment, assignment):
+            break
+        assignment = new_assignment
+
+        counts = np.bincount(assignment, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, points)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+
+    return centroids, assignment
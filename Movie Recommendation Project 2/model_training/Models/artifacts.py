@@ -0,0 +1,319 @@
+import datetime
+import json
+import os
+import shutil
+
+import numpy as np
+from scipy import sparse
+
+from .knn_engine import KNNScorer, SparseKNN
+from .scoring import SVDScorer
+from .seen_index import SeenItemIndex
+from .materialize import RecommendationTable
+from .popularity import PopularityRanking
+
+LATEST_FILE = "LATEST"
+
+
+def save_artifact(pipeline, root):
+    """
+    Write the serving state of a trained SVDPipeline to `root/<model_version>/` and point
+    `root/LATEST` at it.
+
+    Factors, biases, ID dictionaries, the seen-item index, the materialized table and the popularity
+    ranking are stored as plain .npy files so servers can memory-map them. The directory is written
+    under a temporary name and renamed into place, and LATEST is replaced atomically, so readers never
+    see a partial artifact.
+    """
+    scorer, index = pipeline.scorer, pipeline.seen_index
+    tmp_path = os.path.join(root, f".tmp-{pipeline.model_version}-{os.getpid()}")
+    os.makedirs(tmp_path, exist_ok=True)
+
+    user_rows = sorted(scorer.user_inner_ids.items(), key=lambda item: item[1])
+    arrays = {
+        "item_ids": _id_array(index.item_ids),
+        "item_factors": scorer.item_factors,
+        "item_bias": scorer.item_bias,
+        "item_known": scorer.item_known,
+        "scorer_user_ids": _id_array([user_id for user_id, _ in user_rows]),
+        "user_factors": scorer.user_factors,
+        "user_bias": scorer.user_bias,
+        "user_ids": _id_array(index.user_ids),
+        "seen_indptr": index.indptr,
+        "seen_indices": index.indices,
+        "candidate_mask": index.candidate_mask,
+    }
+
+    # training ratings as integer codes, needed to fold in new ratings later
+    ratings = pipeline.combined_ratings_df
+    if ratings is not None:
+        arrays["rating_user_codes"] = index.users.encode(ratings['user_id'], add=False)
+        arrays["rating_item_codes"] = index.items.encode(ratings['movie_id'], add=False)
+        arrays["rating_values"] = ratings['rating'].to_numpy(dtype=np.float32)
+    elif pipeline.artifact_ratings is not None:
+        # already coded, e.g. after streamed minibatch training
+        arrays["rating_user_codes"], arrays["rating_item_codes"], arrays["rating_values"] = pipeline.artifact_ratings
+
+    table = pipeline.recommendation_table
+    if table is not None:
+        arrays["table_item_codes"] = table.item_codes
+        arrays["table_counts"] = table.counts
+
+    popularity = getattr(pipeline, "popularity", None)
+    if popularity is not None:
+        arrays["popular_items"] = popularity.overall
+
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(array))
+
+    if pipeline.movies_df is not None:
+        pipeline.movies_df.to_json(os.path.join(tmp_path, "movies.json"), orient="records", date_format="iso")
+
+    meta = {
+        "model_version": pipeline.model_version,
+        "data_version": pipeline.data_version,
+        "last_trained": pipeline.last_trained.isoformat() if pipeline.last_trained else None,
+        "training_size": pipeline.training_size,
+        "training_seconds": getattr(pipeline, "training_seconds", None),
+        "hyperparameters": getattr(pipeline, "hyperparameters", {}),
+        "global_mean": scorer.global_mean,
+        "rating_scale": list(scorer.rating_scale),
+        "biased": scorer.biased,
+        "watch_time_range": [float(v) for v in pipeline.watch_time_range] if pipeline.watch_time_range else None,
+        "created": datetime.datetime.now().isoformat(),
+    }
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    if popularity is not None:
+        with open(os.path.join(tmp_path, "popularity.json"), "w") as f:
+            json.dump(popularity.to_json(), f)
+
+    return _move_into_place(root, tmp_path, pipeline.model_version)
+
+
+def save_knn_artifact(pipeline, root):
+    """
+    Write the serving state of a trained KNNPipeline to `root/<model_version>/` and point
+    `root/LATEST` at it, like `save_artifact`.
+
+    The seen-item index is stored with the engine's arrays: the raters of every item and the user x
+    user similarity matrix for the surprise engine, the neighbour lists and the sparse rating matrix
+    for the sparse one. The surprise KNNBasic model itself is not kept; the scorer serves without it.
+    """
+    index = pipeline.seen_index
+    tmp_path = os.path.join(root, f".tmp-{pipeline.model_version}-{os.getpid()}")
+    os.makedirs(tmp_path, exist_ok=True)
+
+    arrays = {
+        "item_ids": _id_array(index.item_ids),
+        "user_ids": _id_array(index.user_ids),
+        "seen_indptr": index.indptr,
+        "seen_indices": index.indices,
+        "candidate_mask": index.candidate_mask,
+    }
+    model = pipeline.model
+    if isinstance(model, SparseKNN):
+        engine = "sparse"
+        params = {"k": model.k, "min_k": model.min_k, "sim": model.sim, "min_support": model.min_support,
+                  "rating_scale": list(model.rating_scale), "global_mean": model.global_mean}
+        arrays.update({
+            "neighbors": model.neighbors,
+            "neighbor_similarities": model.similarities,
+            "ratings_data": model.ratings.data,
+            "ratings_indices": model.ratings.indices,
+            "ratings_indptr": model.ratings.indptr,
+        })
+    else:
+        engine = "surprise"
+        scorer = pipeline.scorer
+        params = {"k": scorer.k, "min_k": scorer.min_k, "rating_scale": list(scorer.rating_scale),
+                  "global_mean": scorer.global_mean}
+        user_rows = sorted(scorer.user_inner_ids.items(), key=lambda item: item[1])
+        arrays.update({
+            "scorer_user_ids": _id_array([user_id for user_id, _ in user_rows]),
+            "rater_indptr": scorer.indptr,
+            "raters": scorer.raters,
+            "rater_ratings": scorer.ratings,
+            "similarities": scorer.similarities,
+        })
+
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(array))
+
+    meta = {
+        "model_version": pipeline.model_version,
+        "data_version": pipeline.data_version,
+        "last_trained": pipeline.last_trained.isoformat() if pipeline.last_trained else None,
+        "training_seconds": getattr(pipeline, "training_seconds", None),
+        "engine": engine,
+        "engine_params": params,
+        "created": datetime.datetime.now().isoformat(),
+    }
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    return _move_into_place(root, tmp_path, pipeline.model_version)
+
+
+def prune_artifacts(root, keep):
+    """
+    Delete all but the `keep` newest artifact directories under `root` and return their paths.
+
+    Artifacts are ordered by when their metadata was written. The one LATEST points at is never
+    deleted, even if it is not among the newest; other entries of `root` (LATEST, temporary
+    directories of saves in progress, the ID dictionaries) are left alone. Processes that still have
+    a deleted artifact memory-mapped keep reading it until they unmap it.
+    """
+    latest = latest_version(root)
+    versions = []
+    for name in os.listdir(root):
+        meta_file = os.path.join(root, name, "meta.json")
+        if not name.startswith(".") and os.path.isfile(meta_file):
+            versions.append((os.path.getmtime(meta_file), name))
+
+    removed = []
+    for _, name in sorted(versions, reverse=True)[max(keep, 0):]:
+        if name != latest:
+            path = os.path.join(root, name)
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+    return removed
+
+
+def latest_version(root):
+    """Model version LATEST points at, or None if there is none."""
+    try:
+        with open(os.path.join(root, LATEST_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def latest_artifact(root):
+    """Path of the artifact LATEST points at, or None if there is none."""
+    version = latest_version(root)
+    path = os.path.join(root, version) if version else None
+    return path if path and os.path.isdir(path) else None
+
+
+def load_artifact(path):
+    """
+    Memory-map an artifact written by `save_artifact`.
+
+    Returns a dict with the metadata and the rebuilt scorer, seen index and table; the large arrays
+    stay memory-mapped (read-only), so processes loading the same artifact share pages.
+    """
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+
+    def load(name):
+        file = os.path.join(path, f"{name}.npy")
+        return np.load(file, mmap_mode="r") if os.path.exists(file) else None
+
+    item_ids = load("item_ids")
+    scorer = SVDScorer(
+        item_ids=item_ids,
+        item_factors=load("item_factors"),
+        item_bias=load("item_bias"),
+        item_known=load("item_known"),
+        user_factors=load("user_factors"),
+        user_bias=load("user_bias"),
+        user_inner_ids={user_id: row for row, user_id in enumerate(load("scorer_user_ids").tolist())},
+        global_mean=meta["global_mean"],
+        rating_scale=tuple(meta["rating_scale"]),
+        biased=meta["biased"],
+    )
+    seen_index = SeenItemIndex(load("user_ids"), item_ids, load("seen_indptr"), load("seen_indices"),
+                               load("candidate_mask"))
+
+    table = None
+    if load("table_counts") is not None:
+        table = RecommendationTable(load("table_item_codes"), load("table_counts"))
+
+    ratings = None
+    if load("rating_values") is not None:
+        ratings = (load("rating_user_codes"), load("rating_item_codes"), load("rating_values"))
+
+    popularity = None
+    if load("popular_items") is not None:
+        groups = {}
+        if os.path.exists(os.path.join(path, "popularity.json")):
+            with open(os.path.join(path, "popularity.json")) as f:
+                groups = json.load(f)
+        popularity = PopularityRanking(load("popular_items"), groups.get("by_genre"), groups.get("by_language"))
+
+    return {
+        "meta": meta,
+        "scorer": scorer,
+        "seen_index": seen_index,
+        "recommendation_table": table,
+        "ratings": ratings,
+        "popularity": popularity,
+        "movies_path": os.path.join(path, "movies.json"),
+    }
+
+
+def load_knn_artifact(path):
+    """
+    Memory-map an artifact written by `save_knn_artifact`.
+
+    Returns a dict with the metadata, the seen index and either a KNNScorer (surprise engine) or a
+    SparseKNN (sparse engine) built on the read-only memory-mapped arrays.
+    """
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+
+    def load(name):
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+    item_ids = load("item_ids")
+    seen_index = SeenItemIndex(load("user_ids"), item_ids, load("seen_indptr"), load("seen_indices"),
+                               load("candidate_mask"))
+    params = dict(meta["engine_params"])
+    params["rating_scale"] = tuple(params["rating_scale"])
+    model, scorer = None, None
+    if meta["engine"] == "sparse":
+        global_mean = params.pop("global_mean")
+        model = SparseKNN(**params)
+        model.ratings = sparse.csr_matrix(
+            (load("ratings_data"), load("ratings_indices"), load("ratings_indptr")),
+            shape=(seen_index.n_users, seen_index.n_items))
+        model.rated = model.ratings.copy()
+        model.rated.data = np.ones_like(model.rated.data)
+        model.neighbors = load("neighbors")
+        model.similarities = load("neighbor_similarities")
+        model.global_mean = global_mean
+    else:
+        scorer = KNNScorer(
+            item_ids=item_ids,
+            indptr=load("rater_indptr"),
+            raters=load("raters"),
+            ratings=load("rater_ratings"),
+            similarities=load("similarities"),
+            user_inner_ids={user_id: row for row, user_id in enumerate(load("scorer_user_ids").tolist())},
+            **params,
+        )
+
+    return {"meta": meta, "seen_index": seen_index, "model": model, "scorer": scorer}
+
+
+def _id_array(ids):
+    # fixed-width unicode instead of object dtype, so ID dictionaries can be memory-mapped too
+    return np.asarray([str(i) for i in ids], dtype=str)
+
+
+def _move_into_place(root, tmp_path, version):
+    # readers only ever see complete artifact directories, and LATEST is replaced atomically
+    path = os.path.join(root, version)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+    _write_latest(root, version)
+    return path
+
+
+def _write_latest(root, version):
+    tmp_file = os.path.join(root, f".{LATEST_FILE}.{os.getpid()}")
+    with open(tmp_file, "w") as f:
+        f.write(version)
+    os.replace(tmp_file, os.path.join(root, LATEST_FILE))
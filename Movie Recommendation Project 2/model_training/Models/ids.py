@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class IdDictionary:
+    """
+        Append-only interning of raw user or movie ids to stable int32 codes.
+
+        Codes are assigned in order of first appearance and never change, so integer arrays built
+        against one dictionary can be joined and compared without touching the raw strings; ids are
+        only decoded back at the edges (HTTP responses, logs).
+    """
+    def __init__(self, ids=()):
+        self._ids = list(ids.tolist() if hasattr(ids, 'tolist') else ids)
+        self._codes = {raw_id: code for code, raw_id in enumerate(self._ids)}
+        self._array = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, raw_id):
+        return raw_id in self._codes
+
+    @property
+    def ids(self):
+        """All interned ids as an object array; position == code."""
+        if self._array is None or len(self._array) != len(self._ids):
+            self._array = np.asarray(self._ids, dtype=object)
+        return self._array
+
+    def copy(self):
+        return IdDictionary(self._ids)
+
+    def code(self, raw_id):
+        """Code of `raw_id`, or None if it was never interned."""
+        return self._codes.get(raw_id)
+
+    def encode(self, values, add=True):
+        """
+        Codes of `values` as an int32 array. New ids are interned if `add`, otherwise they map to -1.
+        Only the distinct values go through the Python dictionary.
+        """
+        inverse, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+        unique_codes = np.empty(len(uniques), dtype=np.int32)
+        for position, raw_id in enumerate(uniques.tolist()):
+            code = self._codes.get(raw_id)
+            if code is None:
+                if add:
+                    code = self._codes[raw_id] = len(self._ids)
+                    self._ids.append(raw_id)
+                else:
+                    code = -1
+            unique_codes[position] = code
+        return unique_codes[inverse]
+
+    def decode(self, codes):
+        """Raw ids of `codes`."""
+        return self.ids[np.asarray(codes, dtype=np.int64)]
+
+    def save(self, path):
+        """Write the ids as a fixed-width unicode .npy file, replacing `path` atomically."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray([str(i) for i in self._ids], dtype=str))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a dictionary written by `save`; an empty one if `path` does not exist."""
+        if not os.path.exists(path):
+            return cls()
+        return cls(np.load(path))
+
+
+def rated_recommendations(ratings, recommendations):
+    """
+    Rows of `ratings` (a frame with 'user_id' and 'movie_id' columns) whose movie was recommended to
+    that user, with `recommendations` given as {user_id: [movie_id, ...]}.
+
+    Users and movies of both sides are interned into shared dictionaries and each (user, movie) pair
+    becomes one int64 key, so the join is a single `np.isin` instead of filtering the frame once per user.
+    """
+    rec_users, rec_movies = [], []
+    for user_id, movie_ids in recommendations.items():
+        movie_ids = [str(movie_id) for movie_id in movie_ids]
+        rec_users.extend([str(user_id)] * len(movie_ids))
+        rec_movies.extend(movie_ids)
+
+    users, movies = IdDictionary(), IdDictionary()
+    rating_users, rating_movies = users.encode(ratings['user_id']), movies.encode(ratings['movie_id'])
+    rec_user_codes, rec_movie_codes = users.encode(rec_users), movies.encode(rec_movies)
+    n_movies = len(movies)
+    rating_keys = rating_users.astype(np.int64) * n_movies + rating_movies
+    rec_keys = rec_user_codes.astype(np.int64) * n_movies + rec_movie_codes
+    return ratings[np.isin(rating_keys, rec_keys)]
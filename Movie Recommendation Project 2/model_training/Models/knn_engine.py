@@ -0,0 +1,279 @@
+import multiprocessing
+import os
+
+import numpy as np
+from scipy import sparse
+
+from .scoring import top_k
+
+SIMILARITIES = ("msd", "cosine")
+
+
+class SparseKNN:
+    """
+        User-based k-nearest-neighbour model over a sparse user x item rating matrix.
+
+        Similarities use surprise's definitions (msd, the KNNBasic default, or cosine), computed over
+        commonly rated items with sparse products, one block of users at a time. Only each user's `k`
+        most similar users are kept, in two (n_users, k) arrays, so memory is O(n_users * k) instead
+        of the O(n_users^2) matrix surprise builds. Blocks are spread over `n_jobs` processes.
+
+        Unlike surprise, which picks the k nearest users among the raters of each item, the neighbour
+        lists are fixed per user; with `k` at least the number of users the estimates are the same.
+    """
+    def __init__(self, k=40, min_k=1, sim="msd", min_support=1, block_size=256, n_jobs=None,
+                 rating_scale=(1, 5)):
+        if sim not in SIMILARITIES:
+            raise ValueError(f"Unknown similarity {sim!r}, expected one of {SIMILARITIES}")
+        self.k = k
+        self.min_k = min_k
+        self.sim = sim
+        self.min_support = min_support
+        self.block_size = block_size
+        self.n_jobs = n_jobs
+        self.rating_scale = tuple(rating_scale)
+
+    @property
+    def n_users(self):
+        return self.ratings.shape[0]
+
+    @property
+    def n_items(self):
+        return self.ratings.shape[1]
+
+    def fit(self, user_codes, item_codes, ratings, n_users=None, n_items=None):
+        """
+        Fit on integer-coded ratings, one rating per (user, item) pair.
+        Codes index the rows and columns of the rating matrix, so they can come from a SeenItemIndex.
+        """
+        user_codes = np.asarray(user_codes, dtype=np.int64)
+        item_codes = np.asarray(item_codes, dtype=np.int64)
+        values = np.asarray(ratings, dtype=np.float64)
+        if (values <= 0).any():
+            # zero products would drop out of the sparse patterns the similarities are aligned on
+            raise ValueError("SparseKNN needs positive ratings")
+        n_users = n_users if n_users is not None else int(user_codes.max(initial=-1)) + 1
+        n_items = n_items if n_items is not None else int(item_codes.max(initial=-1)) + 1
+
+        self.ratings = sparse.csr_matrix((values, (user_codes, item_codes)), shape=(n_users, n_items))
+        self.ratings.sort_indices()
+        self.rated = self.ratings.copy()
+        self.rated.data = np.ones_like(self.rated.data)
+        self.global_mean = float(values.mean()) if len(values) else float(np.mean(self.rating_scale))
+
+        blocks = [(start, min(start + self.block_size, n_users)) for start in range(0, n_users, self.block_size)]
+        args = (self.ratings, self.k, self.sim, self.min_support)
+        n_jobs = min(self.n_jobs or os.cpu_count(), len(blocks))
+        if n_jobs > 1:
+            with multiprocessing.Pool(n_jobs, initializer=_init_worker, initargs=args) as pool:
+                results = pool.map(_neighbour_block, blocks)
+        else:
+            _init_worker(*args)
+            results = [_neighbour_block(block) for block in blocks]
+
+        k = min(self.k, max(n_users - 1, 0))
+        self.neighbors = np.full((n_users, k), -1, dtype=np.int32)
+        self.similarities = np.zeros((n_users, k), dtype=np.float32)
+        for (start, end), (neighbors, similarities) in zip(blocks, results):
+            self.neighbors[start:end] = neighbors
+            self.similarities[start:end] = similarities
+        return self
+
+    def score(self, user_code):
+        """
+        Estimated ratings of every item for one user, as a sparse product of the neighbour
+        similarities with the neighbours' ratings. Items no neighbour has rated, and every item for
+        unknown users, get the global mean. The user is never their own neighbour, so only the
+        estimates of unseen items are comparable with surprise's.
+        """
+        scores = np.full(self.n_items, self.global_mean)
+        if user_code is None or user_code < 0 or user_code >= self.n_users:
+            return scores
+
+        valid = (self.neighbors[user_code] >= 0) & (self.similarities[user_code] > 0)
+        neighbors = self.neighbors[user_code][valid]
+        weights = self.similarities[user_code][valid].astype(np.float64)
+        if len(neighbors) == 0:
+            return scores
+
+        weighted = self.ratings[neighbors].T @ weights
+        total = self.rated[neighbors].T @ weights
+        support = self.rated[neighbors].getnnz(axis=0)
+        known = (total > 0) & (support >= self.min_k)
+        scores[known] = weighted[known] / total[known]
+        return np.clip(scores, *self.rating_scale)
+
+    def score_many(self, user_codes):
+        """
+        Estimated ratings of every item for several users, one row per user, from one sparse
+        (users x neighbours) weight matrix multiplied with the ratings. Matches `score` row by row.
+        """
+        codes = np.asarray(user_codes, dtype=np.int64)
+        scores = np.full((len(codes), self.n_items), self.global_mean)
+        known = np.flatnonzero((codes >= 0) & (codes < self.n_users))
+        if len(known) == 0:
+            return scores
+
+        neighbors = self.neighbors[codes[known]]
+        similarities = self.similarities[codes[known]].astype(np.float64)
+        valid = (neighbors >= 0) & (similarities > 0)
+        rows = np.nonzero(valid)[0]
+        weights = sparse.csr_matrix((similarities[valid], (rows, neighbors[valid])), shape=(len(known), self.n_users))
+        linked = weights.copy()
+        linked.data = np.ones_like(linked.data)
+
+        weighted = (weights @ self.ratings).toarray()
+        total = (weights @ self.rated).toarray()
+        support = (linked @ self.rated).toarray()
+        estimates = np.full((len(known), self.n_items), self.global_mean)
+        ok = (total > 0) & (support >= self.min_k)
+        estimates[ok] = weighted[ok] / total[ok]
+        scores[known] = estimates
+        return np.clip(scores, *self.rating_scale)
+
+
+class KNNScorer:
+    """
+        Vectorized scoring view over a trained surprise KNNBasic model (user-based).
+
+        The raters of every item and their ratings are laid out once per model version in CSR arrays
+        aligned to a fixed item universe. Scoring a user's candidate items gathers all their raters at
+        once, picks the `k` most similar per item with one lexsort and sums the weighted ratings with
+        bincount. Estimates match `KNNBasic.predict()`, including tie-breaking between equally similar
+        neighbours, the `min_k` rule and clipping to the rating scale.
+    """
+    def __init__(self, item_ids, indptr, raters, ratings, similarities, user_inner_ids, k, min_k,
+                 global_mean, rating_scale):
+        self.item_ids = np.asarray(item_ids, dtype=object)
+        self.indptr = indptr                  # (n_items + 1,) raters of item p are raters[indptr[p]:indptr[p + 1]]
+        self.raters = raters                  # inner user ids, in the trainset's order
+        self.ratings = ratings
+        self.similarities = similarities      # the model's (n_users, n_users) similarity matrix
+        self.user_inner_ids = user_inner_ids  # raw user id -> row of similarities
+        self.k = k
+        self.min_k = min_k
+        self.global_mean = float(global_mean)
+        self.rating_scale = rating_scale
+
+    @classmethod
+    def from_model(cls, knn_model, item_ids):
+        """
+        Lay out the raters of `item_ids` from a fitted user-based surprise KNN model.
+        """
+        if not knn_model.sim_options.get('user_based', True):
+            raise ValueError("KNNScorer needs a user-based model")
+        trainset = knn_model.trainset
+        item_ids = np.asarray(item_ids, dtype=object)
+
+        item_ratings = [trainset.ir.get(trainset._raw2inner_id_items.get(iid, -1), []) for iid in item_ids]
+        indptr = np.concatenate([[0], np.cumsum([len(ratings) for ratings in item_ratings])]).astype(np.int64)
+        pairs = np.array([pair for ratings in item_ratings for pair in ratings], dtype=np.float64).reshape(-1, 2)
+
+        return cls(
+            item_ids=item_ids,
+            indptr=indptr,
+            raters=pairs[:, 0].astype(np.int32),
+            ratings=pairs[:, 1],
+            similarities=knn_model.sim,
+            user_inner_ids=dict(trainset._raw2inner_id_users),
+            k=knn_model.k,
+            min_k=knn_model.min_k,
+            global_mean=trainset.global_mean,
+            rating_scale=trainset.rating_scale,
+        )
+
+    def score(self, user_id, items=None):
+        """
+        Estimated ratings of `user_id` for the item positions `items` (all items by default).
+        Unknown users and items, and items with fewer than `min_k` positive neighbours, get the global mean.
+        """
+        return self.score_many([user_id], items)[0]
+
+    def score_many(self, user_ids, items=None):
+        """
+        Estimated ratings of several users as a (len(user_ids), len(items)) matrix whose rows equal
+        `score`. The raters of the items are gathered once for all users, and the k most similar raters
+        of every (user, item) pair are picked with one lexsort, so memory grows with
+        len(user_ids) * (ratings of the items).
+        """
+        items = np.arange(len(self.item_ids)) if items is None else np.asarray(items, dtype=np.int64)
+        n_items = len(items)
+        scores = np.full((len(user_ids), n_items), self.global_mean)
+        inner = [self.user_inner_ids.get(user_id) for user_id in user_ids]
+        known = np.array([position for position, row in enumerate(inner) if row is not None], dtype=np.int64)
+        if len(known) and n_items:
+            # every (candidate item, rater) entry, in the trainset's rater order
+            starts, counts = self.indptr[items], self.indptr[items + 1] - self.indptr[items]
+            rows = np.repeat(np.arange(n_items), counts)
+            entries = np.arange(counts.sum()) + np.repeat(starts - np.cumsum(counts) + counts, counts)
+            similarities = self.similarities[np.array([inner[p] for p in known])][:, self.raters[entries]].ravel()
+
+            # one group per (user, item); within it, a stable order keeps the earlier rater on ties, like heapq.nlargest
+            groups = (np.arange(len(known))[:, None] * n_items + rows).ravel()
+            group_entries = np.tile(entries, len(known))
+            group_counts = np.tile(counts, len(known))
+            order = np.lexsort((group_entries, -similarities, groups))
+            rank = np.arange(len(order)) - np.repeat(np.cumsum(group_counts) - group_counts, group_counts)
+            kept = order[(rank < self.k) & (similarities[order] > 0)]
+
+            n_groups = len(known) * n_items
+            weight = np.bincount(groups[kept], weights=similarities[kept], minlength=n_groups)
+            weighted = np.bincount(groups[kept], weights=similarities[kept] * self.ratings[group_entries[kept]],
+                                   minlength=n_groups)
+            actual_k = np.bincount(groups[kept], minlength=n_groups)
+            possible = (actual_k >= self.min_k) & (weight != 0)
+            block = np.full(n_groups, self.global_mean)
+            block[possible] = weighted[possible] / weight[possible]
+            scores[known] = block.reshape(len(known), n_items)
+        return np.clip(scores, *self.rating_scale)
+
+
+# ---- block workers ----
+
+_WORKER = {}
+
+
+def _init_worker(ratings, k, sim, min_support):
+    rated = ratings.copy()
+    rated.data = np.ones_like(rated.data)
+    squared = ratings.copy()
+    squared.data = squared.data ** 2
+    _WORKER.update(ratings=ratings, rated=rated, squared=squared, k=k, sim=sim, min_support=min_support)
+
+
+def _neighbour_block(block):
+    """Top-k neighbours (and their similarities) of the users in rows [start, end)."""
+    start, end = block
+    ratings, rated, squared = _WORKER["ratings"], _WORKER["rated"], _WORKER["squared"]
+    n_users = ratings.shape[0]
+    k = min(_WORKER["k"], max(n_users - 1, 0))
+
+    # every product has the same sparsity pattern: the pairs of users with a commonly rated item
+    support = _sorted(rated[start:end] @ rated.T)
+    dot = _sorted(ratings[start:end] @ ratings.T).data
+    if _WORKER["sim"] == "msd":
+        squared_diff = (_sorted(squared[start:end] @ rated.T).data + _sorted(rated[start:end] @ squared.T).data
+                        - 2 * dot)
+        values = 1 / (np.maximum(squared_diff, 0) / support.data + 1)
+    else:
+        norms = _sorted(squared[start:end] @ rated.T).data * _sorted(rated[start:end] @ squared.T).data
+        values = np.divide(dot, np.sqrt(norms), out=np.zeros_like(dot), where=norms > 0)
+    values[support.data < _WORKER["min_support"]] = 0
+
+    neighbors = np.full((end - start, k), -1, dtype=np.int32)
+    similarities = np.zeros((end - start, k), dtype=np.float32)
+    for row in range(end - start):
+        lo, hi = support.indptr[row], support.indptr[row + 1]
+        columns, row_values = support.indices[lo:hi], values[lo:hi]
+        keep = (columns != start + row) & (row_values > 0)
+        columns, row_values = columns[keep], row_values[keep]
+        best = top_k(row_values, k)
+        neighbors[row, :len(best)] = columns[best]
+        similarities[row, :len(best)] = row_values[best]
+    return neighbors, similarities
+
+
+def _sorted(matrix):
+    matrix = matrix.tocsr()
+    matrix.sort_indices()
+    return matrix
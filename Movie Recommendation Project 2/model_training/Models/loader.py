@@ -0,0 +1,107 @@
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+
+def load_columns(collection, fields=None, query=None, limit=None, dtypes=None, batch_size=10000,
+                 measure_memory=False):
+    """
+    Stream a MongoDB query into a DataFrame, one cursor batch at a time.
+
+    Only `fields` are requested from the server (all fields if None, `_id` only if listed). Each batch
+    of documents is turned into typed NumPy column chunks right away, so at most `batch_size` documents
+    exist as Python dicts at any time. `dtypes` maps fields to NumPy dtypes; fields without one are kept
+    as objects, and float fields get NaN where a document lacks them.
+
+    Returns the frame and a stats dict with "rows", "seconds", "rows_per_sec" and, if
+    `measure_memory` is set, "peak_bytes" allocated while loading.
+    """
+    dtypes = dtypes or {}
+
+    started_tracing = measure_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    elif measure_memory:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+
+    names = list(fields) if fields is not None else []
+    chunks = {name: [] for name in names}
+    rows = 0
+    for batch in _batches(_find(collection, fields, query, limit, batch_size), batch_size):
+        rows = _append_batch(batch, names, chunks, dtypes, rows, discover=fields is None)
+
+    df = pd.DataFrame({name: _concat(chunks[name], dtypes.get(name)) for name in names})
+
+    seconds = time.perf_counter() - start
+    stats = {"rows": rows, "seconds": seconds, "rows_per_sec": rows / seconds if seconds > 0 else float("inf")}
+    if measure_memory:
+        stats["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        if started_tracing:
+            tracemalloc.stop()
+    return df, stats
+
+
+def stream_columns(collection, fields, query=None, limit=None, dtypes=None, batch_size=10000):
+    """
+    Stream a MongoDB query as one dict of typed NumPy columns per cursor batch, with the conventions of
+    `load_columns`, for callers that write the rows elsewhere instead of keeping them all in memory.
+    """
+    dtypes = dtypes or {}
+    for batch in _batches(_find(collection, fields, query, limit, batch_size), batch_size):
+        yield {name: _column((doc.get(name, _missing(dtypes.get(name))) for doc in batch), len(batch), dtypes.get(name))
+               for name in fields}
+
+
+def _find(collection, fields, query, limit, batch_size):
+    projection = None
+    if fields is not None:
+        projection = {field: 1 for field in fields}
+        if '_id' not in fields:
+            projection['_id'] = 0
+    cursor = collection.find(query or {}, projection, batch_size=batch_size)
+    return cursor.limit(limit) if limit else cursor
+
+
+def _batches(cursor, batch_size):
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _append_batch(batch, names, chunks, dtypes, rows, discover):
+    if discover:
+        # without a projection, columns are discovered as they appear; backfill earlier rows
+        for doc in batch:
+            for name in doc:
+                if name not in chunks:
+                    names.append(name)
+                    chunks[name] = [np.full(rows, _missing(dtypes.get(name)), dtype=dtypes.get(name, object))]
+
+    for name in names:
+        dtype = dtypes.get(name)
+        missing = _missing(dtype)
+        chunks[name].append(_column((doc.get(name, missing) for doc in batch), len(batch), dtype))
+    return rows + len(batch)
+
+
+def _column(values, count, dtype):
+    # object columns go through fromiter too, so list-valued fields are not broadcast into 2-D arrays
+    return np.fromiter(values, dtype=dtype or object, count=count)
+
+
+def _missing(dtype):
+    return np.nan if dtype is not None and np.dtype(dtype).kind == 'f' else None
+
+
+def _concat(chunks, dtype):
+    if not chunks:
+        return np.empty(0, dtype=dtype or object)
+    return np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
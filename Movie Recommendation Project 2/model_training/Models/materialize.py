@@ -0,0 +1,86 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .scoring import top_k_rows
+
+
+class RecommendationTable:
+    """
+        Precomputed top-N recommendations for every known user, keyed by user code.
+
+        `item_codes[u]` holds the item codes recommended to user code `u`, best first and padded
+        with -1; `counts[u]` is how many of them are valid.
+    """
+    def __init__(self, item_codes, counts):
+        self.item_codes = item_codes
+        self.counts = counts
+
+    @property
+    def width(self):
+        return self.item_codes.shape[1]
+
+    def lookup(self, user_code):
+        """Item codes recommended to `user_code`, best first, or None if the user is not materialized."""
+        if user_code >= len(self.counts) or self.counts[user_code] <= 0:
+            return None
+        return self.item_codes[user_code, :self.counts[user_code]]
+
+    def without_users(self, user_codes):
+        """Return a table where `user_codes` are no longer materialized, e.g. after a fold-in."""
+        counts = self.counts.copy()
+        user_codes = np.asarray(user_codes, dtype=np.int64)
+        counts[user_codes[user_codes < len(counts)]] = 0
+        return RecommendationTable(self.item_codes, counts)
+
+
+def materialize_recommendations(scorer, index, num_recommendations=20, chunk_size=1024, n_jobs=None):
+    """
+    Score every active user in `index` with `scorer` and keep their top `num_recommendations` unseen items.
+
+    Users are scored in chunks as one matrix product per chunk. Chunks run on a thread pool sized to
+    the number of cores: the matrix product and partial sort release the GIL, and threads share the
+    factor arrays without copying them. Users without seen items in this model's data (kept only
+    for stable codes) and users the scorer was not trained on are left unmaterialized.
+    """
+    n_users = index.n_users
+    item_codes = np.full((n_users, num_recommendations), -1, dtype=np.int32)
+    counts = np.zeros(n_users, dtype=np.int32)
+    active = index.active_users()
+    active = active[[scorer.knows_user(user_id) for user_id in index.user_ids[active]]]
+
+    def materialize_chunk(start):
+        codes = active[start:start + chunk_size]
+        best, valid = recommend_users(scorer, index, codes, num_recommendations)
+        item_codes[codes, :best.shape[1]] = best
+        counts[codes] = valid
+
+    with ThreadPoolExecutor(max_workers=n_jobs or os.cpu_count()) as executor:
+        list(executor.map(materialize_chunk, range(0, len(active), chunk_size)))
+
+    return RecommendationTable(item_codes, counts)
+
+
+def recommend_users(scorer, index, user_codes, num_recommendations=20):
+    """
+    Top `num_recommendations` unseen, recommendable item codes for each of `user_codes`, scored with
+    one `scorer.score_many` matrix product. Returns a (len(user_codes), k) array padded with -1 and
+    the valid count per row.
+    """
+    codes = np.asarray(user_codes, dtype=np.int64)
+    return top_unseen(scorer.score_many(index.user_ids[codes]), index, codes, num_recommendations)
+
+
+def top_unseen(scores, index, user_codes, num_recommendations=20):
+    """
+    Row-wise top items of a (len(user_codes), n_items) score matrix, leaving out items without
+    metadata and items each user has already seen. The matrix is modified in place.
+    """
+    codes = np.asarray(user_codes, dtype=np.int64)
+    scores[:, ~index.candidate_mask] = -np.inf
+    lengths = index.indptr[codes + 1] - index.indptr[codes]
+    rows = np.repeat(np.arange(len(codes)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    scores[rows, index.indices[np.repeat(index.indptr[codes], lengths) + offsets]] = -np.inf
+    return top_k_rows(scores, num_recommendations)
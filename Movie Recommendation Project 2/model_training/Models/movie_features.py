@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def genre_pairs(genres):
+    """
+    Flatten a genres column into (row position, genre name) pairs.
+
+    Accepts the native arrays of genre names the consumer stores and comma-separated strings (the
+    cleaned form), flattened together with one `explode`. Stringified lists of {'id', 'name'} dicts
+    written before the consumer stored arrays are parsed once, by data_processing/migrate_genres.py;
+    rows still holding one count as having no genres.
+    """
+    values = pd.Series(genres, dtype=object).reset_index(drop=True)
+    values[values.str.startswith('[', na=False)] = None
+    split = values.str.split(',')
+    values = values.where(split.isna(), split)
+
+    # non-string elements become NaN under .str and are dropped with the empty names
+    names = values.explode().str.strip()
+    names = names[names.notna() & (names != '')]
+    return names.index.to_numpy(dtype=np.int64), names.to_numpy(dtype=object)
+
+
+def join_genres(genres):
+    """Comma-separated genre names per row of a genres column ('' when there are none)."""
+    rows, names = genre_pairs(genres)
+    joined = pd.Series(names, index=rows, dtype=object).groupby(level=0).agg(', '.join)
+    return joined.reindex(np.arange(len(genres)), fill_value='').to_numpy(dtype=object)
+
+
+def parse_adult(adult):
+    """Boolean `adult` flags from native booleans or their string forms; missing counts as False."""
+    return pd.Series(adult, dtype=object).astype(str).str.strip().str.lower().eq('true').to_numpy()
+
+
+class MovieFeatures:
+    """
+        Item features derived from the cleaned movie metadata, built once per data version.
+
+        Genres are a sparse multi-hot matrix (movies x genres, CSR) so genre filters are a column
+        slice; the original language is a pandas Categorical and `adult` a boolean array, all
+        aligned with `movie_ids`.
+    """
+    def __init__(self, movie_ids, genre_matrix, genre_names, language, adult, data_version=None):
+        self.movie_ids = np.asarray(movie_ids, dtype=object)
+        self.genre_matrix = sparse.csr_matrix(genre_matrix, dtype=bool)
+        self.genre_names = np.asarray(genre_names, dtype=object)
+        self.language = pd.Categorical(language)
+        self.adult = np.asarray(adult, dtype=bool)
+        self.data_version = data_version
+        self._rows = pd.Index(self.movie_ids)
+        self._genre_columns = {name: column for column, name in enumerate(self.genre_names.tolist())}
+
+    @classmethod
+    def from_movies(cls, movies_df, data_version=None):
+        """Build the features from a frame with 'movie_id', 'genres', 'original_language' and 'adult'."""
+        movies = movies_df.drop_duplicates('movie_id', keep='last').reset_index(drop=True)
+        n_movies = len(movies)
+
+        rows, names = genre_pairs(movies['genres'] if 'genres' in movies.columns else [None] * n_movies)
+        columns, genre_names = pd.factorize(names, sort=True)
+        genre_matrix = sparse.csr_matrix((np.ones(len(rows), dtype=bool), (rows, columns)),
+                                         shape=(n_movies, len(genre_names)))
+
+        language = movies['original_language'] if 'original_language' in movies.columns else [None] * n_movies
+        adult = parse_adult(movies['adult']) if 'adult' in movies.columns else np.zeros(n_movies, dtype=bool)
+        return cls(movies['movie_id'].astype(str), genre_matrix, genre_names, language, adult, data_version)
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def rows(self, movie_ids):
+        """Row of each movie id, -1 for movies without metadata."""
+        return self._rows.get_indexer(pd.Index(np.asarray(movie_ids, dtype=object)))
+
+    def genre_mask(self, genre):
+        """Boolean mask over the rows of the movies tagged with `genre`."""
+        column = self._genre_columns.get(genre)
+        if column is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.genre_matrix[:, column].toarray().ravel()
+
+    def genre_lists(self, rows):
+        """Genre names of each row in `rows` (None for -1)."""
+        indptr, indices = self.genre_matrix.indptr, self.genre_matrix.indices
+        return [self.genre_names[indices[indptr[row]:indptr[row + 1]]].tolist() if row >= 0 else None
+                for row in np.asarray(rows, dtype=np.int64)]
+
+    def languages(self, rows):
+        """Original language of each row in `rows` (None for -1 or missing)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        values = np.asarray(self.language, dtype=object)[np.maximum(rows, 0)]
+        return [value if row >= 0 and not pd.isna(value) else None for row, value in zip(rows, values)]
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+from .scoring import top_k
+
+
+class PopularityRanking:
+    """
+        Precomputed cold-start rankings, built once per training.
+
+        Recommendable items are ranked by their time-decayed number of ratings and watches, overall
+        and within each genre and original language. Rankings are arrays of item codes, best first and
+        truncated to `depth`, so answering a request is a slice.
+    """
+    def __init__(self, overall, by_genre=None, by_language=None):
+        self.overall = np.asarray(overall, dtype=np.int32)
+        self.by_genre = {k: np.asarray(v, dtype=np.int32) for k, v in (by_genre or {}).items()}
+        self.by_language = {k: np.asarray(v, dtype=np.int32) for k, v in (by_language or {}).items()}
+
+    @classmethod
+    def build(cls, item_codes, n_items, times=None, candidate_mask=None, item_genres=None, item_languages=None,
+              half_life_days=2.0, depth=200, now=None):
+        """
+        Rank items from interaction item codes. An interaction `half_life_days` older than the newest one
+        counts half; interactions without a time count like the oldest one. `item_genres` and
+        `item_languages` give, per item code, a list of genres and a language (or None).
+        """
+        item_codes = np.asarray(item_codes, dtype=np.int64)
+        weights = np.ones(len(item_codes))
+        if times is not None and len(item_codes):
+            times = pd.to_datetime(pd.Series(times), errors='coerce')
+            reference = pd.Timestamp(now) if now is not None else times.max()
+            age_days = ((reference - times).dt.total_seconds() / 86400).to_numpy()
+            age_days = np.where(np.isnan(age_days), np.nanmax(age_days) if np.isfinite(age_days).any() else 0, age_days)
+            weights = 0.5 ** (np.maximum(age_days, 0) / half_life_days)
+        scores = np.bincount(item_codes, weights=weights, minlength=n_items)
+
+        candidates = np.flatnonzero(candidate_mask) if candidate_mask is not None else np.arange(n_items)
+
+        def rank(codes):
+            codes = np.asarray(codes, dtype=np.int64)
+            return codes[top_k(scores[codes], depth)]
+
+        def group(values):
+            groups = {}
+            for code in candidates:
+                keys = values[code]
+                if keys is None or (not isinstance(keys, (list, tuple)) and pd.isna(keys)):
+                    continue
+                for key in (keys if isinstance(keys, (list, tuple)) else [keys]):
+                    groups.setdefault(key, []).append(code)
+            return {key: rank(codes) for key, codes in groups.items()}
+
+        return cls(rank(candidates),
+                   group(item_genres) if item_genres is not None else None,
+                   group(item_languages) if item_languages is not None else None)
+
+    def top(self, n, exclude=None, genre=None, language=None):
+        """
+        The `n` most popular item codes, optionally within a genre or language and without the codes in
+        `exclude`. Unknown genres and languages fall back to the overall ranking.
+        """
+        ranking = self.overall
+        if genre is not None and genre in self.by_genre:
+            ranking = self.by_genre[genre]
+        elif language is not None and language in self.by_language:
+            ranking = self.by_language[language]
+        if exclude is not None and len(exclude):
+            ranking = ranking[~np.isin(ranking, exclude)]
+        return ranking[:n]
+
+    def to_json(self):
+        return {
+            "by_genre": {k: v.tolist() for k, v in self.by_genre.items()},
+            "by_language": {k: v.tolist() for k, v in self.by_language.items()},
+        }
@@ -0,0 +1,257 @@
+import numpy as np
+
+
+def top_k(scores, k):
+    """
+    Return the positions of the k highest scores, best first.
+
+    Uses a partial selection (argpartition) so only the k winners get sorted.
+    Ties keep their original order, like a stable descending sort would.
+    """
+    scores = np.asarray(scores)
+    k = min(int(k), len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if k < len(scores):
+        # scores tied with the k-th best are taken in position order, so the selection is stable too
+        threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        above = np.flatnonzero(scores > threshold)
+        tied = np.flatnonzero(scores == threshold)[:k - len(above)]
+        candidates = np.sort(np.concatenate([above, tied]))
+    else:
+        candidates = np.arange(len(scores))
+
+    order = np.argsort(-scores[candidates], kind='stable')
+    return candidates[order]
+
+
+def top_k_rows(scores, k):
+    """
+    Row-wise version of `top_k` for a (n_rows, n_items) score matrix.
+
+    Entries set to -inf are treated as excluded. Returns a (n_rows, k) array of item
+    positions, best first and padded with -1, plus the number of valid entries per row.
+    """
+    n_rows, n_items = scores.shape
+    k = min(int(k), n_items)
+    if k <= 0:
+        return np.full((n_rows, 0), -1, dtype=np.int32), np.zeros(n_rows, dtype=np.int32)
+
+    if k < n_items:
+        # as in top_k, scores tied with each row's k-th best are taken in position order
+        partitioned = np.argpartition(-scores, k - 1, axis=1)[:, k - 1:k]
+        threshold = np.take_along_axis(scores, partitioned, axis=1)
+        above = scores > threshold
+        tied = scores == threshold
+        needed = k - above.sum(axis=1, keepdims=True)
+        selected = above | (tied & (np.cumsum(tied, axis=1) <= needed))
+        candidates = np.flatnonzero(selected).reshape(n_rows, k) % n_items
+    else:
+        candidates = np.broadcast_to(np.arange(n_items), (n_rows, n_items))
+
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    best = np.take_along_axis(candidates, order, axis=1).astype(np.int32)
+
+    valid = np.isfinite(np.take_along_axis(candidate_scores, order, axis=1))
+    best[~valid] = -1
+    return best, valid.sum(axis=1).astype(np.int32)
+
+
+class SVDScorer:
+    """
+        Vectorized scoring view over a trained surprise SVD model.
+
+        The user/item factor matrices and biases are pulled out of the model once per model version
+        and aligned to a fixed item universe, so all scores for a user come from a single
+        matrix-vector product. Estimates match `SVD.predict()`, including clipping to the rating scale.
+    """
+    def __init__(self, item_ids, item_factors, item_bias, item_known, user_factors, user_bias,
+                 user_inner_ids, global_mean, rating_scale, biased=True):
+        self.item_ids = np.asarray(item_ids, dtype=object)
+        self.item_factors = item_factors      # (n_items, n_factors), zero rows for items unknown to the model
+        self.item_bias = item_bias            # (n_items,), zero for items unknown to the model
+        self.item_known = item_known          # (n_items,) bool
+        self.user_factors = user_factors      # (n_users, n_factors) in trainset inner-id order
+        self.user_bias = user_bias            # (n_users,)
+        self.user_inner_ids = user_inner_ids  # raw user id -> row of user_factors
+        self.global_mean = float(global_mean)
+        self.rating_scale = rating_scale
+        self.biased = biased
+
+    @classmethod
+    def from_model(cls, svd_model, item_ids):
+        """
+        Extract factors and biases from a fitted surprise SVD model, aligned to `item_ids`.
+        """
+        trainset = svd_model.trainset
+        item_ids = np.asarray(item_ids, dtype=object)
+        n_factors = svd_model.qi.shape[1]
+
+        item_rows = np.array([trainset._raw2inner_id_items.get(iid, -1) for iid in item_ids], dtype=np.int64)
+        item_known = item_rows >= 0
+
+        item_factors = np.zeros((len(item_ids), n_factors), dtype=np.float64)
+        item_factors[item_known] = svd_model.qi[item_rows[item_known]]
+
+        item_bias = np.zeros(len(item_ids), dtype=np.float64)
+        if svd_model.biased:
+            item_bias[item_known] = svd_model.bi[item_rows[item_known]]
+
+        user_bias = np.asarray(svd_model.bu, dtype=np.float64) if svd_model.biased \
+            else np.zeros(trainset.n_users, dtype=np.float64)
+
+        return cls(
+            item_ids=item_ids,
+            item_factors=item_factors,
+            item_bias=item_bias,
+            item_known=item_known,
+            user_factors=np.asarray(svd_model.pu, dtype=np.float64),
+            user_bias=user_bias,
+            user_inner_ids=dict(trainset._raw2inner_id_users),
+            global_mean=trainset.global_mean,
+            rating_scale=trainset.rating_scale,
+            biased=svd_model.biased,
+        )
+
+    def with_items(self, item_ids):
+        """
+        Return a scorer over a larger item universe. `item_ids` must start with the current items;
+        the new ones are unknown to the model (zero factors and bias), as in `SVD.predict()`.
+        """
+        n_new = len(item_ids) - len(self.item_ids)
+        return SVDScorer(
+            item_ids=item_ids,
+            item_factors=np.vstack([self.item_factors, np.zeros((n_new, self.item_factors.shape[1]))]),
+            item_bias=np.concatenate([self.item_bias, np.zeros(n_new)]),
+            item_known=np.concatenate([self.item_known, np.zeros(n_new, dtype=bool)]),
+            user_factors=self.user_factors,
+            user_bias=self.user_bias,
+            user_inner_ids=self.user_inner_ids,
+            global_mean=self.global_mean,
+            rating_scale=self.rating_scale,
+            biased=self.biased,
+        )
+
+    def fold_in_users(self, user_ratings, reg=0.02):
+        """
+        Return a scorer with re-estimated factors (and bias) for the given users, item factors fixed.
+
+        `user_ratings` yields (user_id, item positions, ratings) with all known ratings of each user.
+        Each user vector is the ridge regression solution of the SVD objective for that user, with the
+        regularization scaled by the number of ratings like the per-rating SGD penalty. Unknown users
+        are appended as new rows.
+        """
+        user_factors = self.user_factors.copy()
+        user_bias = self.user_bias.copy()
+        user_inner_ids = dict(self.user_inner_ids)
+        n_factors = self.item_factors.shape[1]
+        new_factors, new_bias = [], []
+
+        for user_id, items, ratings in user_ratings:
+            items = np.asarray(items, dtype=np.intp)
+            ratings = np.asarray(ratings, dtype=np.float64)
+            if self.biased:
+                design = np.hstack([self.item_factors[items], np.ones((len(items), 1))])
+                target = ratings - self.global_mean - self.item_bias[items]
+            else:
+                design = self.item_factors[items]
+                target = ratings
+            gram = design.T @ design + reg * len(items) * np.eye(design.shape[1])
+            solution = np.linalg.solve(gram, design.T @ target)
+            factors, bias = solution[:n_factors], (solution[n_factors] if self.biased else 0.0)
+
+            row = user_inner_ids.get(user_id)
+            if row is None:
+                user_inner_ids[user_id] = len(user_factors) + len(new_factors)
+                new_factors.append(factors)
+                new_bias.append(bias)
+            else:
+                user_factors[row] = factors
+                user_bias[row] = bias
+
+        if new_factors:
+            user_factors = np.vstack([user_factors, new_factors])
+            user_bias = np.concatenate([user_bias, new_bias])
+
+        return SVDScorer(
+            item_ids=self.item_ids,
+            item_factors=self.item_factors,
+            item_bias=self.item_bias,
+            item_known=self.item_known,
+            user_factors=user_factors,
+            user_bias=user_bias,
+            user_inner_ids=user_inner_ids,
+            global_mean=self.global_mean,
+            rating_scale=self.rating_scale,
+            biased=self.biased,
+        )
+
+    def knows_user(self, user_id):
+        return user_id in self.user_inner_ids
+
+    def query_vector(self, user_id):
+        """
+        User factors with a trailing 1, so that its inner product with [item factors, item bias]
+        ranks items the same way as `score` does.
+        """
+        u = self.user_inner_ids.get(user_id)
+        factors = self.user_factors[u] if u is not None else np.zeros(self.item_factors.shape[1])
+        return np.append(factors, 1.0)
+
+    def score(self, user_id, items=None):
+        """
+        Estimate ratings of `user_id` for every item in the universe (or the positions in `items`).
+        """
+        item_factors = self.item_factors if items is None else self.item_factors[items]
+        item_bias = self.item_bias if items is None else self.item_bias[items]
+        item_known = self.item_known if items is None else self.item_known[items]
+
+        u = self.user_inner_ids.get(user_id)
+
+        if self.biased:
+            if u is None:
+                est = self.global_mean + item_bias
+            else:
+                # same summation order as SVD.estimate; unknown items have zero factor rows
+                est = (self.global_mean + self.user_bias[u]) + item_bias + item_factors @ self.user_factors[u]
+        else:
+            # unbiased SVD cannot predict unknown users/items and falls back to the global mean
+            est = np.full(len(item_bias), self.global_mean)
+            if u is not None:
+                est = np.where(item_known, item_factors @ self.user_factors[u], self.global_mean)
+
+        lower_bound, higher_bound = self.rating_scale
+        return np.clip(est, lower_bound, higher_bound)
+
+    def score_many(self, user_ids):
+        """
+        Estimate ratings of several users for every item in the universe, one row per user.
+        """
+        rows = np.array([self.user_inner_ids.get(user_id, -1) for user_id in user_ids], dtype=np.int64)
+        known = rows >= 0
+
+        if self.biased:
+            est = np.empty((len(rows), len(self.item_ids)), dtype=np.float64)
+            est[~known] = self.global_mean + self.item_bias
+            if known.any():
+                base = (self.global_mean + self.user_bias[rows[known]])[:, None]
+                est[known] = base + self.item_bias + self.user_factors[rows[known]] @ self.item_factors.T
+        else:
+            est = np.full((len(rows), len(self.item_ids)), self.global_mean)
+            if known.any():
+                dots = self.user_factors[rows[known]] @ self.item_factors.T
+                est[known] = np.where(self.item_known, dots, self.global_mean)
+
+        lower_bound, higher_bound = self.rating_scale
+        return np.clip(est, lower_bound, higher_bound, out=est)
+
+    def recommend(self, user_id, items, num_recommendations=20):
+        """
+        Return the ids of the top `num_recommendations` items among the positions in `items`.
+        """
+        items = np.asarray(items, dtype=np.intp)
+        scores = self.score(user_id, items)
+        best = items[top_k(scores, num_recommendations)]
+        return self.item_ids[best].tolist()
@@ -0,0 +1,117 @@
+import numpy as np
+
+from .ids import IdDictionary
+
+
+class SeenItemIndex:
+    """
+        Immutable per-user index of seen items, built once at training time.
+
+        Users and items are integer-coded through IdDictionary objects owned by the index. The items
+        each user has rated are stored CSR-style: the item codes of user `u` are
+        `indices[indptr[u]:indptr[u + 1]]`. `candidate_mask` marks the items that may be recommended:
+        the ones we have movie metadata for and that are rated in this data. Users and items the
+        dictionaries keep from earlier training windows are coded but have no pairs, so they are
+        neither active nor recommendable.
+    """
+    def __init__(self, user_ids, item_ids, indptr, indices, candidate_mask):
+        # the index owns its dictionaries; pass copies to share codes with another index
+        self.users = user_ids if isinstance(user_ids, IdDictionary) else IdDictionary(user_ids)
+        self.items = item_ids if isinstance(item_ids, IdDictionary) else IdDictionary(item_ids)
+        self.user_ids = _read_only(self.users.ids)
+        self.item_ids = _read_only(self.items.ids)
+        self.indptr = _read_only(np.asarray(indptr, dtype=np.int64))
+        self.indices = _read_only(np.asarray(indices, dtype=np.int32))
+        self.candidate_mask = _read_only(np.asarray(candidate_mask, dtype=bool))
+
+    @classmethod
+    def from_ratings(cls, ratings_df, candidate_items=None, users=None, items=None):
+        """
+        Build the index from a ratings frame with 'user_id' and 'movie_id' columns.
+        If `candidate_items` is given, only those items are recommendable. Passing the `users` and
+        `items` dictionaries of an earlier model keeps their codes; they are not modified.
+        """
+        users = users.copy() if users is not None else IdDictionary()
+        items = items.copy() if items is not None else IdDictionary()
+        user_codes = users.encode(ratings_df['user_id'])
+        item_codes = items.encode(ratings_df['movie_id'])
+        return cls._from_pairs(users, items, user_codes, item_codes, candidate_items)
+
+    @classmethod
+    def from_codes(cls, users, items, user_codes, item_codes, candidate_items=None):
+        """
+        Build the index from parallel arrays of codes already assigned by the `users` and `items`
+        dictionaries (e.g. a memory-mapped rating snapshot), without decoding them to raw ids.
+        """
+        return cls._from_pairs(users, items, user_codes, item_codes, candidate_items)
+
+    def with_ratings(self, ratings_df, candidate_items=None):
+        """
+        Return a new index that also covers `ratings_df`. Existing users and items keep their codes;
+        new ones are appended after them.
+        """
+        users, items = self.users.copy(), self.items.copy()
+        new_users = users.encode(ratings_df['user_id'])
+        new_items = items.encode(ratings_df['movie_id'])
+        old_users = np.repeat(np.arange(self.n_users), np.diff(self.indptr))
+
+        if candidate_items is None:
+            candidate_items = np.concatenate([self.item_ids[self.candidate_mask], items.ids[self.n_items:]])
+
+        return self._from_pairs(users, items,
+                                np.concatenate([old_users, new_users]),
+                                np.concatenate([self.indices, new_items]),
+                                candidate_items)
+
+    @classmethod
+    def _from_pairs(cls, users, items, user_codes, item_codes, candidate_items):
+        # one entry per (user, item) pair, grouped by user
+        pairs = np.unique(np.stack([user_codes, item_codes], axis=1).astype(np.int64), axis=0)
+        counts = np.bincount(pairs[:, 0], minlength=len(users))
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+
+        # items without any pair are only in the dictionaries; the model has nothing to score them with
+        candidate_mask = np.bincount(pairs[:, 1], minlength=len(items)) > 0
+        if candidate_items is not None:
+            has_metadata = np.zeros(len(items), dtype=bool)
+            codes = items.encode(candidate_items, add=False)
+            has_metadata[codes[codes >= 0]] = True
+            candidate_mask &= has_metadata
+
+        return cls(users, items, indptr, pairs[:, 1], candidate_mask)
+
+    @property
+    def n_users(self):
+        return len(self.user_ids)
+
+    @property
+    def n_items(self):
+        return len(self.item_ids)
+
+    def user_code(self, user_id):
+        """Return the integer code of `user_id`, or None if the user is unknown."""
+        return self.users.code(user_id)
+
+    def item_code(self, item_id):
+        """Return the integer code of `item_id`, or None if the item is unknown."""
+        return self.items.code(item_id)
+
+    def active_users(self):
+        """Codes of the users with at least one seen item."""
+        return np.flatnonzero(np.diff(self.indptr) > 0)
+
+    def seen_items(self, user_code):
+        """Item codes the user has already rated or watched."""
+        return self.indices[self.indptr[user_code]:self.indptr[user_code + 1]]
+
+    def unseen_items(self, user_code=None):
+        """Codes of recommendable items the user has not seen yet (all of them for unknown users)."""
+        mask = self.candidate_mask.copy()
+        if user_code is not None:
+            mask[self.seen_items(user_code)] = False
+        return np.flatnonzero(mask)
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
@@ -0,0 +1,193 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .ids import IdDictionary
+from .scoring import SVDScorer
+
+
+class RatingArrays:
+    """
+        Ratings as parallel arrays of int32 user codes, int32 item codes and float32 values, plus
+        optional datetime64 event times.
+
+        The arrays may be memory-mapped (see `open_rating_snapshot`); `chunks` only ever copies
+        `chunk_size` rows into memory at a time.
+    """
+    def __init__(self, user_codes, item_codes, ratings, user_ids=None, item_ids=None, times=None):
+        self.user_codes = user_codes
+        self.item_codes = item_codes
+        self.ratings = ratings
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.times = times
+
+    def __len__(self):
+        return len(self.ratings)
+
+    @property
+    def n_users(self):
+        return len(self.user_ids) if self.user_ids is not None else int(self._max_code(self.user_codes)) + 1
+
+    @property
+    def n_items(self):
+        return len(self.item_ids) if self.item_ids is not None else int(self._max_code(self.item_codes)) + 1
+
+    def chunks(self, chunk_size, rng=None):
+        """Yield (user_codes, item_codes, ratings) chunks; in random chunk order if `rng` is given."""
+        starts = np.arange(0, len(self), chunk_size)
+        if rng is not None:
+            rng.shuffle(starts)
+        for start in starts:
+            end = start + chunk_size
+            yield (np.asarray(self.user_codes[start:end], dtype=np.int64),
+                   np.asarray(self.item_codes[start:end], dtype=np.int64),
+                   np.asarray(self.ratings[start:end], dtype=np.float64))
+
+    def _max_code(self, codes, chunk_size=1_000_000):
+        return max((codes[start:start + chunk_size].max() for start in range(0, len(codes), chunk_size)), default=-1)
+
+
+def write_rating_snapshot(path, batches, users=None, items=None):
+    """
+    Write a stream of (user_ids, item_ids, ratings) batches, optionally with event times as a fourth
+    element, to a local rating snapshot under `path` and return it opened. Raw ids are interned to
+    int32 codes with the `users` and `items` dictionaries (new ids are added to them; fresh ones by
+    default), and the codes are appended to flat binary files, so memory use is bounded by the batch
+    size and the number of distinct ids.
+    """
+    os.makedirs(path, exist_ok=True)
+    users = users if users is not None else IdDictionary()
+    items = items if items is not None else IdDictionary()
+    count, has_times = 0, False
+    with open(os.path.join(path, "user_codes.i32"), "wb") as user_file, \
+         open(os.path.join(path, "item_codes.i32"), "wb") as item_file, \
+         open(os.path.join(path, "ratings.f32"), "wb") as rating_file, \
+         open(os.path.join(path, "times.i64"), "wb") as time_file:
+        for batch in batches:
+            user_ids, item_ids, ratings = batch[:3]
+            user_file.write(users.encode(user_ids).tobytes())
+            item_file.write(items.encode(item_ids).tobytes())
+            rating_file.write(np.asarray(ratings, dtype=np.float32).tobytes())
+            if len(batch) > 3:
+                # nanoseconds since the epoch; unparseable times become NaT
+                times = pd.to_datetime(pd.Series(batch[3], dtype=object), errors='coerce')
+                time_file.write(times.to_numpy(dtype='datetime64[ns]').view(np.int64).tobytes())
+                has_times = True
+            count += len(ratings)
+
+    if not has_times:
+        os.remove(os.path.join(path, "times.i64"))
+    with open(os.path.join(path, "ids.json"), "w") as f:
+        json.dump({"count": count, "user_ids": users.ids.tolist(), "item_ids": items.ids.tolist()}, f)
+    return open_rating_snapshot(path)
+
+
+def open_rating_snapshot(path):
+    """Memory-map a rating snapshot written by `write_rating_snapshot`."""
+    with open(os.path.join(path, "ids.json")) as f:
+        ids = json.load(f)
+
+    def load(name, dtype):
+        if ids["count"] == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(path, name), dtype=dtype, mode="r", shape=(ids["count"],))
+
+    times = None
+    if os.path.exists(os.path.join(path, "times.i64")):
+        times = load("times.i64", np.int64).view('datetime64[ns]')
+    return RatingArrays(load("user_codes.i32", np.int32), load("item_codes.i32", np.int32),
+                        load("ratings.f32", np.float32),
+                        np.asarray(ids["user_ids"], dtype=object), np.asarray(ids["item_ids"], dtype=object),
+                        times)
+
+
+class MinibatchSVD:
+    """
+        Biased matrix factorization (the model of surprise's SVD) trained by minibatch SGD over
+        rating chunks.
+
+        Only the factor matrices, biases and one chunk of ratings are held in memory, so the training
+        set can be a memory-mapped snapshot far larger than RAM. Each epoch visits the chunks in random
+        order and shuffles the ratings inside a chunk; gradients of a minibatch are summed per user and
+        item, so `lr_all` and `reg_all` have the same meaning as in surprise.
+    """
+    def __init__(self, n_factors=100, n_epochs=20, lr_all=0.005, reg_all=0.02, init_mean=0, init_std_dev=0.1,
+                 batch_size=1024, chunk_size=1_000_000, rating_scale=(1, 5), random_state=None):
+        self.n_factors = n_factors
+        self.n_epochs = n_epochs
+        self.lr = lr_all
+        self.reg = reg_all
+        self.init_mean = init_mean
+        self.init_std_dev = init_std_dev
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.rating_scale = rating_scale
+        self.random_state = random_state
+
+    def fit(self, ratings, n_users=None, n_items=None):
+        """Train on a RatingArrays (or a memory-mapped snapshot of one)."""
+        n_users = n_users if n_users is not None else ratings.n_users
+        n_items = n_items if n_items is not None else ratings.n_items
+        rng = np.random.default_rng(self.random_state)
+
+        total, self.user_counts, self.item_counts = 0.0, np.zeros(n_users, np.int64), np.zeros(n_items, np.int64)
+        for users, items, values in ratings.chunks(self.chunk_size):
+            total += values.sum()
+            self.user_counts += np.bincount(users, minlength=n_users)
+            self.item_counts += np.bincount(items, minlength=n_items)
+        self.global_mean = total / max(len(ratings), 1)
+
+        self.bu = np.zeros(n_users)
+        self.bi = np.zeros(n_items)
+        self.pu = rng.normal(self.init_mean, self.init_std_dev, (n_users, self.n_factors))
+        self.qi = rng.normal(self.init_mean, self.init_std_dev, (n_items, self.n_factors))
+
+        for epoch in range(self.n_epochs):
+            for users, items, values in ratings.chunks(self.chunk_size, rng):
+                order = rng.permutation(len(values))
+                for start in range(0, len(values), self.batch_size):
+                    batch = order[start:start + self.batch_size]
+                    self._step(users[batch], items[batch], values[batch])
+        return self
+
+    def _step(self, users, items, values):
+        pu, qi = self.pu[users], self.qi[items]
+        bu, bi = self.bu[users], self.bi[items]
+        err = values - (self.global_mean + bu + bi + np.einsum("ij,ij->i", pu, qi))
+
+        np.add.at(self.bu, users, self.lr * (err - self.reg * bu))
+        np.add.at(self.bi, items, self.lr * (err - self.reg * bi))
+        np.add.at(self.pu, users, self.lr * (err[:, None] * qi - self.reg * pu))
+        np.add.at(self.qi, items, self.lr * (err[:, None] * pu - self.reg * qi))
+
+    def rmse(self, ratings):
+        """RMSE of the clipped estimates over a RatingArrays, computed chunk by chunk."""
+        squared, count = 0.0, 0
+        for users, items, values in ratings.chunks(self.chunk_size):
+            est = self.global_mean + self.bu[users] + self.bi[items] + np.einsum("ij,ij->i", self.pu[users], self.qi[items])
+            squared += ((np.clip(est, *self.rating_scale) - values) ** 2).sum()
+            count += len(values)
+        return float(np.sqrt(squared / max(count, 1)))
+
+    def to_scorer(self, user_ids, item_ids):
+        """
+        Serving view of the trained factors, for the users and items the codes were assigned to.
+        Users and items without any training rating are treated as unknown, like in surprise.
+        """
+        known_users = np.flatnonzero(self.user_counts > 0)
+        item_known = self.item_counts > 0
+        return SVDScorer(
+            item_ids=item_ids,
+            item_factors=np.where(item_known[:, None], self.qi, 0.0),
+            item_bias=np.where(item_known, self.bi, 0.0),
+            item_known=item_known,
+            user_factors=self.pu[known_users],
+            user_bias=self.bu[known_users],
+            user_inner_ids={user_ids[code]: row for row, code in enumerate(known_users)},
+            global_mean=self.global_mean,
+            rating_scale=self.rating_scale,
+            biased=True,
+        )
@@ -0,0 +1,68 @@
+import datetime
+
+import pandas as pd
+
+from .loader import load_columns
+
+
+class TrainingSnapshot:
+    """
+        Cached training rows of one MongoDB collection plus a high watermark on `_id`.
+
+        The first `refresh` loads the whole window; later ones fetch only documents inserted after the
+        watermark (ObjectIds grow with insertion time), append them, and evict rows whose `window_field`
+        fell out of the `window_days` window. `limit` keeps only the newest `limit` rows. Only
+        append-only collections can be cached this way: an upserted document keeps its `_id`, so its
+        later changes are never fetched.
+    """
+    def __init__(self, fields, dtypes=None, window_field=None, window_days=None, limit=None):
+        self.fields = list(fields)
+        self.dtypes = dtypes
+        self.window_field = window_field
+        self.window_days = window_days
+        self.limit = limit
+        self.frame = None
+        self.watermark = None
+        self.last_fetched = 0
+
+    def refresh(self, collection, query=None, batch_size=10000, measure_memory=False):
+        """
+        Bring the snapshot up to date and return the cached rows (the requested fields only), with the
+        loader stats of the incremental fetch.
+        """
+        query = dict(query or {})
+        cutoff = None
+        if self.window_field is not None and self.window_days is not None:
+            cutoff = datetime.datetime.now() - datetime.timedelta(days=self.window_days)
+            query[self.window_field] = {"$gte": cutoff}
+        if self.watermark is not None:
+            query['_id'] = {"$gt": self.watermark}
+
+        fields = self.fields + [f for f in ('_id', self.window_field) if f is not None and f not in self.fields]
+        # the cap applies to the first full load; incremental fetches are small by construction
+        new, stats = load_columns(collection, fields, query, limit=self.limit if self.frame is None else None,
+                                  dtypes=self.dtypes, batch_size=batch_size, measure_memory=measure_memory)
+        self.last_fetched = len(new)
+
+        # build a new frame instead of appending in place, so earlier results stay valid
+        frame = new if self.frame is None else pd.concat([self.frame, new], ignore_index=True)
+        if len(new):
+            self.watermark = max(new['_id'].dropna(), default=self.watermark)
+        if cutoff is not None and len(frame):
+            frame = frame[pd.to_datetime(frame[self.window_field]) >= cutoff]
+        if self.limit is not None and len(frame) > self.limit:
+            frame = frame.iloc[-self.limit:]
+        self.frame = frame.reset_index(drop=True)
+
+        return self.frame[self.fields].copy(), stats
+
+    def watermark_label(self):
+        """Short, sortable label for the watermark, used in data versions."""
+        return str(self.watermark) if self.watermark is not None else "none"
+
+
+def format_data_version(snapshots):
+    """Data version naming the refresh time and the watermark of every snapshot it was built from."""
+    stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    watermarks = "_".join(f"{name}@{snapshot.watermark_label()}" for name, snapshot in sorted(snapshots.items()))
+    return f"data_{stamp}" + (f"_{watermarks}" if watermarks else "")
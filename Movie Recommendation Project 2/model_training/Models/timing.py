@@ -0,0 +1,18 @@
+import time
+from contextlib import contextmanager
+
+
+class StageTimings(dict):
+    """
+        Seconds spent in each named stage of one request, e.g. {"seen_lookup": 2e-05, "scoring": 0.003}.
+
+        `with timings.stage("scoring"):` adds the time spent in the block to that stage. Pipelines fill
+        it in when one is passed to them; the servers export it (see serving/metrics.py).
+    """
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self[name] = self.get(name, 0.0) + time.perf_counter() - start
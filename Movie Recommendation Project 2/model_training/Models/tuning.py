@@ -0,0 +1,149 @@
+import itertools
+import multiprocessing
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+from surprise import SVD, Dataset, Reader
+
+# Searched when no grid is given: surprise's defaults plus their neighbours
+DEFAULT_PARAM_GRID = {
+    "n_factors": [50, 100, 150],
+    "n_epochs": [20, 40],
+    "lr_all": [0.005, 0.01],
+    "reg_all": [0.02, 0.05],
+}
+
+
+class SharedRatings:
+    """
+        Rating arrays (user codes, item codes, ratings, train mask) placed in shared memory once,
+        so every worker process maps the same pages instead of receiving a pickled copy.
+    """
+    def __init__(self, user_codes, item_codes, ratings, train_mask):
+        self.blocks = []
+        self.spec = {}
+        for name, array in [("user_codes", np.asarray(user_codes, dtype=np.int32)),
+                            ("item_codes", np.asarray(item_codes, dtype=np.int32)),
+                            ("ratings", np.asarray(ratings, dtype=np.float32)),
+                            ("train_mask", np.asarray(train_mask, dtype=bool))]:
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            self.blocks.append(block)
+            self.spec[name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def search_svd_hyperparameters(user_codes, item_codes, ratings, train_mask, param_grid=None, n_iter=None,
+                               time_budget=None, n_jobs=None, rating_scale=(1, 5), seed=0):
+    """
+    Evaluate SVD hyperparameter configurations in parallel and return their results, best first.
+
+    Every configuration is fitted on the rows in `train_mask` and scored by RMSE on the others.
+    `n_iter` evaluates a random sample of the grid instead of all of it. Configurations still running
+    when `time_budget` seconds have passed are abandoned. Each result is a dict with the parameters,
+    "rmse" and "fit_seconds".
+    """
+    configs = _configurations(param_grid or DEFAULT_PARAM_GRID, n_iter, seed)
+    deadline = time.monotonic() + time_budget if time_budget else None
+    results = []
+
+    with SharedRatings(user_codes, item_codes, ratings, train_mask) as shared:
+        pool = multiprocessing.Pool(n_jobs or os.cpu_count())
+        try:
+            pending = [(params, pool.apply_async(_evaluate, (shared.spec, params, rating_scale, seed)))
+                       for params in configs]
+            for params, result in pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0 and not result.ready():
+                    continue
+                try:
+                    results.append(result.get(timeout=remaining))
+                except multiprocessing.TimeoutError:
+                    continue
+        finally:
+            # stop configurations that did not make it into the time budget
+            pool.terminate()
+            pool.join()
+
+    return sorted(results, key=lambda r: r["rmse"])
+
+
+def _configurations(param_grid, n_iter, seed):
+    names = sorted(param_grid)
+    configs = [dict(zip(names, values)) for values in itertools.product(*(param_grid[n] for n in names))]
+    if n_iter is not None and n_iter < len(configs):
+        rng = np.random.default_rng(seed)
+        configs = [configs[i] for i in rng.choice(len(configs), n_iter, replace=False)]
+    return configs
+
+
+def _attach(spec):
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        # the parent owns the blocks; keep this process's resource tracker from unlinking them
+        resource_tracker.unregister(block._name, "shared_memory")
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return blocks, arrays
+
+
+def _evaluate(spec, params, rating_scale, seed):
+    """Worker: fit one configuration on the shared train rows and score it on the test rows."""
+    blocks, arrays = _attach(spec)
+    try:
+        train, test = arrays["train_mask"], ~arrays["train_mask"]
+        train_df = pd.DataFrame({
+            "user_id": arrays["user_codes"][train],
+            "item_id": arrays["item_codes"][train],
+            "rating": arrays["ratings"][train],
+        })
+
+        start = time.perf_counter()
+        model = SVD(random_state=seed, **params)
+        model.fit(Dataset.load_from_df(train_df, Reader(rating_scale=rating_scale)).build_full_trainset())
+        fit_seconds = time.perf_counter() - start
+
+        estimates = predict_pairs(model, arrays["user_codes"][test], arrays["item_codes"][test])
+        rmse = float(np.sqrt(np.mean((estimates - arrays["ratings"][test]) ** 2))) if test.any() else float("nan")
+        return {**params, "rmse": rmse, "fit_seconds": fit_seconds}
+    finally:
+        del arrays
+        for block in blocks:
+            block.close()
+
+
+def predict_pairs(model, user_ids, item_ids):
+    """
+    Vectorized `SVD.predict(u, i).est` for arrays of raw user and item ids.
+    """
+    trainset = model.trainset
+    users = np.array([trainset._raw2inner_id_users.get(u, -1) for u in user_ids.tolist()], dtype=np.int64)
+    items = np.array([trainset._raw2inner_id_items.get(i, -1) for i in item_ids.tolist()], dtype=np.int64)
+    known_user, known_item = users >= 0, items >= 0
+    both = known_user & known_item
+
+    est = np.full(len(users), trainset.global_mean)
+    if model.biased:
+        est[known_user] += model.bu[users[known_user]]
+        est[known_item] += model.bi[items[known_item]]
+        est[both] += np.einsum("ij,ij->i", model.qi[items[both]], model.pu[users[both]])
+    else:
+        est[both] = np.einsum("ij,ij->i", model.qi[items[both]], model.pu[users[both]])
+
+    lower_bound, higher_bound = trainset.rating_scale
+    return np.clip(est, lower_bound, higher_bound)
@@ -1,17 +1,33 @@
 import sys
 import os
-from flask import Flask, jsonify, make_response
+from flask import Flask, jsonify, make_response, request
 from dotenv import load_dotenv
 import threading
 import time
 from datetime import datetime, timedelta, timezone
 from pymongo import MongoClient
 import json
+import copy
+import logging
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from Models.SVD import SVDPipeline
+from Models.SVD import SVDPipeline, ARTIFACT_DIR
+from Models.artifacts import latest_artifact
 from ABTESTING.svd_accuracy import evaluate_svd_rmse_all_users
+from serving.provenance import ProvenanceWriter
+from serving.batch import parse_batch_request
+from serving.cache import RecommendationCache
+from serving.artifact_watcher import ArtifactWatcher
+from serving.metrics import observe_stages, record_model, render_metrics
+from serving import logs
+from Models.timing import StageTimings
+from prometheus_client import CONTENT_TYPE_LATEST
 app = Flask(__name__)
+# Request logs: sampled, queued and written off the request path (LOG_LEVEL, LOG_SAMPLE_RATES, LOG_FORMAT)
+logger = logs.configure_logging("svd_server")
+# Only guards publishing a new pipeline; requests read the published pipeline without it
 model_lock = threading.RLock()
+# Published pipeline; None until the background load finishes
+svd_pipeline = None
 # ---------- RETRAINING CONFIGURATION ----------
 RETRAINING_INTERVAL_DAYS = 3  # Retrain every 3 days
 test_interval = 2  # Test interval in minutes
@@ -26,10 +42,30 @@ USER_RATE_COLLECTION = os.getenv("USER_RATE_COLLECTION", "user_rate_data")
 client = MongoClient(MONGO_URI)
 request_provenance_log_coll = client[LOG_DB][REQUEST_PROVENANCE_LOG_COLL]
 ratings_coll = client[MOVIE_DB][USER_RATE_COLLECTION]
+# Provenance documents are written in the background, in batches, off the request path
+provenance_writer = ProvenanceWriter(
+    request_provenance_log_coll,
+    max_queue=int(os.getenv("PROVENANCE_QUEUE_SIZE", 10000)),
+    batch_size=int(os.getenv("PROVENANCE_BATCH_SIZE", 500)),
+    flush_interval=float(os.getenv("PROVENANCE_FLUSH_SECONDS", 1.0)),
+)
+# Largest number of users accepted by one /recommend/batch request
+BATCH_MAX_USERS = int(os.getenv("BATCH_MAX_USERS", 1000))
+# Recent /recommend responses, keyed by (user_id, model_version) and dropped on model swap
+recommendation_cache = RecommendationCache(
+    "svd",
+    max_bytes=int(os.getenv("RECOMMENDATION_CACHE_MAX_BYTES", 64 * 2**20)),
+    ttl_seconds=float(os.getenv("RECOMMENDATION_CACHE_TTL_SECONDS", 300)),
+)
+# How often forked workers check ARTIFACT_DIR/LATEST for a new model (see gunicorn.conf.py)
+ARTIFACT_POLL_SECONDS = float(os.getenv("ARTIFACT_POLL_SECONDS", 5))
+artifact_watcher = None
+# Seconds between attempts when loading or training the initial model fails
+MODEL_LOAD_RETRY_SECONDS = float(os.getenv("MODEL_LOAD_RETRY_SECONDS", 30))
 # ---------- MODEL PROVENANCE TRACKING ----------
 # for any past recommendation, log the model version, the used pipeline version, and the used training data version
-def log_request_provenance_to_mongo(request_start_time, user_id, pipeline_type, model_version, training_data_version, recommendations):
-    request_provenance_json = {
+def provenance_document(request_start_time, user_id, pipeline_type, model_version, training_data_version, recommendations):
+    return {
         "timestamp": request_start_time,
         "user_id": user_id,
         "pipeline_type": pipeline_type,
@@ -38,9 +74,11 @@ def log_request_provenance_to_mongo(request_start_time, user_id, pipeline_type,
         "recommendation_results": recommendations,
         "status_code": 200
     }
-    print(f"logging to mongo {MONGO_URI}: {request_provenance_json}")
-    request_provenance_log_coll.insert_one(request_provenance_json)
-    print("Inserted to mongo successfully")
+def log_request_provenance_to_mongo(request_start_time, user_id, pipeline_type, model_version, training_data_version, recommendations):
+    request_provenance_json = provenance_document(request_start_time, user_id, pipeline_type, model_version, training_data_version, recommendations)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Queued request provenance", extra={"fields": {"provenance": request_provenance_json}})
+    provenance_writer.submit(request_provenance_json)
 # TODO: replace this with save model log to DB instead of json file
 def save_model_history(model_info):
     """Save model version information to history file"""
@@ -65,43 +103,121 @@ def save_model_history(model_info):
     except Exception as e:
         print(f"{datetime.now()} - Error saving model history: {e}")
 def initialize_model():
-    """Initialize the model when the server starts"""
+    """Load or train the first model and publish it"""
+    print(f"{datetime.now()} - Initializing SVD model")
+    # Memory-map the latest trained artifact if there is one, otherwise train and persist it
+    artifact_path = latest_artifact(ARTIFACT_DIR)
+    if artifact_path is not None:
+        pipeline = SVDPipeline(artifact_path=artifact_path)
+    else:
+        pipeline = SVDPipeline()
+        pipeline.save_artifact(ARTIFACT_DIR)
+    publish_pipeline(pipeline)
+    # Save initial model info to history
+    model_info = pipeline.get_model_info()
+    save_model_history(model_info)
+    print(f"{datetime.now()} - Model initialization complete - Version: {model_info['model_version']}")
+def load_latest_artifact():
+    """
+    Map and publish the artifact LATEST points at, if there is one. gunicorn's master calls this
+    before forking (see gunicorn.conf.py), so every worker starts with the same model in memory.
+    """
+    artifact_path = latest_artifact(ARTIFACT_DIR)
+    if artifact_path is None:
+        return None
+    try:
+        pipeline = SVDPipeline(artifact_path=artifact_path)
+    except Exception as e:
+        # the workers keep trying through their artifact watchers
+        print(f"{datetime.now()} - Error loading model artifact {artifact_path}: {e}")
+        return None
+    publish_pipeline(pipeline)
+    return pipeline
+def initialize_model_in_background():
+    """
+    Run initialize_model on a daemon thread, retrying until it succeeds, so the server can bind its
+    port and answer /healthz right away; /ready and /recommend report 503 until the model is published.
+    """
+    def load():
+        while True:
+            try:
+                initialize_model()
+                return
+            except Exception as e:
+                print(f"{datetime.now()} - Error initializing SVD model, retrying in {MODEL_LOAD_RETRY_SECONDS}s: {e}")
+                time.sleep(MODEL_LOAD_RETRY_SECONDS)
+    loader = threading.Thread(target=load, name="model-loader", daemon=True)
+    loader.start()
+    return loader
+def publish_pipeline(new_pipeline):
+    """
+    Atomically swap in a new pipeline; requests already running keep the snapshot they started with.
+    Cached responses of the old pipeline are dropped.
+    Published pipelines are never modified afterwards (fold-in works on a copy), so readers need no lock.
+    """
     global svd_pipeline
     with model_lock:
-        print(f"{datetime.now()} - Initializing SVD model")
-        svd_pipeline = SVDPipeline()
-        # Save initial model info to history
-        model_info = svd_pipeline.get_model_info()
-        save_model_history(model_info)
-        print(f"{datetime.now()} - Model initialization complete - Version: {model_info['model_version']}")
-# Initialize model on startup
-initialize_model()
+        previous, svd_pipeline = svd_pipeline, new_pipeline
+        recommendation_cache.reset(new_pipeline.model_version)
+    record_model("SVD", new_pipeline, previous)
+def start_worker():
+    """
+    Per-process setup of a gunicorn worker forked from the preloaded master (see gunicorn.conf.py).
+    The worker restarts the provenance writer and log listener, whose threads did not survive fork, and keeps
+    serving the artifact the master mapped until LATEST points at another one, e.g. after train_svd_job.py
+    publishes a new model (without one from the master, it maps LATEST at once).
+    """
+    global artifact_watcher
+    provenance_writer.after_fork()
+    logs.after_fork()
+    artifact_watcher = ArtifactWatcher(
+        ARTIFACT_DIR,
+        load=lambda path: SVDPipeline(artifact_path=path),
+        publish=publish_pipeline,
+        current_version=svd_pipeline.model_version if svd_pipeline is not None else None,
+        interval=ARTIFACT_POLL_SECONDS,
+    ).start()
 def periodic_model_retraining():
     """Background thread to periodically retrain the model"""
-    global svd_pipeline
     while True:
         try:
             # Sleep until next scheduled retraining
             # Initially sleep for a short time to test
             time.sleep(60)  # 1 minute initial delay for testing
             print("Checking if model retraining is due")
-            with model_lock:
-                # Check if it’s time to retrain (last_trained is None or older than RETRAINING_INTERVAL_DAYS)
-                if (svd_pipeline.last_trained is None or
-                    datetime.now() - svd_pipeline.last_trained > timedelta(minutes=test_interval)):
-                    print("Starting model retraining")
-                    try:
-                        # Save old model version for comparison
-                        old_version = svd_pipeline.model_version
-                        # Retrain model
-                        svd_pipeline.refresh_model()
-                        # Save new model info to history
-                        model_info = svd_pipeline.get_model_info()
-                        save_model_history(model_info)
-                        print(f"Model successfully retrained at {svd_pipeline.last_trained}")
-                        print(f"{datetime.now()} - Old version: {old_version} -> New version: {model_info['model_version']}")
-                    except Exception as e:
-                        print(f"Error retraining model: {e}")
+            current_pipeline = svd_pipeline
+            if current_pipeline is None:
+                print("Model not loaded yet, skipping retraining check")
+                continue
+            # Check if it’s time to retrain (last_trained is None or older than RETRAINING_INTERVAL_DAYS)
+            if (current_pipeline.last_trained is None or
+                datetime.now() - current_pipeline.last_trained > timedelta(minutes=test_interval)):
+                print("Starting model retraining")
+                try:
+                    # Save old model version for comparison
+                    old_version = current_pipeline.model_version
+                    # Train a new model off-lock while the current one keeps serving,
+                    # fetching only the data newer than the current pipeline's watermarks
+                    new_pipeline = SVDPipeline(snapshots=current_pipeline.snapshots)
+                    new_pipeline.validate()
+                    new_pipeline.save_artifact(ARTIFACT_DIR)
+                    publish_pipeline(new_pipeline)
+                    # Save new model info to history
+                    model_info = new_pipeline.get_model_info()
+                    save_model_history(model_info)
+                    print(f"Model successfully retrained at {new_pipeline.last_trained}")
+                    print(f"{datetime.now()} - Old version: {old_version} -> New version: {model_info['model_version']}")
+                except Exception as e:
+                    print(f"Error retraining model: {e}")
+            else:
+                # Between retrains, fold new ratings into a copy of the current model and swap it in
+                try:
+                    new_pipeline = copy.copy(current_pipeline)
+                    if new_pipeline.fold_in_new_ratings():
+                        new_pipeline.validate()
+                        publish_pipeline(new_pipeline)
+                except Exception as e:
+                    print(f"Error folding in new ratings: {e}")
             # Sleep for the retraining interval (converted to seconds)
             # For production, use this sleep instead of the 1-minute test delay
             time.sleep(60)
@@ -113,35 +229,113 @@ def periodic_model_retraining():
 @app.route("/")
 def home():
     return "ML Service is Running!"
+@app.route("/healthz")
+def healthz():
+    """Liveness: the process is up and serving HTTP, whether or not the model is loaded"""
+    return make_response({"status": "ok"}, 200)
+@app.route("/ready")
+def ready():
+    """Readiness: 200 with the model version once a pipeline is published, 503 before"""
+    pipeline = svd_pipeline
+    if pipeline is None:
+        return model_not_ready()
+    return make_response({"status": "ready", "model_version": pipeline.model_version, "data_version": pipeline.data_version}, 200)
+def model_not_ready():
+    fail_response_obj = make_response({"error": "Model is loading"})
+    fail_response_obj.status_code = 503
+    fail_response_obj.headers["Retry-After"] = str(int(MODEL_LOAD_RETRY_SECONDS))
+    return fail_response_obj
+@app.route("/metrics")
+def metrics():
+    """Prometheus metrics, including the recommendation cache counters, of all workers under gunicorn"""
+    return make_response(render_metrics(), 200, {"Content-Type": CONTENT_TYPE_LATEST})
 @app.route("/recommend/<int:userid>")
 def recommend(userid):
     # TODO call SVD Model here and return result
-    global svd_pipeline
     try:
-        with model_lock:
-            request_start_time = datetime.now(timezone.utc)
-            recommendations = svd_pipeline.get_recommendations(userid)
-            # TODO: calculate model_accuracy
-            # model_accuracy = evaluate_svd_rmse_all_users(request_provenance_log_coll, ratings_coll)
-            # print(f”Model accuracy: {model_accuracy}“)
-            # Log the request provenance to MongoDB
-            log_request_provenance_to_mongo(request_start_time, userid, "SVD", svd_pipeline.model_version, svd_pipeline.data_version, recommendations)
-            print(f"{datetime.now()} - Generated recommendations for user {userid} - Model version {svd_pipeline.model_version}, Data version {svd_pipeline.data_version}")
+        # Read the published pipeline once, without a lock, and use that snapshot for the whole
+        # request, so versions match the model that answered
+        pipeline = svd_pipeline
+        if pipeline is None:
+            return model_not_ready()
+        request_start_time = datetime.now(timezone.utc)
+        timings = StageTimings()
+        # Repeat requests for the same model version are answered from the cache
+        with timings.stage("cache_lookup"):
+            recommendations = recommendation_cache.get(userid, pipeline.model_version)
+        if recommendations is None:
+            recommendations = pipeline.get_recommendations(userid, timings=timings)
+            recommendation_cache.put(userid, pipeline.model_version, recommendations)
+        # TODO: calculate model_accuracy
+        # model_accuracy = evaluate_svd_rmse_all_users(request_provenance_log_coll, ratings_coll)
+        # print(f”Model accuracy: {model_accuracy}“)
+        # Queue the request provenance for MongoDB
+        with timings.stage("provenance"):
+            log_request_provenance_to_mongo(request_start_time, userid, "SVD", pipeline.model_version, pipeline.data_version, recommendations)
+        logger.info("Generated recommendations", extra={"fields": {
+            "user_id": userid, "model_version": pipeline.model_version, "data_version": pipeline.data_version}})
         response_body = {
             "recommendation_results": recommendations,
             "accuracy": 0.1
         }
+        with timings.stage("serialization"):
+            response_obj = make_response(jsonify(response_body))
+        response_obj.status_code = 200
+        observe_stages("SVD", pipeline.model_version, timings)
+        return response_obj
+    except Exception as e:
+        logger.error("Error generating recommendations", exc_info=True, extra={"fields": {"user_id": userid}})
+        fail_response_obj = make_response(
+            {"error": f"Request failed: {str(e)}"}
+        )
+        fail_response_obj.status_code = 500
+        return fail_response_obj
+@app.route("/recommend/batch", methods=["POST"])
+def recommend_batch():
+    """
+    Recommendations for several users in one request: {"user_ids": [...], "num_recommendations": 20}.
+    The users are scored together and their provenance documents are queued in one call.
+    """
+    try:
+        user_ids, num_recommendations = parse_batch_request(request.get_json(silent=True), BATCH_MAX_USERS)
+    except ValueError as e:
+        fail_response_obj = make_response({"error": str(e)})
+        fail_response_obj.status_code = 400
+        return fail_response_obj
+    try:
+        # One pipeline snapshot for the whole batch, as in /recommend
+        pipeline = svd_pipeline
+        if pipeline is None:
+            return model_not_ready()
+        request_start_time = datetime.now(timezone.utc)
+        recommendations = pipeline.get_recommendations_batch(user_ids, num_recommendations)
+        provenance_writer.submit_many([
+            provenance_document(request_start_time, user_id, "SVD", pipeline.model_version, pipeline.data_version, user_recommendations)
+            for user_id, user_recommendations in zip(user_ids, recommendations)
+        ])
+        logger.info("Generated batch recommendations", extra={"fields": {
+            "users": len(user_ids), "model_version": pipeline.model_version, "data_version": pipeline.data_version}})
+        response_body = {
+            "results": [
+                {"user_id": user_id, "recommendation_results": user_recommendations}
+                for user_id, user_recommendations in zip(user_ids, recommendations)
+            ],
+            "model_version": pipeline.model_version,
+            "data_version": pipeline.data_version,
+        }
         response_obj = make_response(jsonify(response_body))
         response_obj.status_code = 200
         return response_obj
     except Exception as e:
-        print(f"{datetime.now()} - Error generating recommendations: {e}")
+        logger.error("Error generating batch recommendations", exc_info=True, extra={"fields": {"users": len(user_ids)}})
         fail_response_obj = make_response(
             {"error": f"Request failed: {str(e)}"}
         )
         fail_response_obj.status_code = 500
         return fail_response_obj
 if __name__ == "__main__":
+    # Load the model in the background so the port is bound right away
+    initialize_model_in_background()
     # Load config from config.py
     retraining_thread = threading.Thread(target=periodic_model_retraining, daemon=True)
     retraining_thread.start()
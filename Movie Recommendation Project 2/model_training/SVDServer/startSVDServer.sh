@@ -1,3 +1,6 @@
 #!/bin/bash
-pkill -f SVD_model_app.py                     # keep only one server program running on bg
-exec python3 SVD_model_app.py              # run server program in bg no hang state
\ No newline at end of file
+pkill -f SVD_model_app                        # keep only one server program running on bg
+if [ "$SERVING_MODE" = "gunicorn" ]; then
+    exec gunicorn -c gunicorn.conf.py SVD_model_app:app   # preloaded master + forked workers
+fi
+exec python3 SVD_model_app.py              # run server program in bg no hang state
@@ -0,0 +1,79 @@
+# ------------------------------------------------------------------------------
+# train_svd_job.py
+#
+# How to Run:
+#     python3 train_svd_job.py                     # train once and exit
+#     python3 train_svd_job.py --every-minutes 60  # keep retraining on a schedule
+#     python3 train_svd_job.py --every-minutes 60 --fold-in-minutes 1
+#                                                  # and fold in new ratings between retrains
+#
+# Purpose:
+#     Trains the SVD model outside the model server and writes a versioned
+#     artifact directory (factors, biases, ID dictionaries, seen-item index and
+#     materialized recommendations) under SVD_ARTIFACT_DIR, then points
+#     SVD_ARTIFACT_DIR/LATEST at it. Only the --keep newest artifacts are kept.
+#
+#     SVD_model_app.py memory-maps the LATEST artifact at startup, so server
+#     replicas come up without loading MongoDB or training.
+#
+#     Under gunicorn the workers only load artifacts, so this job is also where
+#     new ratings are folded in: with --fold-in-minutes, it folds the ratings
+#     recorded since the last retrain (or fold-in) into a copy of the current
+#     model and publishes the result as a new artifact (`<version>_foldN`).
+# ------------------------------------------------------------------------------
+import argparse
+import copy
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from Models.SVD import SVDPipeline, ARTIFACT_DIR, ARTIFACT_KEEP
+
+
+def train_once(artifact_dir, snapshots=None, keep=ARTIFACT_KEEP):
+    start = time.time()
+    pipeline = SVDPipeline(snapshots=snapshots)
+    path = pipeline.save_artifact(artifact_dir, keep)
+    print(f"{datetime.now()} - Trained {pipeline.model_version} in {time.time() - start:.1f}s -> {path}")
+    return pipeline
+
+
+def fold_in_once(pipeline, artifact_dir, keep=ARTIFACT_KEEP):
+    """
+    Fold the ratings recorded since `pipeline` was trained or last folded into a copy of it, and
+    publish the copy as a new artifact if there were any. Returns the pipeline to fold into next.
+    """
+    folded = copy.copy(pipeline)
+    if folded.fold_in_new_ratings():
+        folded.validate()
+        path = folded.save_artifact(artifact_dir, keep)
+        print(f"{datetime.now()} - Folded new ratings into {folded.model_version} -> {path}")
+    return folded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the SVD model and publish a model artifact")
+    parser.add_argument("--artifact-dir", default=ARTIFACT_DIR)
+    parser.add_argument("--every-minutes", type=float, default=None, help="retrain on this schedule")
+    parser.add_argument("--fold-in-minutes", type=float, default=None,
+                        help="between retrains, fold new ratings into the latest model on this schedule")
+    parser.add_argument("--keep", type=int, default=ARTIFACT_KEEP, help="newest artifacts to keep, 0 keeps all")
+    args = parser.parse_args()
+
+    # Keep the training snapshots between runs so each retrain only fetches new data
+    pipeline = train_once(args.artifact_dir, keep=args.keep)
+    snapshots = pipeline.snapshots
+    last_trained = time.monotonic()
+    step_minutes = args.fold_in_minutes or args.every_minutes
+    while step_minutes:
+        time.sleep(step_minutes * 60)
+        try:
+            if args.every_minutes and time.monotonic() - last_trained >= args.every_minutes * 60:
+                pipeline = train_once(args.artifact_dir, snapshots, args.keep)
+                last_trained = time.monotonic()
+            elif args.fold_in_minutes:
+                pipeline = fold_in_once(pipeline, args.artifact_dir, args.keep)
+        except Exception as e:
+            print(f"{datetime.now()} - Error training SVD model or folding in new ratings: {e}")
@@ -0,0 +1,94 @@
+# ------------------------------------------------------------------------------
+# ann_recall.py
+#
+# How to Run:
+#     python3 model_training/benchmarks/ann_recall.py [--items 50000] [--factors 100]
+#
+# Purpose:
+#     Benchmarks the approximate candidate index (Models/ann.py) against exact
+#     scoring, so SVD_IVF_LISTS / SVD_IVF_PROBES can be picked from data.
+#
+#     For every (n_lists, n_probe) setting it reports:
+#       - recall@20 against exhaustive scoring of all items
+#       - mean query latency (candidate retrieval + scoring the candidates)
+#       - mean fraction of the catalog that was scored
+#
+#     By default it uses synthetic clustered factors shaped like a trained
+#     surprise SVD model. Pass --mongo to train an SVDPipeline on MongoDB data
+#     and benchmark its real factors instead.
+# ------------------------------------------------------------------------------
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from Models.ann import ExhaustiveIndex, ClusteredIndex, recall_at_k
+from Models.scoring import SVDScorer
+
+
+def synthetic_scorer(n_items, n_users, n_factors, seed=0):
+    """Scorer over clustered random factors, with biases on the scale surprise produces"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.1, (32, n_factors))
+    item_factors = centers[rng.integers(0, 32, n_items)] + rng.normal(0, 0.05, (n_items, n_factors))
+    user_factors = rng.normal(0, 0.1, (n_users, n_factors))
+    return SVDScorer(
+        item_ids=np.arange(n_items).astype(str),
+        item_factors=item_factors,
+        item_bias=rng.normal(0, 0.2, n_items),
+        item_known=np.ones(n_items, dtype=bool),
+        user_factors=user_factors,
+        user_bias=rng.normal(0, 0.2, n_users),
+        user_inner_ids={str(u): u for u in range(n_users)},
+        global_mean=3.5,
+        rating_scale=(1, 5),
+    )
+
+
+def mongo_scorer():
+    """Scorer of an SVD model trained on the configured MongoDB"""
+    from Models.SVD import SVDPipeline
+    return SVDPipeline().scorer
+
+
+def run(scorer, n_queries, k, list_options, probe_options):
+    rng = np.random.default_rng(1)
+    user_ids = rng.choice(list(scorer.user_inner_ids), min(n_queries, len(scorer.user_inner_ids)), replace=False)
+    item_vectors = np.hstack([scorer.item_factors, scorer.item_bias[:, None]])
+    n_items = len(scorer.item_ids)
+
+    recall, latency = recall_at_k(ExhaustiveIndex(n_items), scorer, user_ids, k)
+    print(f"{'index':<10}{'lists':>8}{'probes':>8}{'recall@' + str(k):>12}{'ms/query':>12}{'scanned':>10}")
+    print(f"{'exact':<10}{'-':>8}{'-':>8}{recall:>12.4f}{latency * 1000:>12.3f}{1.0:>10.3f}")
+
+    for n_lists in list_options:
+        start = time.perf_counter()
+        index = ClusteredIndex(item_vectors, n_lists=n_lists)
+        build_seconds = time.perf_counter() - start
+        for n_probe in probe_options:
+            if n_probe >= n_lists:
+                continue
+            index.n_probe = n_probe
+            recall, latency = recall_at_k(index, scorer, user_ids, k)
+            scanned = np.mean([len(index.candidates(scorer.query_vector(u))) for u in user_ids]) / n_items
+            print(f"{'ivf':<10}{n_lists:>8}{n_probe:>8}{recall:>12.4f}{latency * 1000:>12.3f}{scanned:>10.3f}")
+        print(f"  (built {n_lists} lists in {build_seconds:.2f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k / latency benchmark for the SVD candidate index")
+    parser.add_argument("--items", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--factors", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--lists", type=int, nargs="+", default=[64, 256, 1024])
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--mongo", action="store_true", help="benchmark a model trained on MongoDB data")
+    args = parser.parse_args()
+
+    scorer = mongo_scorer() if args.mongo else synthetic_scorer(args.items, args.users, args.factors)
+    run(scorer, args.queries, args.k, args.lists, args.probes)
@@ -0,0 +1,93 @@
+# ------------------------------------------------------------------------------
+# knn_scaling.py
+#
+# How to Run:
+#     python3 model_training/benchmarks/knn_scaling.py
+#     python3 model_training/benchmarks/knn_scaling.py --users 1000 10000 50000 --jobs 4
+#     python3 model_training/benchmarks/knn_scaling.py --surprise   # also fit surprise KNNBasic
+#
+# Purpose:
+#     Shows how the sparse top-k KNN engine (Models/knn_engine.py) scales with
+#     the number of users.
+#
+#     For every size it generates ratings (--per-user ratings per user), fits
+#     SparseKNN and reports:
+#       - fit time
+#       - peak Python/NumPy memory while fitting (tracemalloc)
+#       - size of the kept neighbour arrays
+#       - time to score every movie for one user
+#
+#     The neighbour arrays grow with n_users * k. With --surprise, KNNBasic is
+#     fitted on the same ratings (up to 20000 users) to compare against its
+#     dense n_users x n_users similarity matrix.
+# ------------------------------------------------------------------------------
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from Models.knn_engine import SparseKNN
+
+
+def synthetic_ratings(n_users, n_items, per_user, seed=0):
+    """Integer ratings 1-5, popularity-skewed items, one rating per (user, item)"""
+    rng = np.random.default_rng(seed)
+    users = np.repeat(np.arange(n_users), per_user)
+    items = np.minimum(rng.zipf(1.3, len(users)) - 1, n_items - 1)
+    ratings = rng.integers(1, 6, len(users)).astype(np.float64)
+    df = pd.DataFrame({'user': users, 'item': items, 'rating': ratings}).drop_duplicates(['user', 'item'])
+    return df['user'].to_numpy(), df['item'].to_numpy(), df['rating'].to_numpy()
+
+
+def surprise_fit(users, items, ratings):
+    from surprise import KNNBasic, Dataset, Reader
+    df = pd.DataFrame({'user': users, 'item': items, 'rating': ratings})
+    tracemalloc.start()
+    start = time.perf_counter()
+    KNNBasic(verbose=False).fit(Dataset.load_from_df(df, Reader(rating_scale=(1, 5))).build_full_trainset())
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmark for the sparse top-k KNN engine")
+    parser.add_argument("--users", type=int, nargs="+", default=[1_000, 5_000, 10_000])
+    parser.add_argument("--items", type=int, default=5_000)
+    parser.add_argument("--per-user", type=int, default=30)
+    parser.add_argument("--k", type=int, default=40)
+    parser.add_argument("--block-size", type=int, default=256)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--surprise", action="store_true", help="also fit surprise KNNBasic (up to 20000 users)")
+    args = parser.parse_args()
+
+    print(f"{'users':>8} {'ratings':>9} {'fit s':>8} {'peak MiB':>9} {'kept MiB':>9} {'score ms':>9}"
+          + (f" {'surprise s':>11} {'surprise MiB':>13}" if args.surprise else ""))
+
+    for n_users in args.users:
+        users, items, ratings = synthetic_ratings(n_users, args.items, args.per_user)
+        engine = SparseKNN(k=args.k, block_size=args.block_size, n_jobs=args.jobs)
+        tracemalloc.start()
+        start = time.perf_counter()
+        engine.fit(users, items, ratings, n_users, args.items)
+        fit_seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        engine.score(0)
+        score_ms = (time.perf_counter() - start) * 1000
+
+        kept = engine.neighbors.nbytes + engine.similarities.nbytes
+        row = (f"{n_users:>8} {len(ratings):>9} {fit_seconds:>8.2f} {peak / 2**20:>9.1f} {kept / 2**20:>9.2f} "
+               f"{score_ms:>9.2f}")
+        if args.surprise and n_users <= 20_000:
+            seconds, surprise_peak = surprise_fit(users, items, ratings)
+            row += f" {seconds:>11.2f} {surprise_peak / 2**20:>13.1f}"
+        print(row)
@@ -0,0 +1,119 @@
+# ------------------------------------------------------------------------------
+# serving_concurrency.py
+#
+# How to Run:
+#     python3 model_training/benchmarks/serving_concurrency.py
+#     python3 model_training/benchmarks/serving_concurrency.py --threads 1 2 4 8 16 --items 50000
+#
+# Purpose:
+#     Shows how /recommend throughput scales with worker threads when requests
+#     read the published pipeline snapshot without a lock, compared to the old
+#     handler that held the global model_lock around every request.
+#
+#     It builds an SVDPipeline over synthetic factors (no materialized table,
+#     so every request scores all unseen items) and, for every thread count,
+#     runs the same request mix through:
+#       - locked:   with model_lock: pipeline.get_recommendations(user)
+#       - snapshot: pipeline = current; pipeline.get_recommendations(user)
+#     while a publisher thread swaps in a new pipeline every --publish-ms.
+#
+#     NumPy releases the GIL inside the scoring matrix-vector products, so the
+#     snapshot path should scale with threads up to the number of cores.
+# ------------------------------------------------------------------------------
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from Models.SVD import SVDPipeline
+from Models.scoring import SVDScorer
+from Models.seen_index import SeenItemIndex
+
+
+def synthetic_pipeline(n_users, n_items, n_factors, ratings_per_user=20, seed=0):
+    rng = np.random.default_rng(seed)
+    user_ids = np.arange(n_users).astype(str)
+    item_ids = np.char.add('movie', np.arange(n_items).astype(str))
+    ratings = pd.DataFrame({
+        'user_id': np.repeat(user_ids, ratings_per_user),
+        'movie_id': item_ids[rng.integers(0, n_items, n_users * ratings_per_user)],
+    })
+
+    pipeline = SVDPipeline.__new__(SVDPipeline)
+    pipeline.seen_index = SeenItemIndex.from_ratings(ratings, item_ids)
+    pipeline.scorer = SVDScorer(
+        item_ids=pipeline.seen_index.item_ids,
+        item_factors=rng.normal(0, 0.1, (n_items, n_factors)),
+        item_bias=rng.normal(0, 0.2, n_items),
+        item_known=np.ones(n_items, dtype=bool),
+        user_factors=rng.normal(0, 0.1, (n_users, n_factors)),
+        user_bias=rng.normal(0, 0.2, n_users),
+        user_inner_ids={user_id: row for row, user_id in enumerate(pipeline.seen_index.user_ids)},
+        global_mean=3.5,
+        rating_scale=(1, 5),
+    )
+    pipeline.recommendation_table = None
+    pipeline.candidate_index = None
+    pipeline.popularity = None
+    pipeline.model_version = "svd_benchmark"
+    return pipeline
+
+
+def run(mode, n_threads, requests_per_thread, pipelines, publish_ms):
+    lock = threading.RLock()
+    current = {"pipeline": pipelines[0]}
+    stop = threading.Event()
+
+    def publisher():
+        i = 0
+        while not stop.wait(publish_ms / 1000):
+            i += 1
+            with lock:
+                current["pipeline"] = pipelines[i % len(pipelines)]
+
+    def worker(seed):
+        rng = np.random.default_rng(seed)
+        users = rng.integers(0, pipelines[0].seen_index.n_users, requests_per_thread)
+        for user in users:
+            if mode == "locked":
+                with lock:
+                    current["pipeline"].get_recommendations(user)
+            else:
+                pipeline = current["pipeline"]
+                pipeline.get_recommendations(user)
+
+    swapper = threading.Thread(target=publisher, daemon=True)
+    swapper.start()
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(n_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    stop.set()
+    swapper.join()
+    return n_threads * requests_per_thread / seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrency benchmark for the /recommend read path")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--items", type=int, default=20_000)
+    parser.add_argument("--factors", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=200, help="requests per thread")
+    parser.add_argument("--publish-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    pipelines = [synthetic_pipeline(args.users, args.items, args.factors, seed=seed) for seed in range(2)]
+    print(f"{'threads':>8} {'locked req/s':>13} {'snapshot req/s':>15} {'speedup':>8}")
+    for n_threads in args.threads:
+        locked = run("locked", n_threads, args.requests, pipelines, args.publish_ms)
+        snapshot = run("snapshot", n_threads, args.requests, pipelines, args.publish_ms)
+        print(f"{n_threads:>8} {locked:>13.0f} {snapshot:>15.0f} {snapshot / locked:>8.2f}")
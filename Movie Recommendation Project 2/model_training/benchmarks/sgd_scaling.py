@@ -0,0 +1,102 @@
+# ------------------------------------------------------------------------------
+# sgd_scaling.py
+#
+# How to Run:
+#     python3 model_training/benchmarks/sgd_scaling.py
+#     python3 model_training/benchmarks/sgd_scaling.py --sizes 10000 100000 1000000 10000000 --epochs 1
+#     python3 model_training/benchmarks/sgd_scaling.py --surprise   # also fit surprise SVD for comparison
+#
+# Purpose:
+#     Shows how the out-of-core minibatch SGD trainer (Models/sgd.py) scales
+#     with the number of ratings.
+#
+#     For every size it streams synthetic ratings in batches into a local rating
+#     snapshot on disk, memory-maps it and trains MinibatchSVD over chunks, then
+#     reports:
+#       - snapshot write time
+#       - training time per epoch and ratings/sec
+#       - peak Python/NumPy memory while training (tracemalloc)
+#       - training RMSE
+#
+#     Peak memory should follow the size of the factor matrices and one chunk,
+#     not the number of ratings. With --surprise, surprise's SVD is fitted on the
+#     same ratings (sizes up to 1e6) to compare against its in-memory trainset.
+# ------------------------------------------------------------------------------
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from Models.sgd import MinibatchSVD, write_rating_snapshot
+
+
+def synthetic_batches(n_ratings, n_users, n_items, batch_size=100_000, n_factors=10, seed=0):
+    """Low-rank ratings in the 1-5 range, generated batch by batch like a Mongo cursor"""
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(0, 0.4, (n_users, n_factors))
+    item_factors = rng.normal(0, 0.4, (n_items, n_factors))
+    for start in range(0, n_ratings, batch_size):
+        size = min(batch_size, n_ratings - start)
+        users = rng.integers(0, n_users, size)
+        items = rng.integers(0, n_items, size)
+        ratings = np.clip(3 + (user_factors[users] * item_factors[items]).sum(axis=1) + rng.normal(0, 0.3, size), 1, 5)
+        yield users, items, ratings
+
+
+def surprise_fit(snapshot, n_epochs):
+    from surprise import SVD, Dataset, Reader
+    df = pd.DataFrame({'user_id': np.asarray(snapshot.user_codes), 'movie_id': np.asarray(snapshot.item_codes),
+                       'rating': np.asarray(snapshot.ratings)})
+    tracemalloc.start()
+    start = time.perf_counter()
+    SVD(n_epochs=n_epochs).fit(Dataset.load_from_df(df, Reader(rating_scale=(1, 5))).build_full_trainset())
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmark for minibatch SGD training")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--factors", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--surprise", action="store_true", help="also fit surprise SVD (sizes <= 1e6)")
+    args = parser.parse_args()
+
+    print(f"{'ratings':>10} {'users':>8} {'items':>7} {'write s':>8} {'s/epoch':>9} {'ratings/s':>10} "
+          f"{'peak MiB':>9} {'rmse':>6}" + (f" {'surprise s':>11} {'surprise MiB':>13}" if args.surprise else ""))
+
+    for n_ratings in args.sizes:
+        n_users = max(100, n_ratings // 50)
+        n_items = max(100, min(50_000, n_ratings // 200))
+        with tempfile.TemporaryDirectory() as path:
+            start = time.perf_counter()
+            snapshot = write_rating_snapshot(path, synthetic_batches(n_ratings, n_users, n_items))
+            write_seconds = time.perf_counter() - start
+
+            model = MinibatchSVD(n_factors=args.factors, n_epochs=args.epochs, batch_size=args.batch_size,
+                                 chunk_size=args.chunk_size, random_state=0)
+            tracemalloc.start()
+            start = time.perf_counter()
+            model.fit(snapshot)
+            train_seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            per_epoch = train_seconds / max(args.epochs, 1)
+            row = (f"{n_ratings:>10} {snapshot.n_users:>8} {snapshot.n_items:>7} {write_seconds:>8.2f} "
+                   f"{per_epoch:>9.2f} {n_ratings / per_epoch:>10.0f} {peak / 2**20:>9.1f} {model.rmse(snapshot):>6.3f}")
+            if args.surprise and n_ratings <= 1_000_000:
+                seconds, surprise_peak = surprise_fit(snapshot, args.epochs)
+                row += f" {seconds:>11.2f} {surprise_peak / 2**20:>13.1f}"
+            print(row)
+            del snapshot
@@ -0,0 +1,56 @@
+import threading
+from datetime import datetime
+
+from Models.artifacts import latest_artifact, latest_version
+
+
+class ArtifactWatcher:
+    """
+        Keeps a process serving the artifact that `root/LATEST` points at.
+
+        A daemon thread reads LATEST every `interval` seconds; when it names a version other than the
+        one being served, `load(path)` builds a pipeline from the artifact (memory-mapped, so processes
+        serving the same version share its pages) and `publish(pipeline)` swaps it in. A failed load
+        is reported and retried on the next poll.
+    """
+    def __init__(self, root, load, publish, current_version=None, interval=5.0):
+        self.root = root
+        self.load = load
+        self.publish = publish
+        self.current_version = current_version
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        """Load and publish the LATEST artifact if it changed; returns True if a new version was published."""
+        version = latest_version(self.root)
+        if version is None or version == self.current_version:
+            return False
+        path = latest_artifact(self.root)
+        if path is None:
+            return False
+        try:
+            pipeline = self.load(path)
+        except Exception as e:
+            print(f"{datetime.now()} - Error loading model artifact {path}: {e}")
+            return False
+        self.publish(pipeline)
+        self.current_version = version
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="artifact-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            self.check()
+            if self._stop.wait(self.interval):
+                return
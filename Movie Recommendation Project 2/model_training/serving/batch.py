@@ -0,0 +1,20 @@
+def parse_batch_request(body, max_users=1000, default_recommendations=20):
+    """
+    Validate a /recommend/batch body, {"user_ids": [...], "num_recommendations": n}.
+    Returns (user_ids, num_recommendations); raises ValueError with a message for the client otherwise.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be a JSON object")
+    user_ids = body.get("user_ids")
+    if not isinstance(user_ids, list) or not all(_is_int(user_id) for user_id in user_ids):
+        raise ValueError("user_ids must be a list of integer user ids")
+    if len(user_ids) > max_users:
+        raise ValueError(f"At most {max_users} user ids per request, got {len(user_ids)}")
+    num_recommendations = body.get("num_recommendations", default_recommendations)
+    if not _is_int(num_recommendations) or num_recommendations <= 0:
+        raise ValueError("num_recommendations must be a positive integer")
+    return user_ids, num_recommendations
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
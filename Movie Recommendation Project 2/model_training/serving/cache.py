@@ -0,0 +1,106 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from prometheus_client import Counter, Gauge
+
+CACHE_HITS = Counter("recommendation_cache_hits", "Recommendation cache hits", ["cache"])
+CACHE_MISSES = Counter("recommendation_cache_misses", "Recommendation cache misses", ["cache"])
+CACHE_EVICTIONS = Counter("recommendation_cache_evictions", "Recommendation cache evictions", ["cache", "reason"])
+# Each worker has its own cache; under gunicorn the live workers' sizes are added up
+CACHE_BYTES = Gauge("recommendation_cache_bytes", "Estimated size of the cached recommendations", ["cache"],
+                    multiprocess_mode="livesum")
+CACHE_ENTRIES = Gauge("recommendation_cache_entries", "Number of cached recommendation lists", ["cache"],
+                      multiprocess_mode="livesum")
+
+
+class RecommendationCache:
+    """
+        LRU + TTL cache of recommendation lists keyed by (user_id, model_version).
+
+        Entries expire `ttl_seconds` after they were stored; the least recently used ones are evicted
+        once the estimated size of the cache exceeds `max_bytes` (0 disables caching). `reset()` drops
+        everything when a new pipeline is published and, from then on, only accepts lists computed by
+        that model version, so a request still running on the old pipeline cannot refill the cache.
+        Hits, misses and evictions are counted here and in Prometheus, labelled with `name`.
+    """
+    def __init__(self, name, max_bytes=64 * 2**20, ttl_seconds=300.0, clock=time.monotonic):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.model_version = None
+        self.entries = OrderedDict()  # (user_id, model_version) -> (expires_at, size, recommendations)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id, model_version):
+        """Cached recommendations of `user_id` for `model_version`, or None."""
+        key = (user_id, model_version)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                self._remove(key, "expired")
+                entry = None
+            if entry is None:
+                self.misses += 1
+                CACHE_MISSES.labels(self.name).inc()
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        CACHE_HITS.labels(self.name).inc()
+        return list(entry[2])
+
+    def put(self, user_id, model_version, recommendations):
+        """Store a copy of `recommendations`, evicting the least recently used entries to stay within max_bytes."""
+        key = (user_id, model_version)
+        size = _entry_size(key, recommendations)
+        with self._lock:
+            if size > self.max_bytes or (self.model_version is not None and model_version != self.model_version):
+                return
+            if key in self.entries:
+                self._remove(key, None)
+            self.entries[key] = (self.clock() + self.ttl_seconds, size, tuple(recommendations))
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)), "size")
+            self._update_gauges()
+
+    def reset(self, model_version=None):
+        """Drop every entry, e.g. on model swap, and only accept entries of `model_version` afterwards."""
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
+            self.model_version = model_version
+            self._update_gauges()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.size,
+            }
+
+    def _remove(self, key, reason):
+        self.size -= self.entries.pop(key)[1]
+        if reason is not None:
+            self.evictions += 1
+            CACHE_EVICTIONS.labels(self.name, reason).inc()
+        self._update_gauges()
+
+    def _update_gauges(self):
+        CACHE_BYTES.labels(self.name).set(self.size)
+        CACHE_ENTRIES.labels(self.name).set(len(self.entries))
+
+
+def _entry_size(key, recommendations):
+    """Rough in-memory size of one entry: key, tuple of ids and the ids themselves."""
+    return (sys.getsizeof(key) + sum(sys.getsizeof(part) for part in key)
+            + sys.getsizeof(tuple(recommendations)) + sum(sys.getsizeof(item) for item in recommendations))
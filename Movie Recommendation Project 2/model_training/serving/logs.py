@@ -0,0 +1,144 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# 1% of the per-request INFO records, every warning and error
+DEFAULT_SAMPLE_RATES = {"DEBUG": 1.0, "INFO": 0.01, "WARNING": 1.0, "ERROR": 1.0, "CRITICAL": 1.0}
+
+
+class SamplingFilter(logging.Filter):
+    """
+        Keeps a random fraction of the records of each level, e.g. {"INFO": 0.01} keeps 1% of INFO records.
+        Levels without a rate are always kept.
+    """
+    def __init__(self, rates, rng=random.random):
+        super().__init__()
+        self.rates = {logging.getLevelName(level.upper()) if isinstance(level, str) else level: float(rate)
+                      for level, rate in rates.items()}
+        self.rng = rng
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or (rate > 0 and self.rng() < rate)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and the record's `fields`."""
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """`time - LEVEL - logger - message key=value ...` for reading logs by hand."""
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full instead of raising."""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handlers = {}
+
+
+def parse_sample_rates(value):
+    """Parse "INFO=1,DEBUG=0" into per-level rates, on top of the defaults (DEFAULT_SAMPLE_RATES)."""
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    for part in filter(None, (part.strip() for part in (value or "").split(","))):
+        level, _, rate = part.partition("=")
+        rates[level.strip().upper()] = float(rate)
+    return rates
+
+
+def configure_logging(name, env=None, stream=None, start=True):
+    """
+    Logger `name` whose records are sampled in the calling thread, put on a bounded queue without
+    blocking, and formatted and written by a background QueueListener thread.
+
+    Configured from the environment:
+        LOG_LEVEL         minimum level (INFO)
+        LOG_SAMPLE_RATES  fraction kept per level, e.g. "INFO=1" (1% of INFO and everything else by default)
+        LOG_FORMAT        "json" (default) or "text"
+        LOG_QUEUE_SIZE    records buffered before new ones are dropped (10000)
+    Calling it again for the same name returns the already configured logger.
+
+    With `start=False` no thread is started yet: records wait on the queue until `start()` or
+    `after_fork()`, so a process that forks workers (a preloading gunicorn master) runs no listener.
+    """
+    logger = logging.getLogger(name)
+    if name in _handlers:
+        return logger
+    env = os.environ if env is None else env
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=int(env.get("LOG_QUEUE_SIZE", 10000))))
+    handler.addFilter(SamplingFilter(parse_sample_rates(env.get("LOG_SAMPLE_RATES"))))
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(TextFormatter() if env.get("LOG_FORMAT", "json").lower() == "text" else JsonFormatter())
+    handler.listener = QueueListener(handler.queue, output, respect_handler_level=False)
+    handler.started = False
+    if start:
+        _start_listener(handler)
+
+    logger.setLevel(env.get("LOG_LEVEL", "INFO").upper())
+    logger.addHandler(handler)
+    logger.propagate = False
+    _handlers[name] = handler
+    return logger
+
+
+def start():
+    """Start the listener threads of the loggers configured with start=False, e.g. outside gunicorn."""
+    for handler in _handlers.values():
+        if not handler.started:
+            _start_listener(handler)
+
+
+def after_fork():
+    """
+    Restart the listener threads in a forked child, e.g. a gunicorn worker: the parent's threads do
+    not survive fork and its queues may have been copied mid-use, so each handler gets a fresh queue.
+    """
+    for handler in _handlers.values():
+        atexit.unregister(handler.listener.stop)
+        handler.queue = queue.Queue(maxsize=handler.queue.maxsize)
+        handler.listener = QueueListener(handler.queue, *handler.listener.handlers, respect_handler_level=False)
+        _start_listener(handler)
+
+
+def _start_listener(handler):
+    handler.listener.start()
+    handler.started = True
+    atexit.register(handler.listener.stop)
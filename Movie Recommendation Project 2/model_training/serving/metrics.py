@@ -0,0 +1,77 @@
+import os
+
+from prometheus_client import CollectorRegistry, Gauge, Histogram, generate_latest, multiprocess
+
+# Most stages take microseconds; scoring every movie takes milliseconds
+STAGE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+STAGE_LATENCY = Histogram(
+    "recommend_stage_seconds", "Time spent in each stage of a recommendation request",
+    ["pipeline_type", "model_version", "stage"], buckets=STAGE_BUCKETS)
+# Every worker serves the same model, so under gunicorn the live processes' values are not added up
+MODEL_BYTES = Gauge("model_size_bytes", "Bytes of the served model's arrays", ["pipeline_type", "model_version"],
+                    multiprocess_mode="livemax")
+MODEL_ITEMS = Gauge("model_items", "Number of movies the served model can recommend", ["pipeline_type", "model_version"],
+                    multiprocess_mode="livemax")
+MODEL_TRAINING_SECONDS = Gauge("model_training_seconds", "Duration of the served model's training",
+                               ["pipeline_type", "model_version"], multiprocess_mode="livemax")
+
+# (pipeline_type, model_version, stage) series created so far, so a replaced model's can be removed
+_stage_series = set()
+
+
+def multiprocess_enabled():
+    """Whether metrics are kept in PROMETHEUS_MULTIPROC_DIR, as set up for gunicorn workers (see gunicorn.conf.py)."""
+    return bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def render_metrics():
+    """
+    Metrics in the Prometheus text format: those of all gunicorn workers (and the master) combined in
+    multiprocess mode, otherwise those of this process.
+    """
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+def observe_stages(pipeline_type, model_version, timings):
+    """Export one request's StageTimings to the stage latency histogram."""
+    for stage, seconds in timings.items():
+        _stage_series.add((pipeline_type, model_version, stage))
+        STAGE_LATENCY.labels(pipeline_type, model_version, stage).observe(seconds)
+
+
+def record_model(pipeline_type, pipeline, previous=None):
+    """
+    Set the model gauges for a newly published pipeline. The series of the `previous` pipeline are
+    removed, so retrains and fold-ins do not pile up one set of series per model version.
+    """
+    stats = pipeline.get_model_stats()
+    MODEL_BYTES.labels(pipeline_type, pipeline.model_version).set(stats["model_bytes"])
+    MODEL_ITEMS.labels(pipeline_type, pipeline.model_version).set(stats["n_items"])
+    if stats["training_seconds"] is not None:
+        MODEL_TRAINING_SECONDS.labels(pipeline_type, pipeline.model_version).set(stats["training_seconds"])
+    if previous is not None and previous.model_version != pipeline.model_version:
+        forget_model(pipeline_type, previous.model_version)
+
+
+def forget_model(pipeline_type, model_version):
+    for gauge in (MODEL_BYTES, MODEL_ITEMS, MODEL_TRAINING_SECONDS):
+        _remove(gauge, pipeline_type, model_version)
+    for series in [s for s in list(_stage_series) if s[:2] == (pipeline_type, model_version)]:
+        _stage_series.discard(series)
+        _remove(STAGE_LATENCY, *series)
+
+
+def _remove(metric, *labels):
+    # prometheus_client cannot remove series in multiprocess mode; they stay until the worker exits
+    if multiprocess_enabled():
+        return
+    try:
+        metric.remove(*labels)
+    except KeyError:
+        pass
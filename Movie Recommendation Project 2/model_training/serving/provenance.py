@@ -0,0 +1,155 @@
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+
+from pymongo.errors import BulkWriteError
+
+# put on the queue by close() to wake the writer thread
+_WAKE = object()
+
+
+class ProvenanceWriter:
+    """
+        Buffered background writer for request provenance documents.
+
+        Requests only put their document on a bounded in-process queue; a daemon thread drains it
+        and writes unordered `insert_many` batches once `batch_size` documents are waiting or
+        `flush_interval` seconds have passed. When the queue is full the document is dropped and
+        counted instead of blocking the request. Whatever is still queued is flushed on `close()`,
+        which also runs at interpreter exit.
+
+        A process that forks workers should hold neither a MongoClient nor the writer thread: pass
+        `open_collection` instead of `collection` to open it in the writer thread on the first write,
+        and `start=False` to leave the thread to `start()` or `after_fork()`.
+    """
+    def __init__(self, collection=None, max_queue=10000, batch_size=500, flush_interval=1.0,
+                 open_collection=None, start=True):
+        self.collection = collection
+        self.open_collection = open_collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._start(max_queue, start)
+        atexit.register(self.close)
+
+    def start(self):
+        """Start the writer thread of a writer created with start=False."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="provenance-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def _start(self, max_queue, start=True):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if start:
+            self.start()
+
+    def after_fork(self):
+        """
+        Restart in a forked child, e.g. a gunicorn worker. The writer thread does not survive fork and
+        the parent's queue and locks may have been copied mid-use, so the child gets fresh ones;
+        documents queued in the parent are left for the parent to write.
+        """
+        self._start(self.queue.maxsize)
+
+    def submit(self, document):
+        """Queue one document without blocking. Returns False if it was dropped because the queue is full."""
+        try:
+            self.queue.put_nowait(document)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        with self._stats_lock:
+            self.submitted += 1
+        return True
+
+    def submit_many(self, documents):
+        """Queue several documents; returns how many were accepted."""
+        return sum(self.submit(document) for document in documents)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "submitted": self.submitted,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "queued": self.queue.qsize(),
+            }
+
+    def close(self, timeout=10.0):
+        """Stop the writer thread after it has flushed everything queued so far."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._thread is None:
+            # never started: write what was queued from this thread
+            self._write(self._drain())
+            return
+        try:
+            self.queue.put_nowait(_WAKE)
+        except queue.Full:
+            pass  # the thread is busy draining and sees the stop flag next
+        self._thread.join(timeout)
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                document = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                if document is not _WAKE:
+                    batch.append(document)
+            except queue.Empty:
+                pass
+
+            stopping = self._stop.is_set()
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline or stopping:
+                if stopping:
+                    batch.extend(self._drain())
+                for start in range(0, len(batch), self.batch_size):
+                    self._write(batch[start:start + self.batch_size])
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+                if stopping:
+                    return
+
+    def _drain(self):
+        documents = []
+        while True:
+            try:
+                document = self.queue.get_nowait()
+            except queue.Empty:
+                return documents
+            if document is not _WAKE:
+                documents.append(document)
+
+    def _write(self, documents):
+        if not documents:
+            return
+        try:
+            if self.collection is None:
+                self.collection = self.open_collection()
+            self.collection.insert_many(documents, ordered=False)
+            with self._stats_lock:
+                self.written += len(documents)
+        except BulkWriteError as e:
+            # unordered: everything but the failing documents was inserted
+            inserted = e.details.get("nInserted", 0)
+            with self._stats_lock:
+                self.written += inserted
+                self.failed += len(documents) - inserted
+            print(f"{datetime.now()} - {len(documents) - inserted} provenance records failed to write")
+        except Exception as e:
+            with self._stats_lock:
+                self.failed += len(documents)
+            print(f"{datetime.now()} - Error writing {len(documents)} provenance records: {e}")
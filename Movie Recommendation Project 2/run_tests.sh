@@ -33,7 +33,7 @@ function install_dependencies {
 # Run all tests
 function run_all_tests {
     echo -e "${BLUE}Running all tests...${NC}"
-    python -m pytest tests/data_process_test.py tests/test_kafka.py tests/test_svd_model.py tests/test_model_app.py tests/test_backend_app.py tests/test_config.py -v
+    python -m pytest tests/data_process_test.py tests/test_kafka.py tests/test_svd_model.py tests/test_svd_scoring.py tests/test_seen_index.py tests/test_materialize.py tests/test_ann.py tests/test_fold_in.py tests/test_artifacts.py tests/test_tuning.py tests/test_loader.py tests/test_snapshot.py tests/test_sgd.py tests/test_ids.py tests/test_popularity.py tests/test_movie_features.py tests/test_knn.py tests/test_knn_app.py tests/test_provenance.py tests/test_batch.py tests/test_cache.py tests/test_artifact_watcher.py tests/test_metrics.py tests/test_logs.py tests/test_model_app.py tests/test_backend_app.py tests/test_config.py -v
 }
 
 # Run data quality tests
@@ -45,7 +45,7 @@ function run_data_tests {
 # Run model tests
 function run_model_tests {
     echo -e "${BLUE}Running model tests...${NC}"
-    python -m pytest tests/test_svd_model.py tests/test_model_app.py -v
+    python -m pytest tests/test_svd_model.py tests/test_svd_scoring.py tests/test_seen_index.py tests/test_materialize.py tests/test_ann.py tests/test_fold_in.py tests/test_artifacts.py tests/test_tuning.py tests/test_loader.py tests/test_snapshot.py tests/test_sgd.py tests/test_ids.py tests/test_popularity.py tests/test_movie_features.py tests/test_knn.py tests/test_knn_app.py tests/test_provenance.py tests/test_batch.py tests/test_cache.py tests/test_artifact_watcher.py tests/test_metrics.py tests/test_logs.py tests/test_model_app.py -v
 }
 
 # Run backend tests
@@ -57,7 +57,7 @@ function run_backend_tests {
 # Generate coverage report
 function generate_coverage {
     echo -e "${BLUE}Generating coverage report...${NC}"
-    python -m pytest tests/data_process_test.py tests/test_kafka.py tests/test_svd_model.py tests/test_model_app.py tests/test_backend_app.py tests/test_config.py --cov=data_processing --cov=inference_service --cov=model_training --cov-report=term --cov-report=html
+    python -m pytest tests/data_process_test.py tests/test_kafka.py tests/test_svd_model.py tests/test_svd_scoring.py tests/test_seen_index.py tests/test_materialize.py tests/test_ann.py tests/test_fold_in.py tests/test_artifacts.py tests/test_tuning.py tests/test_loader.py tests/test_snapshot.py tests/test_sgd.py tests/test_ids.py tests/test_popularity.py tests/test_movie_features.py tests/test_knn.py tests/test_knn_app.py tests/test_provenance.py tests/test_batch.py tests/test_cache.py tests/test_artifact_watcher.py tests/test_metrics.py tests/test_logs.py tests/test_model_app.py tests/test_backend_app.py tests/test_config.py --cov=data_processing --cov=inference_service --cov=model_training --cov-report=term --cov-report=html
     echo -e "${GREEN}Coverage report generated! See htmlcov/index.html for details.${NC}"
 }
 
@@ -0,0 +1,59 @@
+import pytest
+import datetime
+import numpy as np
+import pandas as pd
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from surprise import SVD, Dataset, Reader
+from Models.SVD import SVDPipeline, CANDIDATE_INDEX, IVF_LISTS, IVF_PROBES
+from Models.ann import build_candidate_index
+from Models.scoring import SVDScorer
+from Models.seen_index import SeenItemIndex
+from Models.snapshot import format_data_version
+
+
+def random_ratings(seed, n_users, n_movies, rows):
+    """Random ratings of users '0'.. over movies 'movie0'.., at most one per (user, movie) pair"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'user_id': rng.integers(0, n_users, rows).astype(str),
+        'movie_id': np.char.add('movie', rng.integers(0, n_movies, rows).astype(str)),
+        'rating': rng.uniform(1, 5, rows)
+    }).drop_duplicates(['user_id', 'movie_id'], ignore_index=True)
+
+def fit_svd(ratings_df, **params):
+    """Surprise SVD fitted on all of `ratings_df`, reproducibly"""
+    reader = Reader(rating_scale=(1, 5))
+    model = SVD(random_state=0, **params)
+    model.fit(Dataset.load_from_df(ratings_df[['user_id', 'movie_id', 'rating']], reader).build_full_trainset())
+    return model
+
+@pytest.fixture
+def make_svd_pipeline():
+    """
+    Factory for SVD pipelines serving in-memory ratings instead of MongoDB, with the serving state
+    built like `SVDPipeline.build_model` does. The model is `model` or fitted on `train_df` (all
+    ratings by default), and `movies_df` defaults to every rated movie.
+    """
+    def make(ratings_df, movies_df=None, train_df=None, model=None, materialize=False):
+        if movies_df is None:
+            movies_df = pd.DataFrame({'movie_id': ratings_df['movie_id'].unique()})
+        if model is None:
+            model = fit_svd(ratings_df if train_df is None else train_df)
+
+        pipeline = SVDPipeline.__new__(SVDPipeline)
+        pipeline.DB = None
+        pipeline.init_state()
+        training_started = datetime.datetime.now()
+        pipeline.combined_ratings_df = ratings_df
+        pipeline.movies_df = movies_df
+        pipeline.data_version = format_data_version({})
+        pipeline.seen_index = SeenItemIndex.from_ratings(ratings_df, movies_df['movie_id'])
+        pipeline.popularity = pipeline.build_popularity()
+        pipeline.svd_model = model
+        pipeline.scorer = SVDScorer.from_model(model, pipeline.seen_index.item_ids)
+        pipeline.candidate_index = build_candidate_index(pipeline.scorer, CANDIDATE_INDEX, IVF_LISTS, IVF_PROBES)
+        pipeline.finish_training(training_started, materialize)
+        return pipeline
+    return make
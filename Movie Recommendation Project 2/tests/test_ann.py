@@ -0,0 +1,68 @@
+import pytest
+import numpy as np
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from Models.ann import ExhaustiveIndex, ClusteredIndex, build_candidate_index, recall_at_k
+from Models.scoring import SVDScorer
+
+
+@pytest.fixture
+def scorer():
+    """Scorer over random factors for 500 items and 50 users"""
+    rng = np.random.default_rng(0)
+    n_items, n_users, n_factors = 500, 50, 10
+    return SVDScorer(
+        item_ids=np.arange(n_items).astype(str),
+        item_factors=rng.normal(0, 0.1, (n_items, n_factors)),
+        item_bias=rng.normal(0, 0.2, n_items),
+        item_known=np.ones(n_items, dtype=bool),
+        user_factors=rng.normal(0, 0.1, (n_users, n_factors)),
+        user_bias=rng.normal(0, 0.2, n_users),
+        user_inner_ids={str(u): u for u in range(n_users)},
+        global_mean=3.0,
+        rating_scale=(1, 5),
+    )
+
+# Test the exhaustive fallback
+def test_exhaustive_index_returns_all_items(scorer):
+    """The exact index should return every item and have perfect recall"""
+    index = build_candidate_index(scorer, "exact")
+
+    assert isinstance(index, ExhaustiveIndex)
+    assert index.exact
+    assert index.candidates(scorer.query_vector("0")).tolist() == list(range(500))
+    assert recall_at_k(index, scorer, ["0", "1", "2"])[0] == 1.0
+
+# Test the clustered index
+def test_clustered_index_lists_cover_all_items(scorer):
+    """Every item should belong to exactly one inverted list"""
+    index = build_candidate_index(scorer, "ivf", n_lists=16, n_probe=4)
+
+    assert isinstance(index, ClusteredIndex)
+    assert sorted(index.list_items.tolist()) == list(range(500))
+    assert index.list_ptr[-1] == 500
+
+def test_clustered_index_probe_knob(scorer):
+    """Probing more lists should scan more items and never lower recall"""
+    index = build_candidate_index(scorer, "ivf", n_lists=16, n_probe=1)
+    user_ids = [str(u) for u in range(50)]
+    query = scorer.query_vector("0")
+
+    assert not index.exact
+    recalls, sizes = [], []
+    for n_probe in [1, 4, 16]:
+        index.n_probe = n_probe
+        candidates = index.candidates(query)
+        assert np.all(np.diff(candidates) > 0)
+        sizes.append(len(candidates))
+        recalls.append(recall_at_k(index, scorer, user_ids)[0])
+
+    assert index.exact
+    assert sizes[0] < sizes[1] < sizes[2] == 500
+    assert recalls[0] <= recalls[1] <= recalls[2] == 1.0
+
+def test_unknown_index_type(scorer):
+    """An unknown index type should raise a ValueError"""
+    with pytest.raises(ValueError):
+        build_candidate_index(scorer, "hnsw")
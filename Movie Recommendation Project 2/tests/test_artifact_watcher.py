@@ -0,0 +1,71 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from Models.artifacts import latest_version
+from serving.artifact_watcher import ArtifactWatcher
+
+
+def publish_version(root, version):
+    """Create an (empty) artifact directory and point LATEST at it"""
+    os.makedirs(root / version, exist_ok=True)
+    (root / "LATEST").write_text(version)
+
+@pytest.fixture
+def published():
+    return []
+
+def watcher(root, published, current_version="svd_a", load=None):
+    return ArtifactWatcher(str(root), load=load or (lambda path: os.path.basename(path)),
+                           publish=published.append, current_version=current_version)
+
+# Test polling LATEST
+def test_latest_version(tmp_path):
+    """LATEST should be read without whitespace, and be None when missing or empty"""
+    assert latest_version(str(tmp_path)) is None
+    (tmp_path / "LATEST").write_text("")
+    assert latest_version(str(tmp_path)) is None
+    (tmp_path / "LATEST").write_text("svd_a\n")
+    assert latest_version(str(tmp_path)) == "svd_a"
+
+def test_publishes_only_new_versions(tmp_path, published):
+    """A new version in LATEST should be loaded and published once"""
+    publish_version(tmp_path, "svd_a")
+    w = watcher(tmp_path, published)
+    assert not w.check()
+
+    publish_version(tmp_path, "svd_b")
+    assert w.check()
+    assert not w.check()
+    assert published == ["svd_b"] and w.current_version == "svd_b"
+
+def test_missing_artifact_directory_is_ignored(tmp_path, published):
+    """LATEST naming a directory that does not exist should not publish anything"""
+    (tmp_path / "LATEST").write_text("svd_missing")
+    assert not watcher(tmp_path, published).check()
+    assert published == []
+
+def test_failed_load_is_retried(tmp_path, published):
+    """A load error should keep the current version and be retried on the next poll"""
+    attempts = []
+    def load(path):
+        attempts.append(path)
+        if len(attempts) == 1:
+            raise IOError("partial artifact")
+        return os.path.basename(path)
+
+    publish_version(tmp_path, "svd_b")
+    w = watcher(tmp_path, published, load=load)
+    assert not w.check()
+    assert w.current_version == "svd_a"
+    assert w.check()
+    assert published == ["svd_b"]
+
+def test_thread_checks_on_start(tmp_path, published):
+    """The background thread should pick up a newer artifact right after starting"""
+    publish_version(tmp_path, "svd_b")
+    w = watcher(tmp_path, published)
+    w.interval = 60
+    w.start()
+    w.stop(timeout=5)
+    assert published == ["svd_b"]
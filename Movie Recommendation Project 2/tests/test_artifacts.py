@@ -0,0 +1,113 @@
+import pytest
+import numpy as np
+import pandas as pd
+import datetime
+import os
+import sys
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from Models.SVD import SVDPipeline
+from tests.conftest import random_ratings
+from Models.artifacts import latest_artifact, load_artifact, prune_artifacts, LATEST_FILE
+
+
+@pytest.fixture
+def pipeline(make_svd_pipeline):
+    """Trained pipeline with a materialized table"""
+    ratings_df = random_ratings(3, 25, 40, 400)
+    pipeline = make_svd_pipeline(ratings_df, materialize=True, movies_df=pd.DataFrame(
+        {'movie_id': ratings_df['movie_id'].unique(), 'genres': 'Drama'}))
+    pipeline.watch_time_range = (0.0, 120.0)
+    pipeline.last_trained = datetime.datetime(2025, 4, 1, 12, 0, 0)
+    pipeline.model_version = "svd_20250401_120000"
+    pipeline.data_version = "data_20250401_120000"
+    return pipeline
+
+# Test saving an artifact
+def test_save_artifact_layout(pipeline, tmp_path):
+    """Saving should create a versioned directory and point LATEST at it"""
+    path = pipeline.save_artifact(str(tmp_path))
+
+    assert path == os.path.join(str(tmp_path), "svd_20250401_120000")
+    assert latest_artifact(str(tmp_path)) == path
+    for name in ["item_factors", "user_factors", "item_bias", "user_bias", "seen_indptr", "seen_indices", "meta"]:
+        assert any(f.startswith(name) for f in os.listdir(path))
+    assert not [f for f in os.listdir(str(tmp_path)) if f.startswith('.tmp')]
+
+def test_latest_artifact_missing(tmp_path):
+    """No LATEST file means no artifact"""
+    assert latest_artifact(str(tmp_path)) is None
+
+# Test artifact retention
+def save_versions(pipeline, root, versions, keep=0):
+    """Save `versions` oldest first, with distinct metadata write times"""
+    for position, version in enumerate(versions):
+        pipeline.model_version = version
+        path = pipeline.save_artifact(root, keep)
+        os.utime(os.path.join(path, "meta.json"), (1000 + position, 1000 + position))
+
+def test_save_artifact_keeps_newest_versions(pipeline, tmp_path):
+    """Saving with keep=N should leave only the N newest artifacts next to the ID dictionaries"""
+    root = str(tmp_path)
+    os.makedirs(os.path.join(root, "ids"))
+    for version in ["svd_1", "svd_2", "svd_3"]:
+        pipeline.model_version = version
+        pipeline.save_artifact(root, keep=2)
+
+    assert sorted(os.listdir(root)) == [LATEST_FILE, "ids", "svd_2", "svd_3"]
+    assert latest_artifact(root) == os.path.join(root, "svd_3")
+
+def test_prune_never_removes_latest(pipeline, tmp_path):
+    """The artifact LATEST points at should survive pruning even when it is not among the newest"""
+    root = str(tmp_path)
+    save_versions(pipeline, root, ["svd_old", "svd_mid", "svd_new"])
+    with open(os.path.join(root, LATEST_FILE), "w") as f:
+        f.write("svd_old")
+
+    removed = prune_artifacts(root, keep=1)
+
+    assert removed == [os.path.join(root, "svd_mid")]
+    assert sorted(os.listdir(root)) == [LATEST_FILE, "svd_new", "svd_old"]
+
+def test_save_artifact_keep_zero_keeps_all(pipeline, tmp_path):
+    save_versions(pipeline, str(tmp_path), ["svd_1", "svd_2", "svd_3"])
+    assert len([name for name in os.listdir(str(tmp_path)) if name.startswith("svd_")]) == 3
+
+# Test loading an artifact
+def test_load_artifact_is_memory_mapped(pipeline, tmp_path):
+    """Factor matrices should be memory-mapped read-only"""
+    artifact = load_artifact(pipeline.save_artifact(str(tmp_path)))
+
+    assert isinstance(artifact['scorer'].item_factors, np.memmap)
+    assert isinstance(artifact['scorer'].user_factors, np.memmap)
+    assert not artifact['scorer'].item_factors.flags.writeable
+
+def test_pipeline_from_artifact_serves_same_recommendations(pipeline, tmp_path):
+    """A pipeline loaded from an artifact should serve the same results without training"""
+    path = pipeline.save_artifact(str(tmp_path))
+    user_ids = pipeline.seen_index.user_ids.tolist() + ['unknown_user']
+    expected = [pipeline.get_recommendations(user_id) for user_id in user_ids[:-1]]
+
+    with mock.patch.object(SVDPipeline, 'train_and_save_model') as train:
+        loaded = SVDPipeline(artifact_path=path)
+        train.assert_not_called()
+
+    assert loaded.model_version == pipeline.model_version
+    assert loaded.data_version == pipeline.data_version
+    assert loaded.last_trained == pipeline.last_trained
+    assert [loaded.get_recommendations(user_id) for user_id in user_ids[:-1]] == expected
+
+    # live scoring matches too
+    loaded.recommendation_table = None
+    assert [loaded.get_recommendations(user_id) for user_id in user_ids[:-1]] == expected
+
+def test_pipeline_from_artifact_decodes_training_ratings(pipeline, tmp_path):
+    """Training ratings should be decoded lazily from integer codes"""
+    loaded = SVDPipeline(artifact_path=pipeline.save_artifact(str(tmp_path)))
+
+    assert loaded.combined_ratings_df is None
+    ratings = loaded.training_ratings()
+    pd.testing.assert_frame_equal(
+        ratings.reset_index(drop=True),
+        pipeline.combined_ratings_df[['user_id', 'movie_id', 'rating']].astype({'rating': np.float32}).astype({'rating': np.float64}),
+        check_dtype=False)
@@ -175,4 +175,19 @@ def test_recommend_timeout_config(client):
         mock_get.assert_called_once()
         kwargs = mock_get.call_args[1]
         assert 'timeout' in kwargs
-        assert kwargs['timeout'] == 50
\ No newline at end of file
+        assert kwargs['timeout'] == 50
+def test_recommend_logs_through_queued_logger(client, capsys):
+    """Requests should be logged as structured records through the queued logger, not printed"""
+    mock_response = mock.Mock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {"recommendation_results": ["movie1"], "accuracy": 0.5}
+
+    with mock.patch('requests.get', return_value=mock_response), \
+            mock.patch('inference_service.backend_app.logger') as logger:
+        assert client.get('/recommend/123').status_code == 200
+
+    assert capsys.readouterr().out == ""
+    message, = logger.info.call_args[0]
+    fields = logger.info.call_args[1]["extra"]["fields"]
+    assert message == "Received recommendations"
+    assert fields["user_id"] == 123 and fields["accuracy"] == 0.5
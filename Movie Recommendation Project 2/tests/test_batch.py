@@ -0,0 +1,28 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from serving.batch import parse_batch_request
+
+
+# Test request validation
+def test_parse_batch_request():
+    """A list of integer ids should be accepted, with a default number of recommendations"""
+    assert parse_batch_request({"user_ids": [3, 1, 3]}) == ([3, 1, 3], 20)
+    assert parse_batch_request({"user_ids": [], "num_recommendations": 5}) == ([], 5)
+
+@pytest.mark.parametrize("body", [
+    None,
+    [1, 2],
+    {},
+    {"user_ids": "1,2"},
+    {"user_ids": [1, "2"]},
+    {"user_ids": [True]},
+    {"user_ids": [1], "num_recommendations": 0},
+    {"user_ids": [1], "num_recommendations": "5"},
+    {"user_ids": list(range(11))},
+])
+def test_parse_batch_request_rejects_invalid_bodies(body):
+    """Malformed bodies and batches over the limit should raise ValueError"""
+    with pytest.raises(ValueError):
+        parse_batch_request(body, max_users=10)
@@ -0,0 +1,84 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from prometheus_client import REGISTRY
+from serving.cache import RecommendationCache, _entry_size
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def movies(n, prefix="movie"):
+    return [f"{prefix}{i}" for i in range(n)]
+
+# Test hits, misses and expiry
+def test_hit_miss_and_model_version():
+    """Entries should only be returned for the model version they were computed with"""
+    cache = RecommendationCache("test_hit_miss")
+    assert cache.get(1, "svd_a") is None
+    cache.put(1, "svd_a", movies(3))
+
+    assert cache.get(1, "svd_a") == movies(3)
+    assert cache.get(1, "svd_b") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+    assert REGISTRY.get_sample_value("recommendation_cache_hits_total", {"cache": "test_hit_miss"}) == 1
+    assert REGISTRY.get_sample_value("recommendation_cache_misses_total", {"cache": "test_hit_miss"}) == 2
+
+def test_entries_expire():
+    """Entries older than the TTL should be evicted on lookup"""
+    clock = FakeClock()
+    cache = RecommendationCache("test_ttl", ttl_seconds=60, clock=clock)
+    cache.put(1, "v1", movies(3))
+    clock.now = 59
+    assert cache.get(1, "v1") == movies(3)
+    clock.now = 60
+    assert cache.get(1, "v1") is None
+    assert cache.stats()["entries"] == 0
+    assert REGISTRY.get_sample_value("recommendation_cache_evictions_total",
+                                     {"cache": "test_ttl", "reason": "expired"}) == 1
+
+# Test memory bound
+def test_least_recently_used_are_evicted_by_size():
+    """Once over max_bytes, the least recently used entries should be evicted first"""
+    entry = _entry_size((0, "v1"), movies(20))
+    cache = RecommendationCache("test_lru", max_bytes=3 * entry)
+    for user_id in range(3):
+        cache.put(user_id, "v1", movies(20))
+    cache.get(0, "v1")
+    cache.put(3, "v1", movies(20))
+
+    assert cache.stats()["bytes"] <= 3 * entry
+    assert cache.get(1, "v1") is None
+    assert all(cache.get(user_id, "v1") is not None for user_id in (0, 2, 3))
+    assert cache.stats()["evictions"] == 1
+
+def test_zero_bytes_disables_cache():
+    """With max_bytes=0 nothing should be stored"""
+    cache = RecommendationCache("test_disabled", max_bytes=0)
+    cache.put(1, "v1", movies(3))
+    assert cache.get(1, "v1") is None
+
+# Test model swap
+def test_reset_drops_entries_and_old_versions():
+    """After a reset, older model versions should neither be served nor stored"""
+    cache = RecommendationCache("test_reset")
+    cache.put(1, "v1", movies(3))
+    cache.reset("v2")
+
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0
+    cache.put(1, "v1", movies(3))  # a request that started on the old pipeline
+    cache.put(2, "v2", movies(3))
+    assert cache.get(1, "v1") is None
+    assert cache.get(2, "v2") == movies(3)
+
+def test_returned_list_is_a_copy():
+    """Callers modifying a returned list should not change the cached entry"""
+    cache = RecommendationCache("test_copy")
+    cache.put(1, "v1", movies(3))
+    cache.get(1, "v1").append("extra")
+    assert cache.get(1, "v1") == movies(3)
@@ -0,0 +1,109 @@
+import pytest
+import numpy as np
+import pandas as pd
+from unittest import mock
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from tests.conftest import random_ratings
+
+
+@pytest.fixture
+def pipeline(make_svd_pipeline):
+    """Pipeline with a trained SVD model and materialized table"""
+    ratings_df = random_ratings(2, 30, 40, 500)
+    pipeline = make_svd_pipeline(ratings_df, materialize=True, movies_df=pd.DataFrame(
+        {'movie_id': ratings_df['movie_id'].unique(), 'genres': ''}))
+    pipeline.DB = mock.MagicMock()
+    pipeline.watch_time_range = (0.0, 100.0)
+    return pipeline
+
+# Test the scorer-level fold-in
+def test_fold_in_users_fits_ratings(pipeline):
+    """A folded-in user vector should fit the user's ratings better than the trained one"""
+    scorer = pipeline.scorer
+    items = np.arange(10)
+    ratings = np.where(items % 2 == 0, 5.0, 1.0)
+
+    def squared_error(s):
+        return ((s.score('0', items) - ratings) ** 2).sum()
+
+    updated = scorer.fold_in_users([('0', items, ratings)], reg=0.02)
+
+    assert squared_error(updated) < squared_error(scorer)
+    # the original scorer is left untouched
+    assert updated.user_factors is not scorer.user_factors
+
+def test_fold_in_registers_new_user(pipeline):
+    """Unknown users should be appended and become known"""
+    scorer = pipeline.scorer
+    updated = scorer.fold_in_users([('new_user', np.array([0, 1]), np.array([5.0, 4.0]))])
+
+    assert not scorer.knows_user('new_user')
+    assert updated.knows_user('new_user')
+    assert len(updated.user_factors) == len(scorer.user_factors) + 1
+
+def test_with_items_matches_unknown_item_prediction(pipeline):
+    """New items should score like SVD.predict scores an unknown item"""
+    scorer = pipeline.scorer.with_items(np.append(pipeline.scorer.item_ids, 'brand_new_movie'))
+
+    assert scorer.score('3')[-1] == pytest.approx(pipeline.svd_model.predict('3', 'brand_new_movie').est)
+
+# Test the pipeline fold-in
+def test_fold_in_new_ratings(pipeline):
+    """New ratings should update the index, the scorer, the table and the model version"""
+    new_ratings = pd.DataFrame({
+        'user_id': ['new_user', 'new_user', '0'],
+        'movie_id': ['movie1', 'new_movie', 'movie2'],
+        'rating': [5.0, 4.0, 1.0]
+    })
+    new_movie = pd.DataFrame({'movie_id': ['new_movie'], 'genres': ['Drama']})
+
+    with mock.patch.object(pipeline, 'fetch_new_ratings', return_value=new_ratings), \
+         mock.patch.object(pipeline, 'clean_movie_data', return_value=new_movie):
+        assert pipeline.fold_in_new_ratings() == 3
+
+    index = pipeline.seen_index
+    assert index.user_code('new_user') is not None
+    assert index.item_code('new_movie') is not None
+    assert pipeline.scorer.knows_user('new_user')
+    assert pipeline.model_version == f"svd_{pipeline.last_trained.strftime('%Y%m%d_%H%M%S')}_fold1"
+    assert pipeline.last_folded_in is not None
+
+    # folded-in users are scored live and never get movies they just rated
+    assert pipeline.recommendation_table.lookup(index.user_code('0')) is None
+    recommendations = pipeline.get_recommendations('new_user')
+    assert len(recommendations) == 20
+    assert not {'movie1', 'new_movie'}.intersection(recommendations)
+
+def test_fold_in_without_new_ratings(pipeline):
+    """Nothing should change when no ratings arrived"""
+    empty = pd.DataFrame(columns=['user_id', 'movie_id', 'rating'])
+    scorer, model_version = pipeline.scorer, pipeline.model_version
+
+    with mock.patch.object(pipeline, 'fetch_new_ratings', return_value=empty):
+        assert pipeline.fold_in_new_ratings() == 0
+
+    assert pipeline.scorer is scorer
+    assert pipeline.model_version == model_version
+
+# Test folding in from the training job
+def test_training_job_publishes_folded_in_artifact(pipeline, tmp_path):
+    """The job should publish folded-in models as artifacts, for gunicorn workers to map"""
+    from SVDServer.train_svd_job import fold_in_once
+    from Models.artifacts import latest_version
+    new_ratings = pd.DataFrame({'user_id': ['new_user'], 'movie_id': ['movie1'], 'rating': [5.0]})
+    empty = pd.DataFrame(columns=['user_id', 'movie_id', 'rating'])
+    pipeline.save_artifact(str(tmp_path))
+    served = pipeline.model_version
+
+    with mock.patch.object(type(pipeline), 'fetch_new_ratings', side_effect=[new_ratings, empty]):
+        folded = fold_in_once(pipeline, str(tmp_path))
+        assert pipeline.model_version == served
+        assert latest_version(str(tmp_path)) == folded.model_version == f"{served}_fold1"
+        assert fold_in_once(folded, str(tmp_path)).model_version == folded.model_version
+
+    assert latest_version(str(tmp_path)) == f"{served}_fold1"
+    loaded = type(pipeline)(artifact_path=os.path.join(str(tmp_path), folded.model_version))
+    assert loaded.scorer.knows_user('new_user')
+    assert 'movie1' not in loaded.get_recommendations('new_user')
@@ -0,0 +1,126 @@
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from Models.ids import IdDictionary, rated_recommendations
+from Models.seen_index import SeenItemIndex
+from Models.SVD import SVDPipeline
+
+# Test interning
+def test_encode_assigns_stable_codes():
+    """Codes should follow first appearance and never change as new ids are added"""
+    ids = IdDictionary()
+    first = ids.encode(['gladiator+2000', 'up+2009', 'gladiator+2000'])
+    second = ids.encode(['heat+1995', 'up+2009'])
+
+    assert first.dtype == np.int32
+    assert first.tolist() == [0, 1, 0]
+    assert second.tolist() == [2, 1]
+    assert ids.decode([2, 0]).tolist() == ['heat+1995', 'gladiator+2000']
+    assert ids.code('up+2009') == 1
+    assert ids.code('missing') is None
+
+def test_encode_without_adding():
+    """Unknown ids should map to -1 and leave the dictionary unchanged when add is False"""
+    ids = IdDictionary(['a', 'b'])
+
+    assert ids.encode(['b', 'z'], add=False).tolist() == [1, -1]
+    assert len(ids) == 2
+    assert 'z' not in ids
+
+# Test persistence
+def test_save_and_load(tmp_path):
+    """A saved dictionary should load back with the same codes"""
+    path = str(tmp_path / 'ids' / 'items.npy')
+    ids = IdDictionary()
+    ids.encode(['movie3', 'movie1', 'movie2'])
+    ids.save(path)
+
+    loaded = IdDictionary.load(path)
+    assert loaded.ids.tolist() == ['movie3', 'movie1', 'movie2']
+    assert loaded.encode(['movie1', 'movie4']).tolist() == [1, 3]
+    assert len(IdDictionary.load(str(tmp_path / 'missing.npy'))) == 0
+
+# Test joining recommendations with ratings
+def test_rated_recommendations():
+    """Only ratings of movies recommended to the same user should be kept, in their original order"""
+    ratings = pd.DataFrame({
+        'user_id': ['1', '1', '2', '2', '3'],
+        'movie_id': ['10', '11', '10', '12', '10'],
+        'rating': [4.0, 3.0, 5.0, 2.0, 1.0],
+    })
+
+    matched = rated_recommendations(ratings, {'1': [11, 99], 2: ['10', '12'], '4': ['10']})
+
+    assert matched.index.tolist() == [1, 2, 3]
+    assert rated_recommendations(ratings, {}).empty
+
+# Test codes shared with the seen-item index
+def test_seen_index_keeps_dictionary_codes():
+    """An index built from existing dictionaries should keep their codes without modifying them"""
+    users, items = IdDictionary(['user9', 'user1']), IdDictionary(['movie2'])
+    ratings = pd.DataFrame({'user_id': ['user1', 'user5'], 'movie_id': ['movie1', 'movie2']})
+
+    index = SeenItemIndex.from_ratings(ratings, ['movie1', 'movie2'], users, items)
+
+    assert index.user_code('user1') == 1
+    assert index.user_code('user5') == 2
+    assert index.item_ids.tolist() == ['movie2', 'movie1']
+    assert index.item_ids[index.seen_items(index.user_code('user1'))].tolist() == ['movie1']
+    assert index.active_users().tolist() == [1, 2]
+    assert len(users) == 2 and len(items) == 1
+
+def test_seen_index_leaves_dictionary_only_items_out():
+    """Items only kept in the dictionaries from an earlier window should not be recommendable"""
+    items = IdDictionary(['old_movie'])
+    ratings = pd.DataFrame({'user_id': ['user1'], 'movie_id': ['movie1']})
+
+    index = SeenItemIndex.from_ratings(ratings, ['old_movie', 'movie1'], items=items)
+
+    assert index.item_ids[index.unseen_items()].tolist() == ['movie1']
+
+# Test retraining on a new window with the persisted dictionaries
+def window_ratings(prefix, seed):
+    rng = np.random.default_rng(seed)
+    rows = 300
+    return pd.DataFrame({
+        'user_id': np.char.add(f'{prefix}user', rng.integers(0, 40, rows).astype(str)),
+        'movie_id': np.char.add(f'{prefix}movie', rng.integers(0, 30, rows).astype(str)),
+        'score': rng.uniform(1, 5, rows),
+    }).drop_duplicates(['user_id', 'movie_id'], ignore_index=True)
+
+def test_retrain_on_disjoint_window(tmp_path):
+    """After retraining on a disjoint window, the users and movies of the old one should be cold"""
+    windows = iter([window_ratings('old_', 0), window_ratings('new_', 1)])
+    movies_df = pd.DataFrame({
+        'movie_id': [f'{prefix}movie{i}' for prefix in ('old_', 'new_') for i in range(30)],
+        'genres': 'Drama', 'original_language': 'en', 'adult': False,
+    })
+
+    def load_clean_data(pipeline):
+        pipeline.movies_df = movies_df.copy()
+        pipeline.ratings_df = next(windows)
+        pipeline.watch_df = pd.DataFrame(columns=['user_id', 'movie_id', 'rating'])
+
+    with mock.patch('Models.SVD.DB'), mock.patch('Models.SVD.ID_DIR', str(tmp_path)), \
+            mock.patch.object(SVDPipeline, 'load_clean_data', load_clean_data):
+        SVDPipeline()
+        pipeline = SVDPipeline()
+
+    index = pipeline.seen_index
+    old_users = [user_id for user_id in index.user_ids if user_id.startswith('old_')]
+    assert old_users and index.item_code('old_movie0') is not None
+
+    # old users get the popularity ranking, on the single and batch paths
+    popular = pipeline.popular_items(20)
+    assert all(pipeline.get_recommendations(user_id) == popular for user_id in old_users)
+    assert pipeline.get_recommendations_batch(old_users) == [popular] * len(old_users)
+
+    # and old movies are never recommended to the new users
+    new_users = [user_id for user_id in index.user_ids if user_id.startswith('new_')]
+    recommendations = [pipeline.get_recommendations(user_id) for user_id in new_users]
+    recommendations += pipeline.get_recommendations_batch(new_users) + [popular]
+    assert not any(movie_id.startswith('old_') for movie_ids in recommendations for movie_id in movie_ids)
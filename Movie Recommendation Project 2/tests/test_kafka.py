@@ -142,6 +142,19 @@ def test_process_movie_info_api_error(kafka_consumer_app):
         # DB should not be updated on API error
         kafka_consumer_app.DB.movie_info.update_one.assert_not_called()
 
+# Test process_movie_info stores genres natively
+def test_process_movie_info_stores_genre_array(kafka_consumer_app):
+    """Genres should be stored as an array of names, not a stringified list"""
+    with mock.patch('requests.get') as mock_get:
+        mock_get.return_value = mock.Mock(status_code=200)
+        mock_get.return_value.json.return_value = dict(
+            MOCK_MOVIE_RESPONSE, genres=[{"id": 28, "name": "Action"}, {"id": 18, "name": "Drama"}])
+
+        kafka_consumer_app.process_movie_info("movie456")
+
+    stored = kafka_consumer_app.DB.movie_info.update_one.call_args[0][1]["$set"]
+    assert stored["genres"] == ["Action", "Drama"]
+
 # Test process_user_rate with valid format
 
     # # Check inserted data
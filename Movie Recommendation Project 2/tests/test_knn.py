@@ -0,0 +1,214 @@
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+import datetime
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from surprise import KNNBasic, Dataset, Reader
+from Models.KNN import KNNPipeline
+from Models.knn_engine import SparseKNN, KNNScorer
+from Models.seen_index import SeenItemIndex
+from Models.timing import StageTimings
+from Models.artifacts import latest_artifact
+
+
+@pytest.fixture
+def ratings():
+    """Random ratings for 30 users over 25 movies"""
+    rng = np.random.default_rng(7)
+    rows = 300
+    return pd.DataFrame({
+        'user_id': np.char.add('user', rng.integers(0, 30, rows).astype(str)),
+        'movie_id': np.char.add('movie', rng.integers(0, 25, rows).astype(str)),
+        'rating': rng.integers(1, 6, rows).astype(float)
+    }).drop_duplicates(['user_id', 'movie_id'], ignore_index=True)
+
+@pytest.fixture
+def pipeline(ratings):
+    """KNN pipeline trained on all ratings, without a database"""
+    pipeline = KNNPipeline.__new__(KNNPipeline)
+    pipeline.DB = mock.MagicMock()
+    pipeline.model = KNNBasic(verbose=False)
+    pipeline.model.fit(Dataset.load_from_df(ratings, Reader(rating_scale=(1, 5))).build_full_trainset())
+    pipeline.seen_index = SeenItemIndex.from_ratings(ratings)
+    pipeline.scorer = KNNScorer.from_model(pipeline.model, pipeline.seen_index.item_ids)
+    return pipeline
+
+def expected_recommendations(pipeline, user_id, n):
+    """Reference: predict every unseen movie one by one with surprise and sort"""
+    index = pipeline.seen_index
+    unseen = index.item_ids[index.unseen_items(index.user_code(user_id))]
+    predictions = [pipeline.model.predict(user_id, m) for m in unseen]
+    return [p.iid for p in sorted(predictions, key=lambda p: p.est, reverse=True)[:n]]
+
+# Test serving from the in-memory index
+def test_recommendations_do_not_query_mongo(pipeline, ratings):
+    """Recommendations should exclude seen movies without touching the database"""
+    recommendations = pipeline.get_recommendations('user3', 10)
+
+    pipeline.DB.movie_db.__getitem__.assert_not_called()
+    assert len(recommendations) == 10
+    assert not set(recommendations) & set(ratings[ratings['user_id'] == 'user3']['movie_id'])
+
+def test_recommendations_match_full_scan(pipeline):
+    """Batched scoring should return exactly what predicting every unseen movie would"""
+    for user_id in ['user0', 'user11', 'user29', 'new_user']:
+        assert pipeline.get_recommendations(user_id, 5) == expected_recommendations(pipeline, user_id, 5)
+
+# Test the batched KNNBasic scorer
+@pytest.mark.parametrize("params", [{}, {'k': 3}, {'k': 5, 'min_k': 3}, {'k': 4, 'sim_options': {'name': 'pearson'}}])
+def test_knn_scorer_matches_predict(ratings, params):
+    """Estimates should equal KNNBasic.predict for known, unknown and unrated cases"""
+    model = KNNBasic(verbose=False, **params)
+    model.fit(Dataset.load_from_df(ratings, Reader(rating_scale=(1, 5))).build_full_trainset())
+    item_ids = np.append(ratings['movie_id'].unique(), 'movie_unrated')
+    scorer = KNNScorer.from_model(model, item_ids)
+
+    for user_id in ['user0', 'user8', 'user21', 'new_user']:
+        expected = [model.predict(user_id, movie_id).est for movie_id in item_ids]
+        np.testing.assert_array_equal(scorer.score(user_id), expected)
+    subset = np.array([3, 0, len(item_ids) - 1])
+    np.testing.assert_array_equal(scorer.score('user8', subset), scorer.score('user8')[subset])
+
+def test_knn_scorer_scores_many_users_at_once(pipeline):
+    """Each row of score_many should equal scoring that user alone"""
+    user_ids = ['user0', 'new_user', 'user17', 'user0']
+    subset = np.array([5, 1, 9])
+    np.testing.assert_array_equal(pipeline.scorer.score_many(user_ids),
+                                  [pipeline.scorer.score(user_id) for user_id in user_ids])
+    np.testing.assert_array_equal(pipeline.scorer.score_many(user_ids, subset),
+                                  [pipeline.scorer.score(user_id, subset) for user_id in user_ids])
+
+@pytest.mark.parametrize("max_entries", [5_000_000, 1])
+def test_batch_matches_single_requests(pipeline, max_entries):
+    """Batches on the surprise engine should be scored together and match single requests"""
+    user_ids = ['user3', 'new_user', 'user0', 'user29', 'user3']
+    with mock.patch('Models.KNN.BATCH_MAX_ENTRIES', max_entries), \
+            mock.patch.object(pipeline.scorer, 'score_many', wraps=pipeline.scorer.score_many) as score_many:
+        batch = pipeline.get_recommendations_batch(user_ids, 5, chunk_size=3)
+
+    assert batch == [pipeline.get_recommendations(user_id, 5) for user_id in user_ids]
+    # known users in chunks of 3, or one at a time when a chunk would gather too many ratings; then new_user alone
+    chunks = [len(call.args[0]) for call in score_many.call_args_list]
+    assert chunks == ([3, 1, 1] if max_entries > 1 else [1, 1, 1, 1, 1])
+
+def test_unknown_user_gets_any_movie(pipeline, ratings):
+    """Unknown users have seen nothing, so every movie is a candidate"""
+    assert len(pipeline.get_recommendations('new_user', 100)) == ratings['movie_id'].nunique()
+
+# Test artifacts
+def test_artifact_serves_same_recommendations_without_mongo(pipeline, tmp_path):
+    """A pipeline loaded from an artifact should serve the same lists without a MongoClient"""
+    pipeline.model_version, pipeline.data_version = "knn_20250401_120000", "data_20250401_120000"
+    pipeline.last_trained, pipeline.training_seconds = datetime.datetime(2025, 4, 1, 12), 1.0
+    user_ids = ['user0', 'user11', 'user29', 'new_user']
+    path = pipeline.save_artifact(str(tmp_path))
+
+    with mock.patch('Models.KNN.DB') as db, mock.patch.object(KNNPipeline, 'train_model') as train:
+        loaded = KNNPipeline(artifact_path=path)
+        db.assert_not_called()
+        train.assert_not_called()
+
+    assert latest_artifact(str(tmp_path)) == path
+    assert (loaded.model_version, loaded.data_version, loaded.last_trained) == \
+        (pipeline.model_version, pipeline.data_version, pipeline.last_trained)
+    assert isinstance(loaded.scorer.similarities, np.memmap)
+    assert loaded.validate()
+    assert [loaded.get_recommendations(u, 5) for u in user_ids] == [pipeline.get_recommendations(u, 5) for u in user_ids]
+    assert loaded.get_recommendations_batch(user_ids, 5) == pipeline.get_recommendations_batch(user_ids, 5)
+
+def test_sparse_artifact_serves_same_recommendations(ratings, tmp_path):
+    """The sparse engine's neighbour lists and rating matrix should round-trip through an artifact"""
+    pipeline = KNNPipeline.__new__(KNNPipeline)
+    pipeline.seen_index, pipeline.model = fit_sparse(ratings, k=10, n_jobs=1)
+    pipeline.scorer, pipeline.model_version, pipeline.data_version = None, "knn_sparse", "data_sparse"
+    pipeline.last_trained, pipeline.training_seconds = None, None
+    user_ids = ['user3', 'new_user', 'user0', 'user29']
+
+    loaded = KNNPipeline(artifact_path=pipeline.save_artifact(str(tmp_path)))
+
+    assert isinstance(loaded.model, SparseKNN) and isinstance(loaded.model.neighbors, np.memmap)
+    assert loaded.validate()
+    assert loaded.get_recommendations_batch(user_ids, 5) == pipeline.get_recommendations_batch(user_ids, 5)
+
+# Test the sparse top-k engine
+def fit_sparse(ratings, **params):
+    index = SeenItemIndex.from_ratings(ratings)
+    engine = SparseKNN(**params).fit(index.users.encode(ratings['user_id']), index.items.encode(ratings['movie_id']),
+                                     ratings['rating'], index.n_users, index.n_items)
+    return index, engine
+
+@pytest.mark.parametrize("sim", ["msd", "cosine"])
+def test_sparse_similarities_match_surprise(ratings, sim):
+    """Kept neighbours should carry surprise's similarity values"""
+    model = KNNBasic(sim_options={'name': sim}, verbose=False)
+    trainset = Dataset.load_from_df(ratings, Reader(rating_scale=(1, 5))).build_full_trainset()
+    model.fit(trainset)
+    index, engine = fit_sparse(ratings, sim=sim, k=5, block_size=7, n_jobs=1)
+
+    assert engine.neighbors.shape == (index.n_users, 5)
+    for code in range(index.n_users):
+        inner = trainset.to_inner_uid(index.user_ids[code])
+        for neighbor, similarity in zip(engine.neighbors[code], engine.similarities[code]):
+            if neighbor >= 0:
+                other = trainset.to_inner_uid(index.user_ids[neighbor])
+                assert similarity == pytest.approx(model.sim[inner, other], rel=1e-6)
+        # the kept neighbours are the most similar ones
+        row = np.delete(model.sim[inner], inner)
+        assert engine.similarities[code].min() >= np.sort(row)[-5] - 1e-6
+
+def test_sparse_estimates_match_surprise_with_all_neighbours(ratings):
+    """With k covering every user, unseen-item estimates should equal surprise's"""
+    model = KNNBasic(k=1000, verbose=False)
+    model.fit(Dataset.load_from_df(ratings, Reader(rating_scale=(1, 5))).build_full_trainset())
+    index, engine = fit_sparse(ratings, k=1000, block_size=8, n_jobs=2)
+
+    for user_id in ['user0', 'user5', 'user17']:
+        unseen = index.unseen_items(index.user_code(user_id))
+        expected = [model.predict(user_id, movie_id).est for movie_id in index.item_ids[unseen]]
+        np.testing.assert_allclose(engine.score(index.user_code(user_id))[unseen], expected, rtol=1e-6)
+    assert (engine.score(None) == engine.global_mean).all()
+
+def test_sparse_blocks_and_processes_agree(ratings):
+    """Block size and the number of processes should not change the neighbours"""
+    _, serial = fit_sparse(ratings, k=6, block_size=1000, n_jobs=1)
+    _, parallel = fit_sparse(ratings, k=6, block_size=4, n_jobs=3)
+
+    np.testing.assert_array_equal(serial.neighbors, parallel.neighbors)
+    np.testing.assert_array_equal(serial.similarities, parallel.similarities)
+
+def test_pipeline_serves_sparse_engine(ratings):
+    """The pipeline should rank unseen movies by the sparse engine's scores"""
+    pipeline = KNNPipeline.__new__(KNNPipeline)
+    pipeline.seen_index, pipeline.model = fit_sparse(ratings, k=10, n_jobs=1)
+
+    recommendations = pipeline.get_recommendations('user3', 5)
+    scores = pipeline.model.score(pipeline.seen_index.user_code('user3'))
+    unseen = pipeline.seen_index.unseen_items(pipeline.seen_index.user_code('user3'))
+    assert [pipeline.seen_index.item_code(m) for m in recommendations] == \
+        unseen[np.argsort(-scores[unseen], kind='stable')[:5]].tolist()
+    assert pipeline.validate()
+
+def test_sparse_batch_matches_single_requests(ratings):
+    """Batched sparse scoring should give each user the same list as a single request"""
+    pipeline = KNNPipeline.__new__(KNNPipeline)
+    pipeline.seen_index, pipeline.model = fit_sparse(ratings, k=10, n_jobs=1)
+    user_ids = ['user3', 'new_user', 'user0', 'user29', 'user3']
+
+    codes = [pipeline.seen_index.user_code(user_id) for user_id in user_ids]
+    np.testing.assert_allclose(pipeline.model.score_many(codes[:1] + codes[2:]),
+                               [pipeline.model.score(code) for code in codes[:1] + codes[2:]])
+    assert pipeline.get_recommendations_batch(user_ids, 5, chunk_size=2) == \
+        [pipeline.get_recommendations(user_id, 5) for user_id in user_ids]
+
+def test_knn_stage_timings_and_stats(pipeline):
+    """KNN recommendations should report their stages and the model its size"""
+    timings = StageTimings()
+    pipeline.training_seconds = 1.0
+    pipeline.get_recommendations('user3', 5, timings=timings)
+    assert set(timings) == {"seen_lookup", "scoring", "top_k"}
+    stats = pipeline.get_model_stats()
+    assert stats["model_bytes"] >= pipeline.model.sim.nbytes
+    assert stats["n_items"] == pipeline.seen_index.n_items
@@ -0,0 +1,87 @@
+import pytest
+import threading
+import numpy as np
+import pandas as pd
+import sys
+import os
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from surprise import KNNBasic, Dataset, Reader
+from Models.KNN import KNNPipeline
+from Models.knn_engine import KNNScorer
+from Models.seen_index import SeenItemIndex
+from serving import logs
+
+from model_training.KNN_Server import KNN_model_app
+from model_training.KNN_Server.KNN_model_app import app as flask_app
+
+
+@pytest.fixture
+def client():
+    """Test client whose provenance stays away from MongoDB"""
+    flask_app.config.update({"TESTING": True, "DEBUG": False})
+    with mock.patch('model_training.KNN_Server.KNN_model_app.knn_pipeline', None), \
+            mock.patch('model_training.KNN_Server.KNN_model_app.provenance_writer', mock.Mock()):
+        yield flask_app.test_client()
+
+@pytest.fixture
+def artifact_dir(tmp_path):
+    """Artifact directory with one trained KNN model, LATEST pointing at it"""
+    rng = np.random.default_rng(3)
+    ratings = pd.DataFrame({
+        'user_id': rng.integers(0, 20, 200).astype(str),
+        'movie_id': np.char.add('movie', rng.integers(0, 15, 200).astype(str)),
+        'rating': rng.integers(1, 6, 200).astype(float)
+    }).drop_duplicates(['user_id', 'movie_id'], ignore_index=True)
+    pipeline = KNNPipeline.__new__(KNNPipeline)
+    pipeline.model = KNNBasic(verbose=False)
+    pipeline.model.fit(Dataset.load_from_df(ratings, Reader(rating_scale=(1, 5))).build_full_trainset())
+    pipeline.seen_index = SeenItemIndex.from_ratings(ratings)
+    pipeline.scorer = KNNScorer.from_model(pipeline.model, pipeline.seen_index.item_ids)
+    pipeline.model_version, pipeline.data_version = "knn_20250401_120000", "data_20250401_120000"
+    pipeline.last_trained, pipeline.training_seconds = None, 1.0
+    pipeline.save_artifact(str(tmp_path))
+    with mock.patch('model_training.KNN_Server.KNN_model_app.ARTIFACT_DIR', str(tmp_path)):
+        yield str(tmp_path)
+
+# Test what the gunicorn master does before forking
+def test_import_opens_no_client_and_starts_no_threads():
+    """Importing the app should leave no MongoClient, writer thread or log listener to fork"""
+    assert KNN_model_app.knn_pipeline is None
+    assert KNN_model_app.provenance_writer._thread is None
+    assert KNN_model_app.provenance_writer.collection is None
+    assert not logs._handlers["knn_server"].started
+
+def test_load_latest_artifact_before_fork(client, artifact_dir):
+    """The master should publish the LATEST artifact without MongoDB, training or new threads"""
+    threads = threading.active_count()
+    with mock.patch('Models.KNN.DB') as db:
+        pipeline = KNN_model_app.load_latest_artifact()
+        db.assert_not_called()
+
+    assert threading.active_count() == threads
+    assert KNN_model_app.knn_pipeline is pipeline
+    assert client.get('/ready').json["model_version"] == "knn_20250401_120000"
+    response = client.get('/recommend/3')
+    assert response.status_code == 200
+    assert response.json == pipeline.get_recommendations('3')
+
+def test_load_latest_artifact_without_artifact(client, tmp_path):
+    """Without an artifact the master publishes nothing and leaves loading to the workers"""
+    with mock.patch('model_training.KNN_Server.KNN_model_app.ARTIFACT_DIR', str(tmp_path)):
+        assert KNN_model_app.load_latest_artifact() is None
+    assert KNN_model_app.knn_pipeline is None
+    assert client.get('/ready').status_code == 503
+
+def test_start_worker_watches_latest_artifact(client, artifact_dir):
+    """A forked worker should start its background threads and follow LATEST from the master's version"""
+    KNN_model_app.load_latest_artifact()
+    with mock.patch('model_training.KNN_Server.KNN_model_app.logs.after_fork') as after_fork, \
+            mock.patch('model_training.KNN_Server.KNN_model_app.ArtifactWatcher') as watcher:
+        KNN_model_app.start_worker()
+
+    after_fork.assert_called_once_with()
+    KNN_model_app.provenance_writer.after_fork.assert_called_once_with()
+    assert watcher.call_args.args == (artifact_dir,)
+    assert watcher.call_args.kwargs["current_version"] == "knn_20250401_120000"
+    watcher.return_value.start.assert_called_once_with()
@@ -0,0 +1,85 @@
+import pytest
+import numpy as np
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from Models.loader import load_columns
+
+
+class FakeCursor:
+    """Cursor over a list of documents that applies the projection like MongoDB"""
+    def __init__(self, docs, projection):
+        self.docs = docs
+        self.projection = projection
+
+    def limit(self, n):
+        return FakeCursor(self.docs[:n], self.projection)
+
+    def __iter__(self):
+        for doc in self.docs:
+            if self.projection is None:
+                yield dict(doc)
+            else:
+                yield {k: v for k, v in doc.items() if self.projection.get(k, 0)}
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.find_args = None
+
+    def find(self, query, projection=None, batch_size=None):
+        self.find_args = (query, projection, batch_size)
+        return FakeCursor(self.docs, projection)
+
+
+@pytest.fixture
+def collection():
+    """Rating documents with an unused field and one document missing its score"""
+    docs = [{'_id': i, 'user_id': str(i % 7), 'movie_id': f'movie{i}', 'score': float(i % 5), 'extra': 'x' * 50}
+            for i in range(25)]
+    del docs[3]['score']
+    return FakeCollection(docs)
+
+# Test projected, typed loading
+def test_load_columns_projects_and_types(collection):
+    """Only the requested fields should be fetched, with typed columns and NaN for missing values"""
+    df, stats = load_columns(collection, ['user_id', 'movie_id', 'score'], {'x': 1},
+                             dtypes={'score': np.float64}, batch_size=4)
+
+    query, projection, batch_size = collection.find_args
+    assert query == {'x': 1}
+    assert projection == {'user_id': 1, 'movie_id': 1, 'score': 1, '_id': 0}
+    assert batch_size == 4
+
+    assert list(df.columns) == ['user_id', 'movie_id', 'score']
+    assert df['score'].dtype == np.float64
+    assert len(df) == 25 and stats['rows'] == 25
+    assert np.isnan(df['score'][3])
+    assert df['movie_id'].tolist() == [f'movie{i}' for i in range(25)]
+    assert stats['rows_per_sec'] > 0
+
+def test_load_columns_limit_and_memory(collection):
+    """The limit should be applied to the cursor and peak memory reported when asked for"""
+    df, stats = load_columns(collection, ['movie_id'], limit=10, batch_size=3, measure_memory=True)
+
+    assert len(df) == 10
+    assert stats['peak_bytes'] > 0
+
+def test_load_columns_discovers_fields():
+    """Without a projection, columns appearing later should be backfilled for earlier rows"""
+    collection = FakeCollection([{'a': 1}, {'a': 2}, {'a': 3, 'b': [1, 2]}, {'b': [3, 4]}])
+
+    df, stats = load_columns(collection, batch_size=2)
+
+    assert list(df.columns) == ['a', 'b']
+    assert df['a'].tolist() == [1, 2, 3, None]
+    assert df['b'].tolist() == [None, None, [1, 2], [3, 4]]
+
+def test_load_columns_empty():
+    """An empty result should still have the requested columns"""
+    df, stats = load_columns(FakeCollection([]), ['user_id', 'score'], dtypes={'score': np.float64})
+
+    assert df.empty
+    assert list(df.columns) == ['user_id', 'score']
+    assert stats['rows'] == 0
@@ -0,0 +1,121 @@
+import pytest
+import sys
+import os
+import io
+import json
+import logging
+import queue
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from serving import logs
+from serving.logs import (SamplingFilter, JsonFormatter, TextFormatter, NonBlockingQueueHandler,
+                          parse_sample_rates, configure_logging)
+
+
+def make_record(level=logging.INFO, message="Generated recommendations", fields=None):
+    record = logging.LogRecord("test", level, __file__, 1, message, None, None)
+    if fields is not None:
+        record.fields = fields
+    return record
+
+def flush(logger):
+    """Wait until the listener thread has written everything queued so far"""
+    listener = logs._handlers[logger.name].listener
+    listener.stop()
+    listener.start()
+
+# Test sample rate parsing
+def test_parse_sample_rates_defaults_sample_info_only():
+    """Without LOG_SAMPLE_RATES 1% of INFO records and every warning and error should be kept"""
+    assert parse_sample_rates(None) == logs.DEFAULT_SAMPLE_RATES
+    rates = parse_sample_rates("")
+    assert rates["INFO"] == 0.01
+    assert rates["WARNING"] == rates["ERROR"] == rates["CRITICAL"] == 1.0
+
+def test_parse_sample_rates_overrides():
+    """Configured levels should override the defaults, case-insensitively"""
+    rates = parse_sample_rates("info=0.01, DEBUG=0")
+    assert rates["INFO"] == 0.01
+    assert rates["DEBUG"] == 0.0
+    assert rates["ERROR"] == 1.0
+
+def test_parse_sample_rates_rejects_bad_rate():
+    with pytest.raises(ValueError):
+        parse_sample_rates("INFO=often")
+
+# Test sampling
+def test_sampling_filter_keeps_fraction():
+    """A record should be kept when the random draw falls below its level's rate"""
+    draws = iter([0.005, 0.5])
+    sampler = SamplingFilter({"INFO": 0.01}, rng=lambda: next(draws))
+    assert sampler.filter(make_record())
+    assert not sampler.filter(make_record())
+
+def test_sampling_filter_always_keeps_unsampled_levels():
+    """Errors and levels without a rate should never be dropped or even draw a random number"""
+    sampler = SamplingFilter({"INFO": 0.0}, rng=lambda: pytest.fail("no draw expected"))
+    assert not sampler.filter(make_record(logging.INFO))
+    assert sampler.filter(make_record(logging.ERROR))
+
+# Test formatting
+def test_json_formatter_includes_fields():
+    """Structured fields should become top-level keys of the JSON line"""
+    entry = json.loads(JsonFormatter().format(make_record(fields={"user_id": 42, "model_version": "v1"})))
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "test"
+    assert entry["message"] == "Generated recommendations"
+    assert entry["user_id"] == 42
+    assert entry["model_version"] == "v1"
+
+def test_json_formatter_includes_exception():
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        record = logging.LogRecord("test", logging.ERROR, __file__, 1, "failed", None, sys.exc_info())
+    entry = json.loads(JsonFormatter().format(record))
+    assert "RuntimeError: boom" in entry["exception"]
+
+def test_text_formatter_appends_fields():
+    line = TextFormatter().format(make_record(fields={"user_id": 42}))
+    assert " - INFO - test - Generated recommendations user_id=42" in line
+
+# Test the queue
+def test_queue_handler_drops_when_full():
+    """A full queue should drop and count records instead of blocking the request"""
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(make_record())
+    handler.handle(make_record())
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
+
+def test_configure_logging_writes_sampled_json():
+    """Records should go through the queue to the stream, minus the sampled-out ones"""
+    stream = io.StringIO()
+    logger = configure_logging("test_logs_json", env={"LOG_SAMPLE_RATES": "INFO=0"}, stream=stream)
+    logger.info("dropped", extra={"fields": {"user_id": 1}})
+    logger.warning("kept", extra={"fields": {"user_id": 2}})
+    flush(logger)
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(line["message"], line["user_id"]) for line in lines] == [("kept", 2)]
+    assert configure_logging("test_logs_json") is logger
+
+def test_configure_logging_level_and_text_format():
+    stream = io.StringIO()
+    logger = configure_logging("test_logs_text", env={"LOG_LEVEL": "warning", "LOG_FORMAT": "text"}, stream=stream)
+    logger.info("below level")
+    logger.warning("kept")
+    flush(logger)
+    assert stream.getvalue().rstrip().endswith(" - WARNING - test_logs_text - kept")
+    assert "below level" not in stream.getvalue()
+
+def test_configure_logging_can_defer_the_listener():
+    """With start=False no thread runs until start(); the queued records are written then"""
+    stream = io.StringIO()
+    logger = configure_logging("test_logs_deferred", env={"LOG_FORMAT": "text"}, stream=stream, start=False)
+    logger.warning("queued")
+    handler = logs._handlers["test_logs_deferred"]
+    assert not handler.started and handler.listener._thread is None
+
+    logs.start()
+    flush(logger)
+    assert handler.started
+    assert stream.getvalue().rstrip().endswith(" - WARNING - test_logs_deferred - queued")
@@ -0,0 +1,101 @@
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from Models.scoring import top_k_rows
+from Models.materialize import materialize_recommendations
+from tests.conftest import random_ratings
+from Models.timing import StageTimings
+from Models.ann import build_candidate_index
+
+
+@pytest.fixture
+def pipeline(make_svd_pipeline):
+    """Pipeline with a small trained SVD model; user 0 is unknown to it and 5 movies have no metadata"""
+    ratings_df = random_ratings(1, 40, 60, 600)
+    return make_svd_pipeline(ratings_df,
+                             movies_df=pd.DataFrame({'movie_id': ratings_df['movie_id'].unique()[:-5]}),
+                             train_df=ratings_df[ratings_df['user_id'] != '0'])
+
+# Test row-wise top-k
+def test_top_k_rows_excludes_inf():
+    """Excluded entries should never be selected and rows are padded with -1"""
+    scores = np.array([[1.0, 3.0, 2.0, -np.inf],
+                       [-np.inf, -np.inf, 4.0, -np.inf]])
+
+    best, counts = top_k_rows(scores, 3)
+
+    assert best.tolist() == [[1, 2, 0], [2, -1, -1]]
+    assert counts.tolist() == [3, 1]
+
+def test_top_k_rows_ties_keep_position_order():
+    """Scores tied at the cut should be taken in position order, like top_k"""
+    scores = np.array([[1.0, 2.0, 2.0, 2.0, 0.0],
+                       [3.0, 3.0, 3.0, 3.0, 3.0]])
+
+    best, counts = top_k_rows(scores, 2)
+
+    assert best.tolist() == [[1, 2], [0, 1]]
+    assert counts.tolist() == [2, 2]
+
+# Test the materialized table against live scoring
+def test_table_matches_live_scoring(pipeline):
+    """Every user's materialized list should equal the live-scored recommendations"""
+    live = [pipeline.get_recommendations(user_id, 20) for user_id in pipeline.seen_index.user_ids]
+
+    pipeline.recommendation_table = materialize_recommendations(
+        pipeline.scorer, pipeline.seen_index, 20, chunk_size=7, n_jobs=3)
+    materialized = [pipeline.get_recommendations(user_id, 20) for user_id in pipeline.seen_index.user_ids]
+
+    assert materialized == live
+
+def test_table_lookup_shape(pipeline):
+    """The table should hold one padded row of int32 item codes per user"""
+    table = materialize_recommendations(pipeline.scorer, pipeline.seen_index, 20)
+
+    assert table.item_codes.shape == (pipeline.seen_index.n_users, 20)
+    assert table.item_codes.dtype == np.int32
+    assert table.width == 20
+    assert len(table.lookup(0)) == table.counts[0]
+
+# Test batch recommendations
+def test_batch_matches_single_requests(pipeline):
+    """Batch results should equal one get_recommendations call per user, in request order"""
+    user_ids = [5, 0, 'unknown', 17, 5, None, 39]
+
+    expected = [pipeline.get_recommendations(user_id, 10) for user_id in user_ids]
+    assert pipeline.get_recommendations_batch(user_ids, 10, chunk_size=2) == expected
+
+    pipeline.recommendation_table = materialize_recommendations(pipeline.scorer, pipeline.seen_index, 20)
+    assert pipeline.get_recommendations_batch(user_ids, 10) == expected
+
+# Test stage timings and model stats
+def test_recommendation_stage_timings(pipeline):
+    """Live scoring should report its stages; the materialized table its lookup"""
+    timings = StageTimings()
+    pipeline.get_recommendations(5, 10, timings=timings)
+    assert {"seen_lookup", "scoring", "top_k"} <= set(timings)
+    assert all(seconds >= 0 for seconds in timings.values())
+
+    pipeline.recommendation_table = materialize_recommendations(pipeline.scorer, pipeline.seen_index, 20)
+    timings = StageTimings()
+    pipeline.get_recommendations(5, 10, timings=timings)
+    assert "materialized_lookup" in timings and "scoring" not in timings
+
+def test_exact_index_skips_candidate_stage(pipeline):
+    """With the exact index every movie is scored without building a query vector or candidate list"""
+    pipeline.scorer.query_vector = lambda user_id: pytest.fail("no query vector expected")
+    pipeline.candidate_index = build_candidate_index(pipeline.scorer, "exact")
+    timings = StageTimings()
+    pipeline.get_recommendations(5, 10, timings=timings)
+    assert "candidates" not in timings and "scoring" in timings
+
+def test_model_stats(pipeline):
+    """Model stats should count the serving arrays and movies"""
+    pipeline.training_seconds = 2.0
+    stats = pipeline.get_model_stats()
+    assert stats["n_items"] == pipeline.seen_index.n_items
+    assert stats["model_bytes"] >= pipeline.scorer.item_factors.nbytes + pipeline.scorer.user_factors.nbytes
+    assert stats["training_seconds"] == 2.0
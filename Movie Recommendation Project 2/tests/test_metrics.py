@@ -0,0 +1,106 @@
+import pytest
+import sys
+import os
+import subprocess
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from prometheus_client import REGISTRY
+from Models.timing import StageTimings
+from serving.metrics import observe_stages, record_model
+
+MODEL_TRAINING_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training"))
+
+
+def stage_count(model_version, stage):
+    return REGISTRY.get_sample_value("recommend_stage_seconds_count", {
+        "pipeline_type": "TEST", "model_version": model_version, "stage": stage})
+
+def fake_pipeline(model_version, training_seconds=3.0):
+    pipeline = mock.Mock(model_version=model_version)
+    pipeline.get_model_stats.return_value = {"model_bytes": 100, "n_items": 7, "training_seconds": training_seconds}
+    return pipeline
+
+# Test stage timings
+def test_stage_timings_accumulate():
+    """Entering the same stage twice should add up its time"""
+    timings = StageTimings()
+    with timings.stage("scoring"):
+        pass
+    first = timings["scoring"]
+    with timings.stage("scoring"):
+        pass
+    assert timings["scoring"] >= first >= 0
+    assert list(timings) == ["scoring"]
+
+def test_stage_recorded_when_block_raises():
+    """A stage that raises should still be timed"""
+    timings = StageTimings()
+    with pytest.raises(ValueError):
+        with timings.stage("provenance"):
+            raise ValueError("queue full")
+    assert "provenance" in timings
+
+# Test exported series
+def test_observe_stages():
+    """Each stage should be observed once, labelled by pipeline type and model version"""
+    observe_stages("TEST", "v_observe", {"scoring": 0.002, "top_k": 0.0001})
+    assert stage_count("v_observe", "scoring") == 1
+    assert stage_count("v_observe", "top_k") == 1
+
+def test_replaced_model_series_are_removed():
+    """Publishing a new model should drop the previous version's gauges and histograms"""
+    old = fake_pipeline("v_old")
+    record_model("TEST", old)
+    observe_stages("TEST", "v_old", {"scoring": 0.001})
+    assert REGISTRY.get_sample_value("model_items", {"pipeline_type": "TEST", "model_version": "v_old"}) == 7
+
+    record_model("TEST", fake_pipeline("v_new", training_seconds=None), previous=old)
+    assert REGISTRY.get_sample_value("model_items", {"pipeline_type": "TEST", "model_version": "v_old"}) is None
+    assert stage_count("v_old", "scoring") is None
+    assert REGISTRY.get_sample_value("model_size_bytes", {"pipeline_type": "TEST", "model_version": "v_new"}) == 100
+    assert REGISTRY.get_sample_value("model_training_seconds", {"pipeline_type": "TEST", "model_version": "v_new"}) is None
+
+# Test multiprocess mode
+def run_process(metrics_dir, script):
+    """Run `script` in a fresh interpreter with metrics in `metrics_dir`, like a gunicorn worker"""
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(metrics_dir))
+    return subprocess.run([sys.executable, "-c", script], cwd=MODEL_TRAINING_DIR, env=env,
+                          capture_output=True, text=True, check=True).stdout
+
+def test_multiprocess_metrics_are_combined(tmp_path):
+    """/metrics should report every worker: counters added up, the shared model's gauges not"""
+    worker = """
+import os
+from unittest import mock
+from serving.cache import RecommendationCache
+from serving.metrics import observe_stages, record_model
+pipeline = mock.Mock(model_version="v1")
+pipeline.get_model_stats.return_value = {"model_bytes": 100, "n_items": 7, "training_seconds": 3.0}
+record_model("TEST", pipeline)
+observe_stages("TEST", "v1", {"scoring": 0.001})
+cache = RecommendationCache("test", max_bytes=2**20, ttl_seconds=60)
+cache.reset("v1")
+cache.put(1, "v1", ["movie1"])
+print(os.getpid())
+"""
+    pids = [int(run_process(tmp_path, worker)) for _ in range(2)]
+    render = """
+import sys
+from prometheus_client.parser import text_string_to_metric_families
+from prometheus_client import multiprocess
+from serving.metrics import render_metrics
+for pid in sys.argv[1:]:
+    multiprocess.mark_process_dead(int(pid))
+for family in text_string_to_metric_families(render_metrics().decode()):
+    for sample in family.samples:
+        print(sample.name, sample.labels.get("model_version", sample.labels.get("cache")), sample.value)
+"""
+    samples = set(run_process(tmp_path, render).splitlines())
+    assert "recommend_stage_seconds_count v1 2.0" in samples
+    assert "model_items v1 7.0" in samples
+    assert "recommendation_cache_entries test 2.0" in samples
+
+    # an exited worker's live gauges go away, its counters stay
+    samples = set(run_process(tmp_path, render.replace("sys.argv[1:]", f"[{pids[0]}]")).splitlines())
+    assert "recommendation_cache_entries test 1.0" in samples
+    assert "recommend_stage_seconds_count v1 2.0" in samples
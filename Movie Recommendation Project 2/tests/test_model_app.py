@@ -13,7 +13,7 @@ class MockSVDPipeline:
         self.last_trained = datetime.now()
         self.training_size = 5000
     
-    def get_recommendations(self, user_id=None, num_recommendations=20):
+    def get_recommendations(self, user_id=None, num_recommendations=20, timings=None):
         if user_id == 99999:  # Simulate error case
             raise Exception("Test error")
         return [f'movie{i}' for i in range(1, num_recommendations+1)]
@@ -27,18 +27,15 @@ class MockSVDPipeline:
             "training_size": self.training_size
         }
     
-    def refresh_model(self):
-        """Mock refreshing the model"""
-        self.model_version = f"svd_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        self.data_version = f"data_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        self.last_trained = datetime.now()
-        return self.svd_model
+    def get_model_stats(self):
+        return {"model_bytes": 1024, "n_items": 20, "training_seconds": 1.5}
 
 # Mock the SVD module  
 sys.modules['SVD'] = mock.MagicMock()
 sys.modules['SVD'].SVDPipeline = MockSVDPipeline
 
 # Now import the model_app module
+from model_training.SVDServer import SVD_model_app
 from model_training.SVDServer.SVD_model_app import app as flask_app
 
 @pytest.fixture
@@ -50,8 +47,9 @@ def app():
         "DEBUG": False
     })
     
-    # Replace the global svd_pipeline with our mock
-    with mock.patch('model_training.SVDServer.SVD_model_app.svd_pipeline', MockSVDPipeline()):
+    # Replace the global svd_pipeline with our mock and keep provenance away from MongoDB
+    with mock.patch('model_training.SVDServer.SVD_model_app.svd_pipeline', MockSVDPipeline()), \
+            mock.patch('model_training.SVDServer.SVD_model_app.provenance_writer', mock.Mock()):
         yield flask_app
 
 @pytest.fixture
@@ -74,9 +72,9 @@ def test_recommend_endpoint_success(client):
     # Check response
     assert response.status_code == 200
     # Check that response contains the expected movie IDs
-    assert len(response.json) == 20
-    assert 'movie1' in response.json
-    assert 'movie20' in response.json
+    assert len(response.json["recommendation_results"]) == 20
+    assert 'movie1' in response.json["recommendation_results"]
+    assert 'movie20' in response.json["recommendation_results"]
 
 # Test recommendation with different user ID
 def test_recommend_different_user(client):
@@ -86,8 +84,8 @@ def test_recommend_different_user(client):
     # Check response
     assert response.status_code == 200
     # Should be the same recommendations (in our mock)
-    assert len(response.json) == 20
-    assert 'movie1' in response.json
+    assert len(response.json["recommendation_results"]) == 20
+    assert 'movie1' in response.json["recommendation_results"]
 
 # Test recommendation with zero user ID (edge case)
 def test_recommend_zero_user(client):
@@ -97,7 +95,7 @@ def test_recommend_zero_user(client):
     # Check response
     assert response.status_code == 200
     # Should still return recommendations
-    assert len(response.json) == 20
+    assert len(response.json["recommendation_results"]) == 20
 
 # Test recommendation with negative user ID
 def test_recommend_negative_user(client):
@@ -116,7 +114,7 @@ def test_recommend_large_user_id(client):
     # Check response
     assert response.status_code == 200
     # Should handle large IDs
-    assert len(response.json) == 20
+    assert len(response.json["recommendation_results"]) == 20
 
 
 # Test invalid path parameters
@@ -133,4 +131,79 @@ def test_non_integer_user_id(client):
     response = client.get('/recommend/not-a-number')
     
     # Flask routes with <int:userid> will return 404 for non-integer paths
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+# Test startup and readiness
+def test_import_does_not_load_model():
+    """Importing the app should not load or train a model"""
+    assert SVD_model_app.svd_pipeline is None
+
+def test_healthz_and_ready(client):
+    """The process should be healthy and, with a model published, ready"""
+    assert client.get('/healthz').status_code == 200
+    response = client.get('/ready')
+    assert response.status_code == 200
+    assert response.json["model_version"].startswith("svd_")
+
+def test_not_ready_before_model_loads(client):
+    """Until the model is published, /ready and /recommend should answer 503 right away"""
+    with mock.patch('model_training.SVDServer.SVD_model_app.svd_pipeline', None):
+        assert client.get('/healthz').status_code == 200
+        assert client.get('/ready').status_code == 503
+        response = client.get('/recommend/12345')
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+        assert client.post('/recommend/batch', json={"user_ids": [1, 2]}).status_code == 503
+
+def test_background_initialization_retries(client):
+    """A failing first load should be retried until a pipeline is published"""
+    pipeline = MockSVDPipeline()
+    with mock.patch('model_training.SVDServer.SVD_model_app.svd_pipeline', None), \
+            mock.patch('model_training.SVDServer.SVD_model_app.MODEL_LOAD_RETRY_SECONDS', 0), \
+            mock.patch('model_training.SVDServer.SVD_model_app.save_model_history'), \
+            mock.patch('model_training.SVDServer.SVD_model_app.latest_artifact', return_value="artifact"), \
+            mock.patch('model_training.SVDServer.SVD_model_app.SVDPipeline',
+                       side_effect=[Exception("mongo down"), pipeline]):
+        SVD_model_app.initialize_model_in_background().join(5)
+        assert SVD_model_app.svd_pipeline is pipeline
+        assert client.get('/ready').status_code == 200
+
+def test_load_latest_artifact_before_fork(client):
+    """The gunicorn master should publish the LATEST artifact, so forked workers start with it"""
+    pipeline = MockSVDPipeline()
+    with mock.patch('model_training.SVDServer.SVD_model_app.svd_pipeline', None), \
+            mock.patch('model_training.SVDServer.SVD_model_app.latest_artifact', return_value="artifact"), \
+            mock.patch('model_training.SVDServer.SVD_model_app.SVDPipeline', return_value=pipeline) as load:
+        assert SVD_model_app.load_latest_artifact() is pipeline
+        load.assert_called_once_with(artifact_path="artifact")
+        assert SVD_model_app.svd_pipeline is pipeline
+
+def test_load_latest_artifact_without_usable_artifact(client):
+    """Without a loadable artifact the master publishes nothing and leaves loading to the workers"""
+    with mock.patch('model_training.SVDServer.SVD_model_app.svd_pipeline', None), \
+            mock.patch('model_training.SVDServer.SVD_model_app.SVDPipeline', side_effect=Exception("corrupt")):
+        with mock.patch('model_training.SVDServer.SVD_model_app.latest_artifact', return_value=None):
+            assert SVD_model_app.load_latest_artifact() is None
+        with mock.patch('model_training.SVDServer.SVD_model_app.latest_artifact', return_value="artifact"):
+            assert SVD_model_app.load_latest_artifact() is None
+        assert SVD_model_app.svd_pipeline is None
+
+# Test metrics
+def test_stage_latency_and_model_metrics(client):
+    """A request should record its stages, and publishing a model should set the model gauges"""
+    from prometheus_client import REGISTRY
+    pipeline = MockSVDPipeline()
+    pipeline.model_version = "svd_metrics_test"
+    with mock.patch('model_training.SVDServer.SVD_model_app.svd_pipeline', None), \
+            mock.patch('model_training.SVDServer.SVD_model_app.recommendation_cache.model_version', None):
+        SVD_model_app.publish_pipeline(pipeline)
+        assert client.get('/recommend/4242').status_code == 200
+
+    for stage in ["cache_lookup", "provenance", "serialization"]:
+        assert REGISTRY.get_sample_value("recommend_stage_seconds_count", {
+            "pipeline_type": "SVD", "model_version": "svd_metrics_test", "stage": stage}) == 1
+    labels = {"pipeline_type": "SVD", "model_version": "svd_metrics_test"}
+    assert REGISTRY.get_sample_value("model_size_bytes", labels) == 1024
+    assert REGISTRY.get_sample_value("model_items", labels) == 20
+    assert REGISTRY.get_sample_value("model_training_seconds", labels) == 1.5
+    assert b"recommend_stage_seconds_bucket" in client.get('/metrics').data
@@ -0,0 +1,104 @@
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from Models.movie_features import MovieFeatures, genre_pairs, join_genres, parse_adult
+from Models.SVD import SVDPipeline
+from data_processing.migrate_genres import migrate_genres, parse_genres
+
+
+@pytest.fixture
+def movies():
+    """Movies with genres stored natively, comma-separated and missing"""
+    return pd.DataFrame({
+        'movie_id': ['m1', 'm2', 'm3', 'm4', 'm5'],
+        'adult': [False, 'True', 'false', None, True],
+        'genres': [['Action', 'Drama'], ['Comedy'], 'Drama, Thriller', None, []],
+        'release_date': ['2020-01-01'] * 5,
+        'original_language': ['en', 'fr', 'en', None, 'ja'],
+    })
+
+# Test genre parsing
+def test_genre_pairs_handles_all_formats(movies):
+    """Native arrays and comma-separated strings should flatten together"""
+    rows, names = genre_pairs(movies['genres'])
+
+    assert rows.tolist() == [0, 0, 1, 2, 2]
+    assert names.tolist() == ['Action', 'Drama', 'Comedy', 'Drama', 'Thriller']
+    assert join_genres(movies['genres']).tolist() == ['Action, Drama', 'Comedy', 'Drama, Thriller', '', '']
+
+def test_genre_pairs_leaves_legacy_strings_to_the_migration():
+    """Stringified lists are parsed once by migrate_genres.py, never row by row while training"""
+    legacy = "[{'id': 35, 'name': 'Comedy'}]"
+    with mock.patch('ast.literal_eval') as literal_eval:
+        rows, names = genre_pairs([legacy, [' Drama ', '', None, 7], 'Drama,Thriller'])
+    literal_eval.assert_not_called()
+    assert rows.tolist() == [1, 2, 2]
+    assert names.tolist() == ['Drama', 'Drama', 'Thriller']
+
+    assert join_genres([parse_genres(legacy)]).tolist() == ['Comedy']
+
+def test_parse_adult():
+    """Booleans and their string forms should parse, missing values count as not adult"""
+    assert parse_adult([True, 'True', 'false', None, False]).tolist() == [True, True, False, False, False]
+
+# Test feature matrix
+def test_movie_features(movies):
+    """The genre matrix should be sparse multi-hot and aligned with the movie ids"""
+    features = MovieFeatures.from_movies(movies, 'data_1')
+
+    assert features.genre_matrix.shape == (5, 4)
+    assert features.genre_matrix.nnz == 5
+    assert features.genre_names.tolist() == ['Action', 'Comedy', 'Drama', 'Thriller']
+    assert features.genre_mask('Drama').tolist() == [True, False, True, False, False]
+    assert not features.genre_mask('Western').any()
+    assert features.genre_lists(features.rows(['m3', 'unknown'])) == [['Drama', 'Thriller'], None]
+    assert features.languages(features.rows(['m2', 'm4', 'unknown'])) == ['fr', None, None]
+    assert features.adult.tolist() == [False, True, False, False, True]
+    assert features.language.categories.tolist() == ['en', 'fr', 'ja']
+
+def test_clean_movie_data_is_vectorized(movies):
+    """Cleaning should join genre names and type the language and adult columns"""
+    with mock.patch.object(SVDPipeline, 'train_and_save_model', return_value=mock.Mock()):
+        pipeline = SVDPipeline()
+
+    with mock.patch.object(pipeline, 'fetch_collection_data', return_value=movies.copy()):
+        result = pipeline.clean_movie_data(mock.Mock())
+
+    assert result['genres'].tolist() == ['Action, Drama', 'Comedy', 'Drama, Thriller', '', '']
+    assert result['original_language'].dtype == 'category'
+    assert result['adult'].dtype == bool
+
+def test_movie_features_cached_per_data_version(movies):
+    """Features should be rebuilt only when the data version changes"""
+    pipeline = SVDPipeline.__new__(SVDPipeline)
+    pipeline.movies_df, pipeline.movie_features, pipeline.data_version = movies, None, 'data_1'
+
+    first = pipeline.get_movie_features()
+    assert pipeline.get_movie_features() is first
+    pipeline.data_version = 'data_2'
+    assert pipeline.get_movie_features() is not first
+
+# Test the one-time migration
+def test_migrate_genres():
+    """String genres should be rewritten to arrays of names in bulk"""
+    collection = mock.Mock()
+    collection.find.return_value = [
+        {'_id': 1, 'genres': "[{'id': 28, 'name': 'Action'}, {'id': 18, 'name': 'Drama'}]"},
+        {'_id': 2, 'genres': 'not a list'},
+        {'_id': 3, 'genres': '[]'},
+    ]
+
+    assert migrate_genres(collection, batch_size=2) == 3
+    assert collection.find.call_args[0][0] == {'genres': {'$type': 'string'}}
+    assert [len(call[0][0]) for call in collection.bulk_write.call_args_list] == [2, 1]
+    first = collection.bulk_write.call_args_list[0][0][0][0]
+    assert first._doc == {'$set': {'genres': ['Action', 'Drama']}}
+    assert parse_genres('not a list') == []
+
+    collection.bulk_write.reset_mock()
+    assert migrate_genres(collection, dry_run=True) == 3
+    collection.bulk_write.assert_not_called()
@@ -0,0 +1,72 @@
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from Models.popularity import PopularityRanking
+from Models.artifacts import load_artifact
+
+
+# Test ranking
+def test_rank_by_interaction_count():
+    """Without times, items should be ranked by their number of interactions"""
+    ranking = PopularityRanking.build([2, 2, 2, 0, 0, 1, 3, 3, 3, 3], n_items=4)
+
+    assert ranking.top(4).tolist() == [3, 2, 0, 1]
+    assert ranking.top(2, exclude=[3]).tolist() == [2, 0]
+
+def test_recent_interactions_weigh_more():
+    """With a short half-life, recent interactions should outrank a larger number of old ones"""
+    now = pd.Timestamp('2025-04-10')
+    times = [now - pd.Timedelta(days=10)] * 3 + [now] * 2
+    ranking = PopularityRanking.build([0, 0, 0, 1, 1], n_items=2, times=times, half_life_days=1.0)
+
+    assert ranking.top(2).tolist() == [1, 0]
+    assert PopularityRanking.build([0, 0, 0, 1, 1], n_items=2, times=times, half_life_days=100.0).top(1).tolist() == [0]
+
+def test_candidates_and_groups():
+    """Only candidate items should be ranked, overall and per genre and language"""
+    ranking = PopularityRanking.build(
+        [0, 0, 0, 1, 1, 2, 3, 3, 3, 3], n_items=4,
+        candidate_mask=np.array([True, True, True, False]),
+        item_genres=[['Action'], ['Action', 'Drama'], ['Drama'], ['Drama']],
+        item_languages=['en', 'fr', 'en', None])
+
+    assert ranking.top(10).tolist() == [0, 1, 2]
+    assert ranking.top(10, genre='Drama').tolist() == [1, 2]
+    assert ranking.top(10, language='en').tolist() == [0, 2]
+    assert ranking.top(10, genre='Western').tolist() == [0, 1, 2]
+
+# Test serving fallback
+@pytest.fixture
+def pipeline(make_svd_pipeline):
+    """Pipeline over three movies rated by one, two and three users"""
+    ratings = pd.DataFrame({
+        'user_id': ['user1', 'user1', 'user1', 'user2', 'user2', 'user3'],
+        'movie_id': ['movie1', 'movie2', 'movie3', 'movie2', 'movie3', 'movie3'],
+        'rating': [4.0, 3.0, 5.0, 2.0, 4.0, 5.0],
+        'time': pd.to_datetime(['2025-04-01'] * 6),
+    })
+    return make_svd_pipeline(ratings, movies_df=pd.DataFrame({'movie_id': ['movie1', 'movie2', 'movie3'],
+                                                              'genres': ['Action', 'Drama, Action', 'Drama'],
+                                                              'original_language': ['en', 'en', 'fr']}))
+
+def test_build_popularity_from_pipeline(pipeline):
+    """Rankings should follow the number of ratings, within genres and languages too"""
+    assert pipeline.popular_items(3) == ['movie3', 'movie2', 'movie1']
+    assert pipeline.popular_items(3, genre='Action') == ['movie2', 'movie1']
+    assert pipeline.popular_items(3, language='en') == ['movie2', 'movie1']
+    assert pipeline.popular_items(3, exclude=[pipeline.seen_index.item_code('movie3')]) == ['movie2', 'movie1']
+
+def test_unknown_user_gets_popular_items(pipeline):
+    """Unknown users and requests without a user should get the most popular movies"""
+    assert pipeline.get_recommendations('new_user', 2) == ['movie3', 'movie2']
+    assert pipeline.get_recommendations(None, 2) == ['movie3', 'movie2']
+
+def test_popularity_survives_artifact(pipeline, tmp_path):
+    """The rankings should be saved with the artifact and loaded back"""
+    popularity = load_artifact(pipeline.save_artifact(str(tmp_path)))['popularity']
+
+    assert popularity.top(3).tolist() == pipeline.popularity.top(3).tolist()
+    assert popularity.top(3, genre='Drama').tolist() == pipeline.popularity.top(3, genre='Drama').tolist()
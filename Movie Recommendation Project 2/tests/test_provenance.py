@@ -0,0 +1,129 @@
+import pytest
+import threading
+import time
+import sys
+import os
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from serving.provenance import ProvenanceWriter
+
+
+class FakeCollection:
+    """Records insert_many batches; can be blocked to fill the queue"""
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def insert_many(self, documents, ordered=True):
+        self.release.wait(5)
+        assert ordered is False
+        self.batches.append(list(documents))
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+# Test batching
+def test_flush_by_batch_size():
+    """Full batches should be written without waiting for the flush interval"""
+    collection = FakeCollection()
+    writer = ProvenanceWriter(collection, batch_size=3, flush_interval=60)
+    writer.submit_many([{"user_id": i} for i in range(7)])
+
+    assert wait_for(lambda: len(collection.batches) == 2)
+    assert [len(batch) for batch in collection.batches] == [3, 3]
+    writer.close()
+    assert [d["user_id"] for batch in collection.batches for d in batch] == list(range(7))
+    assert writer.stats()["written"] == 7
+
+def test_flush_by_time():
+    """A partial batch should be written once the flush interval has passed"""
+    collection = FakeCollection()
+    writer = ProvenanceWriter(collection, batch_size=100, flush_interval=0.05)
+    writer.submit({"user_id": 1})
+
+    assert wait_for(lambda: collection.batches == [[{"user_id": 1}]])
+    writer.close()
+
+# Test overflow and failures
+def test_overflow_is_dropped_and_counted():
+    """With the writer stuck, submissions beyond the queue size should be dropped, not block"""
+    collection = FakeCollection()
+    collection.release.clear()
+    writer = ProvenanceWriter(collection, max_queue=2, batch_size=1, flush_interval=60)
+    writer.submit({"user_id": 0})
+    assert wait_for(lambda: writer.queue.qsize() == 0)  # taken by the blocked writer
+
+    start = time.monotonic()
+    accepted = [writer.submit({"user_id": i}) for i in range(1, 6)]
+    assert time.monotonic() - start < 0.5
+    assert accepted == [True, True, False, False, False]
+    assert writer.stats()["dropped"] == 3
+
+    collection.release.set()
+    writer.close()
+    assert writer.stats()["written"] == 3
+
+def test_write_errors_are_counted():
+    """A failing insert should be counted and not stop the writer"""
+    collection = mock.Mock()
+    collection.insert_many.side_effect = [Exception("mongo down"), None]
+    writer = ProvenanceWriter(collection, batch_size=1, flush_interval=60)
+    writer.submit({"user_id": 1})
+    writer.submit({"user_id": 2})
+    writer.close()
+
+    assert writer.stats()["failed"] == 1
+    assert writer.stats()["written"] == 1
+
+# Test deferring the client and the thread
+def test_deferred_writer_opens_collection_in_writer_thread():
+    """With open_collection and start=False, nothing runs and nothing connects until the writer starts"""
+    collection = FakeCollection()
+    opened = []
+    open_collection = lambda: opened.append(threading.current_thread().name) or collection
+    writer = ProvenanceWriter(open_collection=open_collection, batch_size=1, flush_interval=60, start=False)
+    writer.submit({"user_id": 1})
+    assert writer._thread is None and writer.collection is None
+
+    writer.start()
+    assert wait_for(lambda: collection.batches == [[{"user_id": 1}]])
+    assert opened == ["provenance-writer"]
+    writer.close()
+
+def test_close_without_start_writes_queued_documents():
+    """A writer that was never started should still flush its queue on close"""
+    collection = FakeCollection()
+    writer = ProvenanceWriter(open_collection=lambda: collection, start=False)
+    writer.close()
+    assert collection.batches == []
+
+    writer = ProvenanceWriter(open_collection=lambda: collection, start=False)
+    writer.submit({"user_id": 1})
+    writer.close()
+    assert collection.batches == [[{"user_id": 1}]]
+
+# Test restarting in a forked worker
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_after_fork_starts_a_fresh_writer():
+    """In a forked child the writer thread is gone; after_fork should start a new one that writes"""
+    collection = FakeCollection()
+    writer = ProvenanceWriter(collection, batch_size=10, flush_interval=60)
+    writer.submit({"user_id": 1})
+
+    pid = os.fork()
+    if pid == 0:
+        writer.after_fork()
+        writer.submit({"user_id": 2})
+        writer.close()
+        written = [d for batch in collection.batches for d in batch]
+        os._exit(0 if written == [{"user_id": 2}] and writer.stats()["written"] == 1 else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+    writer.close()
+    assert collection.batches == [[{"user_id": 1}]]
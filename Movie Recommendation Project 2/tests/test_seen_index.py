@@ -0,0 +1,51 @@
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from Models.seen_index import SeenItemIndex
+
+
+@pytest.fixture
+def ratings_df():
+    """Ratings with a duplicate (user, movie) pair and a movie without metadata"""
+    return pd.DataFrame({
+        'user_id': ['user1', 'user1', 'user2', 'user1', 'user3'],
+        'movie_id': ['movie1', 'movie2', 'movie1', 'movie1', 'movie3'],
+        'rating': [4.5, 3.0, 5.0, 4.0, 2.0]
+    })
+
+# Test index construction
+def test_from_ratings_codes(ratings_df):
+    """Users and items should be integer-coded in order of appearance"""
+    index = SeenItemIndex.from_ratings(ratings_df)
+
+    assert index.user_ids.tolist() == ['user1', 'user2', 'user3']
+    assert index.item_ids.tolist() == ['movie1', 'movie2', 'movie3']
+    assert index.user_code('user2') == 1
+    assert index.user_code('missing') is None
+    assert index.item_code('movie3') == 2
+
+def test_seen_items(ratings_df):
+    """Each user should see each rated movie exactly once"""
+    index = SeenItemIndex.from_ratings(ratings_df)
+
+    assert sorted(index.item_ids[index.seen_items(index.user_code('user1'))]) == ['movie1', 'movie2']
+    assert index.item_ids[index.seen_items(index.user_code('user3'))].tolist() == ['movie3']
+    assert index.indptr.tolist() == [0, 2, 3, 4]
+
+def test_unseen_items_respects_candidates(ratings_df):
+    """Unseen items should exclude seen movies and movies without metadata"""
+    index = SeenItemIndex.from_ratings(ratings_df, candidate_items=['movie1', 'movie2'])
+
+    assert index.item_ids[index.unseen_items(index.user_code('user2'))].tolist() == ['movie2']
+    assert index.unseen_items(index.user_code('user1')).tolist() == []
+    assert index.item_ids[index.unseen_items()].tolist() == ['movie1', 'movie2']
+
+def test_index_is_immutable(ratings_df):
+    """Index arrays should be read-only"""
+    index = SeenItemIndex.from_ratings(ratings_df)
+
+    with pytest.raises(ValueError):
+        index.indices[0] = 1
@@ -0,0 +1,189 @@
+import pytest
+import datetime
+import numpy as np
+import pandas as pd
+from unittest import mock
+import sys
+import os
+import subprocess
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from Models.sgd import MinibatchSVD, RatingArrays, write_rating_snapshot, open_rating_snapshot
+from Models.ids import IdDictionary
+from Models.SVD import SVDPipeline
+
+
+class FakeCursor(list):
+    def limit(self, n):
+        return FakeCursor(self[:n])
+
+
+class FakeCollection:
+    """Collection that applies $gte filters and projections like MongoDB"""
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None, batch_size=None):
+        matches = (doc for doc in self.docs
+                   if all(doc[field] >= condition['$gte'] for field, condition in query.items()))
+        return FakeCursor({k: v for k, v in doc.items() if projection.get(k)} for doc in matches)
+
+
+@pytest.fixture
+def batches():
+    """Low-rank ratings for 60 users over 40 movies, split into batches like a cursor would return"""
+    rng = np.random.default_rng(0)
+    users_f, items_f = rng.normal(0, 0.6, (60, 3)), rng.normal(0, 0.6, (40, 3))
+    users, items = rng.integers(0, 60, 3000), rng.integers(0, 40, 3000)
+    ratings = np.clip(3 + (users_f[users] * items_f[items]).sum(axis=1), 1, 5)
+    user_ids = np.char.add('user', users.astype(str))
+    item_ids = np.char.add('movie', items.astype(str))
+    return [(user_ids[s:s + 700], item_ids[s:s + 700], ratings[s:s + 700]) for s in range(0, 3000, 700)]
+
+# Test the on-disk rating snapshot
+def test_rating_snapshot_round_trip(batches, tmp_path):
+    """Streamed batches should be interned to codes and read back memory-mapped in chunks"""
+    snapshot = write_rating_snapshot(str(tmp_path), batches)
+    reopened = open_rating_snapshot(str(tmp_path))
+
+    assert isinstance(reopened.ratings, np.memmap)
+    assert len(reopened) == 3000
+    user_ids = np.concatenate([b[0] for b in batches])
+    assert reopened.user_ids[np.asarray(reopened.user_codes)].tolist() == user_ids.tolist()
+    assert reopened.item_ids[0] == batches[0][1][0]
+
+    chunks = list(snapshot.chunks(1000))
+    assert [len(c[2]) for c in chunks] == [1000, 1000, 1000]
+    np.testing.assert_allclose(np.concatenate([c[2] for c in chunks]),
+                               np.concatenate([b[2] for b in batches]), rtol=1e-6)
+
+def test_rating_snapshot_codes_with_shared_dictionaries(tmp_path):
+    """Codes should come from the given dictionaries, which learn the new ids, and times be kept"""
+    users, items = IdDictionary(['u0']), IdDictionary(['m0', 'm1'])
+    batches = [(np.array(['u1', 'u0']), np.array(['m1', 'm2']), [4.0, 2.0],
+                np.array([datetime.datetime(2024, 1, 2), None], dtype=object))]
+    snapshot = write_rating_snapshot(str(tmp_path), batches, users, items)
+
+    assert snapshot.user_codes.tolist() == [1, 0]
+    assert snapshot.item_codes.tolist() == [1, 2]
+    assert users.ids.tolist() == ['u0', 'u1'] and snapshot.user_ids.tolist() == ['u0', 'u1']
+    assert snapshot.n_items == 3
+    assert snapshot.times[0] == np.datetime64('2024-01-02') and np.isnat(snapshot.times[1])
+    assert open_rating_snapshot(str(tmp_path)).times is not None
+
+def test_rating_snapshot_without_times(batches, tmp_path):
+    assert write_rating_snapshot(str(tmp_path), batches).times is None
+
+# Test minibatch training
+def test_minibatch_svd_learns(batches, tmp_path):
+    """Training over chunks should fit the ratings much better than the global mean"""
+    snapshot = write_rating_snapshot(str(tmp_path), batches)
+    model = MinibatchSVD(n_factors=10, n_epochs=40, lr_all=0.01, batch_size=64, chunk_size=500, random_state=0)
+    model.fit(snapshot)
+
+    baseline = np.sqrt(np.mean((np.asarray(snapshot.ratings) - np.mean(snapshot.ratings)) ** 2))
+    assert model.rmse(snapshot) < 0.6 * baseline
+
+def test_to_scorer_matches_model(batches, tmp_path):
+    """The serving scorer should reproduce the model's estimates and treat unrated items as unknown"""
+    snapshot = write_rating_snapshot(str(tmp_path), batches)
+    model = MinibatchSVD(n_factors=5, n_epochs=5, random_state=0).fit(snapshot, n_items=snapshot.n_items + 1)
+    item_ids = np.append(snapshot.item_ids, 'movie_unrated')
+
+    scorer = model.to_scorer(snapshot.user_ids, item_ids)
+    scores = scorer.score('user3')
+
+    code = snapshot.user_ids.tolist().index('user3')
+    expected = model.global_mean + model.bu[code] + model.bi + model.qi @ model.pu[code]
+    np.testing.assert_allclose(scores[:-1], np.clip(expected[:-1], 1, 5))
+    assert not scorer.item_known[-1]
+    assert scores[-1] == pytest.approx(np.clip(model.global_mean + model.bu[code], 1, 5))
+
+def test_rating_arrays_infer_sizes():
+    """Without id arrays, user and item counts come from the largest codes"""
+    arrays = RatingArrays(np.array([0, 4], dtype=np.int32), np.array([2, 1], dtype=np.int32),
+                          np.array([3.0, 4.0], dtype=np.float32))
+
+    assert arrays.n_users == 5
+    assert arrays.n_items == 3
+
+def test_streaming_training_skips_the_ratings_frame(tmp_path):
+    """Minibatch mode should stream the window from MongoDB into a snapshot instead of a DataFrame"""
+    now = datetime.datetime.now()
+    rates = [{'user_id': i % 20, 'movie_id': f'movie{i % 15}', 'score': float(i % 5 + 1) if i % 7 else None,
+              'time': now, 'timestamp': now - datetime.timedelta(days=10 if i < 10 else 1)} for i in range(300)]
+    watches = [{'user_id': i % 20, 'movie_id': f'movie{i % 13}', 'minute_mpg': f'{i % 90}.mpg',
+                'time': now, 'timestamp': now} for i in range(100)]
+    movies_df = pd.DataFrame({'movie_id': [f'movie{i}' for i in range(15)], 'genres': 'Drama',
+                              'original_language': 'en', 'adult': False, 'release_date': None})
+
+    with mock.patch('Models.SVD.DB') as db, mock.patch('Models.SVD.TRAINING_MODE', 'minibatch'), \
+            mock.patch('Models.SVD.ID_DIR', str(tmp_path / 'ids')), \
+            mock.patch('Models.SVD.RATING_SNAPSHOT_DIR', str(tmp_path / 'ratings')), \
+            mock.patch('Models.SVD.LOADER_BATCH_SIZE', 32), mock.patch('Models.SVD.MINIBATCH_EPOCHS', 3), \
+            mock.patch.object(SVDPipeline, 'clean_movie_data', lambda self, db: movies_df), \
+            mock.patch.object(SVDPipeline, 'clean_user_data', lambda self, db: None):
+        db.return_value.movie_db = {'user_rate_data': FakeCollection(rates), 'user_watch_data': FakeCollection(watches)}
+        pipeline = SVDPipeline()
+
+    assert pipeline.combined_ratings_df is None
+    assert os.listdir(tmp_path / 'ratings') == []
+    assert pipeline.seen_index.n_users == 20
+    assert IdDictionary.load(str(tmp_path / 'ids' / 'users.npy')).ids.tolist() == pipeline.seen_index.user_ids.tolist()
+
+    # the ten rates outside the window are skipped; missing scores and watches are scaled like clean_*_data
+    user_codes, item_codes, values = pipeline.artifact_ratings
+    assert len(values) == 290 + 100
+    unscored = [i - 10 for i in range(10, 300) if i % 7 == 0]
+    assert values[unscored].tolist() == [2.5] * len(unscored)
+    assert values[290:].min() == 1.0 and values[290:].max() == 5.0
+    assert pipeline.watch_time_range == (0, 89)
+
+    assert pipeline.validate()
+    assert len(pipeline.get_recommendations('3', 5)) == 5
+    ratings = pipeline.training_ratings()
+    assert ratings['movie_id'].tolist()[:2] == ['movie10', 'movie11']
+
+class GrowingCollection(FakeCollection):
+    """Collection that receives `inserted` after the first query, like watches recorded between two passes"""
+    def __init__(self, docs, inserted):
+        super().__init__(docs)
+        self.inserted = inserted
+
+    def find(self, query, projection=None, batch_size=None):
+        cursor = super().find(query, projection, batch_size)
+        self.docs, self.inserted = self.docs + self.inserted, []
+        return cursor
+
+@pytest.mark.parametrize("minutes, inserted", [
+    (['10.mpg', '50.mpg'], ['0.mpg', '90.mpg']),  # outside the range of the first pass
+    (['30.mpg', '30.mpg'], ['60.mpg']),           # single-value range
+    ([], ['60.mpg']),                             # no range at all
+])
+def test_streamed_watches_stay_on_the_rating_scale(minutes, inserted):
+    """Watches recorded between the range pass and the scaling pass should still get ratings within 1-5"""
+    now = datetime.datetime.now()
+    watch = lambda i, minute: {'user_id': i, 'movie_id': f'movie{i}', 'minute_mpg': minute, 'time': now, 'timestamp': now}
+    watches = GrowingCollection([watch(i, m) for i, m in enumerate(minutes)],
+                                [watch(len(minutes) + i, m) for i, m in enumerate(inserted)])
+    pipeline = SVDPipeline.__new__(SVDPipeline)
+    pipeline.init_state()
+    pipeline.training_size = None
+
+    batches = list(pipeline.stream_ratings({'user_rate_data': FakeCollection([]), 'user_watch_data': watches}))
+    ratings = np.concatenate([batch[2] for batch in batches])
+
+    assert len(ratings) == len(minutes) + len(inserted)
+    assert np.isfinite(ratings).all() and ratings.min() >= 1 and ratings.max() <= 5
+
+@pytest.mark.parametrize("env, expected", [
+    ({"SVD_TRAINING_MODE": "minibatch"}, "None"),
+    ({"SVD_TRAINING_MODE": "minibatch", "SVD_TRAINING_SIZE": "100"}, "100"),
+    ({"SVD_TRAINING_MODE": "default"}, "5000"),
+])
+def test_minibatch_mode_fetches_everything_by_default(env, expected):
+    """Minibatch mode exists to train on all ratings, so it should not inherit the 5000-document cap"""
+    env = dict({k: v for k, v in os.environ.items() if k != "SVD_TRAINING_SIZE"}, **env)
+    output = subprocess.run([sys.executable, "-c", "from Models.SVD import TRAINING_SIZE; print(TRAINING_SIZE)"],
+                            cwd=os.path.join(os.path.dirname(__file__), "../model_training"), env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip().splitlines()[-1] == expected
@@ -0,0 +1,128 @@
+import pytest
+import datetime
+import numpy as np
+from unittest import mock
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from Models.snapshot import TrainingSnapshot, format_data_version
+from Models.KNN import KNNPipeline
+from Models.SVD import SVDPipeline
+
+
+class FakeCursor(list):
+    def limit(self, n):
+        return FakeCursor(self[:n])
+
+
+class FakeCollection:
+    """Collection that understands the $gt/$gte filters used by snapshots and records every query"""
+    def __init__(self, docs=None):
+        self.docs = list(docs or [])
+        self.queries = []
+
+    def insert(self, **doc):
+        doc['_id'] = len(self.docs) + 1
+        self.docs.append(doc)
+
+    def find(self, query, projection=None, batch_size=None):
+        self.queries.append(query)
+
+        def matches(doc):
+            for field, condition in query.items():
+                if '$gt' in condition and not doc[field] > condition['$gt']:
+                    return False
+                if '$gte' in condition and not doc[field] >= condition['$gte']:
+                    return False
+            return True
+
+        return FakeCursor({k: v for k, v in doc.items() if projection.get(k)} for doc in self.docs if matches(doc))
+
+
+@pytest.fixture
+def ratings():
+    """Rating documents, two of them older than the 7 day window"""
+    now = datetime.datetime.now()
+    collection = FakeCollection()
+    for i in range(5):
+        collection.insert(user_id=str(i), movie_id=f'movie{i}', score=float(i + 1),
+                          timestamp=now - datetime.timedelta(days=10 if i < 2 else 1))
+    return collection
+
+# Test incremental refresh
+def test_refresh_fetches_only_new_documents(ratings):
+    """The second refresh should query past the watermark and append only the new rows"""
+    snapshot = TrainingSnapshot(['user_id', 'movie_id', 'score'], {'score': np.float64}, 'timestamp', 7)
+
+    df, _ = snapshot.refresh(ratings)
+    assert df['user_id'].tolist() == ['2', '3', '4']
+    assert snapshot.watermark == 5
+
+    ratings.insert(user_id='9', movie_id='movie9', score=2.0, timestamp=datetime.datetime.now())
+    df, _ = snapshot.refresh(ratings)
+
+    assert ratings.queries[-1]['_id'] == {'$gt': 5}
+    assert snapshot.last_fetched == 1
+    assert df['user_id'].tolist() == ['2', '3', '4', '9']
+    assert list(df.columns) == ['user_id', 'movie_id', 'score']
+
+def test_refresh_evicts_rows_outside_window(ratings):
+    """Cached rows whose timestamp fell out of the window should be dropped on refresh"""
+    snapshot = TrainingSnapshot(['user_id'], window_field='timestamp', window_days=7)
+    snapshot.refresh(ratings)
+
+    # age the cached rows as if days had passed since they were fetched
+    snapshot.frame.loc[snapshot.frame['user_id'] == '2', 'timestamp'] = datetime.datetime.now() - datetime.timedelta(days=8)
+    df, _ = snapshot.refresh(ratings)
+
+    assert df['user_id'].tolist() == ['3', '4']
+
+def test_refresh_keeps_newest_rows_within_limit(ratings):
+    """Only the newest `limit` rows should be kept as new documents arrive"""
+    snapshot = TrainingSnapshot(['user_id'], limit=2)
+
+    snapshot.refresh(ratings)
+    ratings.insert(user_id='7', timestamp=datetime.datetime.now())
+    df, _ = snapshot.refresh(ratings)
+
+    assert df['user_id'].tolist() == ['4', '7']
+
+def test_movie_catalogue_sees_upserted_changes():
+    """A movie upserted in place keeps its _id, so the catalogue must still pick up its new metadata"""
+    movies = FakeCollection()
+    for genre in ['Drama', 'Comedy']:
+        movies.insert(movie_id=f'movie_{genre}', genres=[genre], adult='False', original_language='en',
+                      release_date='2020-01-01')
+    pipeline = SVDPipeline.__new__(SVDPipeline)
+    pipeline.init_state()
+
+    assert pipeline.clean_movie_data({'movie_info': movies})['genres'].tolist() == ['Drama', 'Comedy']
+    movies.docs[0]['genres'] = ['Thriller', 'Drama']
+    df = pipeline.clean_movie_data({'movie_info': movies})
+
+    assert df['genres'].tolist() == ['Thriller, Drama', 'Comedy']
+    assert len(df) == 2
+
+# Test data versions
+def test_data_version_encodes_watermarks(ratings):
+    """Data versions should name the watermark of every snapshot"""
+    snapshot = TrainingSnapshot(['user_id'])
+    assert format_data_version({'user_rate_data': snapshot}).endswith('_user_rate_data@none')
+
+    snapshot.refresh(ratings)
+    version = format_data_version({'user_rate_data': snapshot})
+    assert version.startswith('data_')
+    assert version.endswith('_user_rate_data@5')
+
+def test_knn_retrain_reuses_snapshot(ratings):
+    """A KNN pipeline built from a previous pipeline's snapshots should only fetch new ratings"""
+    movie_db = {'user_rate_data': ratings}
+    with mock.patch('Models.KNN.DB') as db:
+        db.return_value.movie_db = movie_db
+        first = KNNPipeline()
+        ratings.insert(user_id='7', movie_id='movie1', score=3.0, timestamp=datetime.datetime.now())
+        second = KNNPipeline(snapshots=first.snapshots)
+
+    assert ratings.queries[-1] == {'_id': {'$gt': 5}}
+    assert len(second.snapshots['user_rate_data'].frame) == 6
+    assert second.data_version.endswith('user_rate_data@6')
@@ -0,0 +1,78 @@
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from Models.SVD import SVDPipeline
+from Models.scoring import SVDScorer, top_k
+from tests.conftest import random_ratings, fit_svd
+
+
+@pytest.fixture
+def ratings_df():
+    """Random ratings for 30 users over 50 movies"""
+    return random_ratings(0, 30, 50, 400)
+
+@pytest.fixture
+def svd_model(ratings_df):
+    """SVD model fitted on part of the ratings, so some movies stay unknown to it"""
+    return fit_svd(ratings_df[ratings_df['movie_id'] != 'movie7'], n_epochs=30, lr_all=0.02)
+
+# Test partial top-k selection
+def test_top_k_matches_full_sort():
+    """top_k should agree with a stable descending sort"""
+    scores = np.array([3.0, 5.0, 1.0, 5.0, 4.0, 2.0])
+    expected = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+
+    assert top_k(scores, 3).tolist() == expected[:3]
+    assert top_k(scores, 10).tolist() == expected
+    assert top_k(scores, 0).tolist() == []
+
+    # ties at the cut keep the earliest positions
+    ties = np.full(10, 3.0)
+    assert top_k(ties, 5).tolist() == [0, 1, 2, 3, 4]
+
+# Test scores against surprise predictions
+@pytest.mark.parametrize("user_id", ["0", "5", "unknown_user"])
+def test_scorer_matches_predict(svd_model, ratings_df, user_id):
+    """Vectorized scores should match SVD.predict for known and unknown users and items"""
+    item_ids = ratings_df['movie_id'].unique()
+    scorer = SVDScorer.from_model(svd_model, item_ids)
+
+    expected = [svd_model.predict(user_id, movie_id).est for movie_id in item_ids]
+
+    np.testing.assert_allclose(scorer.score(user_id), expected, rtol=0, atol=1e-9)
+
+def test_scorer_clips_to_rating_scale(svd_model, ratings_df):
+    """Scores should be clipped into the trainset rating scale"""
+    scorer = SVDScorer.from_model(svd_model, ratings_df['movie_id'].unique())
+    scorer.user_factors = scorer.user_factors * 100
+
+    scores = scorer.score("0")
+    assert scores.min() >= 1.0
+    assert scores.max() <= 5.0
+
+# Test get_recommendations with the vectorized scorer
+def test_get_recommendations_matches_predict_loop(make_svd_pipeline, svd_model, ratings_df):
+    """Recommendations should be the top unseen movies ranked by SVD.predict"""
+    pipeline = make_svd_pipeline(ratings_df, model=svd_model)
+
+    recommendations = pipeline.get_recommendations(3, num_recommendations=5)
+
+    seen = set(ratings_df[ratings_df['user_id'] == '3']['movie_id'])
+    unseen = [m for m in ratings_df['movie_id'].unique() if m not in seen]
+    predictions = sorted((svd_model.predict('3', m) for m in unseen), key=lambda p: p.est, reverse=True)
+
+    assert recommendations == [p.iid for p in predictions[:5]]
+    assert not seen.intersection(recommendations)
+
+# Test validation before a pipeline is published
+def test_validate_pipeline(make_svd_pipeline, svd_model, ratings_df):
+    """A trained pipeline should validate and an untrained one should not"""
+    pipeline = SVDPipeline.__new__(SVDPipeline)
+    pipeline.init_state()
+    with pytest.raises(ValueError):
+        pipeline.validate()
+
+    assert make_svd_pipeline(ratings_df, model=svd_model).validate()
@@ -0,0 +1,91 @@
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../model_training")))
+from surprise import SVD, Dataset, Reader
+from Models.tuning import search_svd_hyperparameters, predict_pairs, _configurations
+from tests.conftest import random_ratings, fit_svd
+
+
+@pytest.fixture
+def ratings():
+    """Random integer-coded ratings for 40 users over 60 movies, with an 80/20 split"""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'user': rng.integers(0, 40, 800),
+        'item': rng.integers(0, 60, 800),
+        'rating': rng.uniform(1, 5, 800)
+    }).drop_duplicates(['user', 'item'])
+    train_mask = rng.random(len(df)) < 0.8
+    return df, train_mask
+
+# Test the configurations that get evaluated
+def test_configurations_grid_and_sample():
+    """The full grid should be expanded, and n_iter should sample distinct configurations from it"""
+    grid = {'n_factors': [10, 20], 'reg_all': [0.02, 0.05, 0.1]}
+
+    configs = _configurations(grid, None, 0)
+    assert len(configs) == 6
+    assert {'n_factors': 20, 'reg_all': 0.1} in configs
+
+    sample = _configurations(grid, 3, 0)
+    assert len(sample) == 3
+    assert all(config in configs for config in sample)
+
+# Test vectorized prediction used for RMSE
+def test_predict_pairs_matches_predict(ratings):
+    """predict_pairs should match SVD.predict, including users and items unknown to the model"""
+    df, train_mask = ratings
+    train = df[train_mask]
+    model = SVD(random_state=0, n_factors=10, n_epochs=10)
+    model.fit(Dataset.load_from_df(train[['user', 'item', 'rating']], Reader(rating_scale=(1, 5))).build_full_trainset())
+
+    users = np.concatenate([df['user'].to_numpy(), [999]])
+    items = np.concatenate([df['item'].to_numpy(), [0]])
+    expected = [model.predict(u, i).est for u, i in zip(users.tolist(), items.tolist())]
+
+    np.testing.assert_allclose(predict_pairs(model, users, items), expected, rtol=0, atol=1e-9)
+
+# Test the parallel search
+def test_search_reports_rmse_and_time(ratings):
+    """Every configuration should be evaluated in the worker pool and results sorted by RMSE"""
+    df, train_mask = ratings
+    grid = {'n_factors': [5, 20], 'n_epochs': [5, 10]}
+
+    results = search_svd_hyperparameters(df['user'], df['item'], df['rating'], train_mask,
+                                         param_grid=grid, n_jobs=2)
+
+    assert len(results) == 4
+    assert [r['rmse'] for r in results] == sorted(r['rmse'] for r in results)
+    assert all(r['fit_seconds'] >= 0 and np.isfinite(r['rmse']) for r in results)
+    assert {(r['n_factors'], r['n_epochs']) for r in results} == {(5, 5), (5, 10), (20, 5), (20, 10)}
+
+def test_search_respects_time_budget(ratings):
+    """Configurations that cannot finish within the time budget should be dropped"""
+    df, train_mask = ratings
+    grid = {'n_factors': [5], 'n_epochs': [5, 100000]}
+
+    results = search_svd_hyperparameters(df['user'], df['item'], df['rating'], train_mask,
+                                         param_grid=grid, n_jobs=2, time_budget=3)
+
+    assert [r['n_epochs'] for r in results] == [5]
+
+# Test the model the pipeline publishes after a search
+def test_search_publishes_winner_fitted_on_all_ratings(make_svd_pipeline):
+    """The winner should be refit on every rating with the random_state it was evaluated with"""
+    ratings_df = random_ratings(4, 30, 40, 400)
+    pipeline = make_svd_pipeline(ratings_df)
+    results = [{'n_factors': 10, 'n_epochs': 5, 'rmse': 0.9, 'fit_seconds': 0.1},
+               {'n_factors': 20, 'n_epochs': 5, 'rmse': 1.1, 'fit_seconds': 0.1}]
+
+    with mock.patch('Models.SVD.TRAINING_MODE', 'search'), \
+            mock.patch('Models.SVD.search_svd_hyperparameters', return_value=results) as search:
+        model = pipeline.build_model(None, None)
+
+    assert search.call_args.kwargs['seed'] == 0
+    assert pipeline.hyperparameters == {'n_factors': 10, 'n_epochs': 5, 'random_state': 0, 'rmse': 0.9}
+    assert model.trainset.n_ratings == len(ratings_df)
+    np.testing.assert_array_equal(model.pu, fit_svd(ratings_df, n_factors=10, n_epochs=5).pu)